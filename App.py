@@ -1,194 +1,158 @@
+import contextvars
+import functools
+import logging
+import math
+import os
+import threading
+import time
 import gradio as gr
-import matplotlib.pyplot as plt
-from datetime import date, datetime, timedelta
 
-# -----------------------------
-# In-memory store (temporary)
-# -----------------------------
-users = {}
-SESSION = {"current_user": None}
+from bme_health import cards, charts, cluster, cohort, dates, exporter, foods, importer, instrument, plotdata, workers
+from bme_health.core import (
+    ACTIVITY_FACTORS, BMI_CATEGORIES, GOALS, METRIC, IMPERIAL,
+    today_str, parse_date_str, unit_to_metric,
+    calc_bmi, bmi_category, is_out_of_range, hb_bmr, compute_target_from_goal,
+)
+from bme_health.store import open_store
 
 # -----------------------------
-# Utilities
+# Store (in-memory unless BME_DB points at an SQLite file)
+# The logged-in username lives in per-session gr.State, not in a global.
 # -----------------------------
-def ymd(d: date) -> str:
-    return d.strftime("%Y-%m-%d")
-
-def today_str() -> str:
-    return ymd(date.today())
-
-def parse_date_str(s: str):
-    if not s:
-        return None
-    s = s.strip()
-    try:
-        dt = datetime.strptime(s, "%Y-%m-%d").date()
-        return ymd(dt)
-    except Exception:
-        return None
+users = {}
 
-def to_float(x):
-    try:
-        return float(x)
-    except Exception:
-        return None
-
-def unit_to_metric(unit, height_val, weight_val):
-    h = to_float(height_val)
-    w = to_float(weight_val)
-    if h is None or w is None:
-        return None, None
-    if unit == "Metric (cm, kg)":
-        return h, w
-    return h * 2.54, w * 0.453592
-
-def calc_bmi(h_cm, w_kg):
-    if h_cm is None or w_kg is None or h_cm <= 0:
-        return None
-    h_m = h_cm / 100.0
-    return w_kg / (h_m ** 2)
-
-def bmi_category(bmi):
-    if bmi is None:
-        return "-"
-    if bmi < 18.5: return "Underweight"
-    if bmi < 25:   return "Normal"
-    if bmi < 30:   return "Overweight"
-    return "Obese"
+# BME_FOOD_DB adds a CSV/JSONL food database (name,kcal[,type]) to the defaults
+# Store calls are timed as the "storage" phase of the event making them (bme_health.instrument)
+STORE = instrument.timed_store(open_store(os.environ.get("BME_DB", ""), users,
+                                          foods.load_food_db(os.environ.get("BME_FOOD_DB", ""), foods.DEFAULT_FOODS)))
+FOOD_CHOICES_K = 30          # matches sent to a meal dropdown per search
+MAX_TEMPLATE_DAYS = 366      # longest date range one "apply template" may fill
+# BME_CLINICIANS=alice,bob: users who may open the cohort (all users) tab
+CLINICIANS = frozenset(u.strip() for u in os.environ.get("BME_CLINICIANS", "").split(",") if u.strip())
 
 def ensure_user(username):
-    if username not in users:
-        users[username] = {
-            "bmi_records": {},
-            "tdee_records": {},
-            "food_log": {},
-            "foods": {
-                "MAIN": {
-                    "-": 0,
-                    "Pad Thai (1 plate)": 545,
-                    "Khao Man Gai": 600,
-                    "Fried Rice": 520,
-                    "Chicken Breast (100g)": 165,
-                    "Grilled Salmon (100g)": 208,
-                    "Beef (lean, 100g)": 250,
-                    "Rice (1 cup)": 206,
-                    "Spaghetti (1 cup)": 220,
-                    "Green Curry Chicken": 320,
-                },
-                "DESSERT": {
-                    "-": 0,
-                    "Sticky Rice with Mango": 380,
-                    "Ice Cream (100g)": 207,
-                    "Brownie": 250,
-                    "Fruit (Apple 100g)": 52,
-                    "Fruit (Banana 100g)": 89,
-                },
-                "BEVERAGE": {
-                    "-": 0,
-                    "Water": 0,
-                    "Coffee (black)": 5,
-                    "Milk (1 cup)": 150,
-                    "Thai Iced Tea": 250,
-                    "Bubble Tea": 340,
-                    "Coke (1 can)": 140,
-                }
-            }
-        }
+    STORE.ensure_user(username)
 
 # -----------------------------
 # Charts
+# "png" renders matplotlib PNGs on the server; "client" sends the data
+# series to gr.LinePlot / gr.BarPlot and the browser draws them.
 # -----------------------------
-def plot_bmi_series(series):
-    import matplotlib.pyplot as plt
-    plt.figure(figsize=(7.6, 3.8))
-    ax = plt.gca()
-    ax.axhspan(0, 18.5, color="#6ec1ff22")
-    ax.axhspan(18.5, 25, color="#39ff1433")
-    ax.axhspan(25, 30, color="#ffdd0033")
-    ax.axhspan(30, 80, color="#ff3b3b2a")
-    ax.set_title("BMI Over Time (category bands)")
-    ax.set_ylabel("BMI")
-    ax.grid(True, linestyle="--", alpha=0.35)
-    if series:
-        items = sorted(series.items(), key=lambda kv: kv[0])
-        xs = [k for k, _ in items]
-        ys = [v for _, v in items]
-        ax.plot(xs, ys, marker="o", linewidth=2)
-        for x, y in zip(xs, ys):
-            cat = bmi_category(y)
-            ax.annotate(f"{y:.1f}\n{cat}", (x, y), textcoords="offset points",
-                        xytext=(0, 8), ha="center", fontsize=9)
-        plt.xticks(rotation=25, ha="right")
-    else:
-        ax.text(0.5, 0.5, "No BMI data yet", ha="center", va="center",
-                transform=ax.transAxes, fontsize=12, alpha=0.7)
-    plt.tight_layout()
-    path = "/tmp/bmi_series.png"
-    plt.savefig(path); plt.close()
-    return path
-
-def compute_target_from_goal(tdee: float, goal: str) -> float:
-    if not tdee or tdee <= 0:
-        return 0.0
-
-    m = {"Lose (-20%)": 0.80, "Maintenance (0%)": 1.00, "Gain (+15%)": 1.15}.get(goal, 1.00)
-    return tdee * m
-
-def plot_food_week(log, ref_date_str, target_kcal):
-    import matplotlib.pyplot as plt
-    if ref_date_str:
-        try:
-            ref_date = datetime.strptime(ref_date_str, "%Y-%m-%d").date()
-        except Exception:
-            ref_date = date.today()
-    else:
-        ref_date = date.today()
-    days = [(ref_date - timedelta(days=i)) for i in range(6, -1, -1)]
-    labels = [ymd(d) for d in days]
+CHART_MODE = "client" if os.environ.get("BME_CHART_MODE", "png").strip().lower() == "client" else "png"
+
+def empty_chart(kind):
+    if CHART_MODE == "client":
+        if kind == "food":
+            return gr.update(value=plotdata.empty_frame(kind), title=plotdata.food_week_title((), 0))
+        return plotdata.empty_frame(kind)
+    return charts.placeholder(kind)
+
+def plot_bmi_series(series, user=None):
+    # series is {date: bmi} in date order, as returned by STORE.bmi_series
+    points = [(k, v, bmi_category(v)) for k, v in series.items()]
+    with instrument.phase("render"):
+        if CHART_MODE == "client":
+            return plotdata.bmi_series_frame(points)
+        return charts.bmi_series_png(user, points)
+
+def plot_food_week(log, ref_date_str, target_kcal, user=None):
+    ref = (dates.parse(ref_date_str) if ref_date_str else None) or dates.today()
+    labels = dates.to_days(dates.window(ref, 7))
     vals = [log.get(lbl, 0) for lbl in labels]
+    with instrument.phase("render"):
+        if CHART_MODE == "client":
+            return gr.update(value=plotdata.food_week_frame(labels, vals, target_kcal),
+                             title=plotdata.food_week_title(labels, target_kcal))
+        return charts.food_week_png(user, labels, vals, target_kcal)
+
+def chart_component(kind, label):
+    """gr.Image for PNG mode, or the matching native plot for client mode."""
+    if CHART_MODE == "png":
+        return gr.Image(value=empty_chart(kind), label=label, height=300)
+    if kind == "bmi":
+        return gr.LinePlot(plotdata.empty_frame(kind), x="date", y="bmi", color="series",
+                           color_map=plotdata.BMI_COLORS, title="BMI Over Time (category thresholds)",
+                           y_title="BMI", tooltip=["category"], label=label, height=300)
+    return gr.BarPlot(plotdata.empty_frame(kind), x="date", y="kcal", color="status",
+                      color_map=plotdata.FOOD_COLORS, title=plotdata.food_week_title((), 0),
+                      y_title="Calories (kcal)", sort="x", x_label_angle=-25, label=label, height=300)
 
-    plt.figure(figsize=(7.6, 3.8))
-    ax = plt.gca()
-    bars = ax.bar(labels, vals,color = 'Orange')
-    ax.grid(axis="y", linestyle="--", alpha=0.35)
-    plt.xticks(rotation=25, ha="right")
-    ax.set_ylabel("Calories (kcal)")
-    ax.set_title(f"Daily Calories — {labels[0]} to {labels[-1]}")
-
-    # target line
-    if target_kcal and target_kcal > 0:
-        ax.axhline(target_kcal, linestyle="--", linewidth=2)
-      
-
-    # labels on bars
-    for b in bars:
-        v = b.get_height()
-        ax.annotate(f"{v:.0f}", (b.get_x() + b.get_width()/2, v),
-                    ha="center", va="bottom", fontsize=9, xytext=(0, 3),
-                    textcoords="offset points")
-    plt.tight_layout()
-    path = "/tmp/food_week.png"
-    plt.savefig(path); plt.close()
-    return path
+# -----------------------------
+# Async handlers
+# Handler bodies below are plain functions.  Gradio gets async twins: the
+# body runs on the bounded I/O pool (bme_health.workers) and any chart it
+# starts is awaited on the event loop, so neither Gradio's worker threads
+# nor the I/O pool wait on matplotlib.  BME_ASYNC=0 registers the plain
+# functions instead.  Either way each call is timed as one event named
+# after the handler (bme_health.instrument).
+# -----------------------------
+ASYNC_HANDLERS = os.environ.get("BME_ASYNC", "1").strip() != "0"
+
+def async_handler(fn):
+    if not ASYNC_HANDLERS:
+        return instrument.timed(fn.__name__)(fn)
+    body = instrument.profiled(fn)
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        with instrument.event(fn.__name__):
+            ctx = contextvars.copy_context()
+            ctx.run(charts.deferred_renders)
+            submitted = time.perf_counter()
+            def call():
+                instrument.add("queue", time.perf_counter() - submitted)
+                return body(*args, **kwargs)
+            out = await workers.run_blocking(call, context=ctx)
+            with instrument.phase("render"):
+                return await charts.resolve(out)
+    return run
 
 # -----------------------------
 # Login helpers
 # -----------------------------
-def _choices_bmi(user): return sorted(users[user]["bmi_records"].keys())
-def _choices_tdee(user): return sorted(users[user]["tdee_records"].keys())
-
-def _food_choices(user):
-    f = users[user]["foods"]
-    return list(f["MAIN"].keys()), list(f["DESSERT"].keys()), list(f["BEVERAGE"].keys())
+def _choices_bmi(user): return STORE.dates(user, "bmi").choices()
+def _choices_tdee(user): return STORE.dates(user, "tdee").choices()
+
+def _meal_choices(user, table, query="", current=None):
+    """Choices for one meal dropdown: "-", the current pick, then the top matches."""
+    found = STORE.foods(user)[table].search(query, FOOD_CHOICES_K)
+    head = [foods.SENTINEL]
+    if current and current != foods.SENTINEL and current not in found:
+        head.append(current)
+    return head + found
+
+MEAL_SLOTS = ("MAIN", "DESSERT", "BEVERAGE") * 3   # B/L/D × Main/Dessert/Beverage, in output order
+
+def _meal_updates(sent, slots):
+    """Updates for the nine meal dropdowns, plus the new per-session `sent` state.
+
+    `slots` holds, per dropdown, None (leave it alone) or (choices, value);
+    value None keeps the current pick.  `sent` remembers a hash of the choices
+    each dropdown last received, so an unchanged list becomes gr.skip()
+    instead of being sent again.
+    """
+    sent = list(sent) if sent and len(sent) == len(MEAL_SLOTS) else [None] * len(MEAL_SLOTS)
+    updates = []
+    for i, slot in enumerate(slots):
+        changes = {}
+        if slot is not None:
+            choices, value = slot
+            key = hash(tuple(choices))
+            if key != sent[i]:
+                changes["choices"] = choices
+                sent[i] = key
+            if value is not None:
+                changes["value"] = value
+        updates.append(gr.update(**changes) if changes else gr.skip())
+    return updates, tuple(sent)
 
 # -----------------------------
 # Login / Logout 
 # -----------------------------
-def do_login(username):
+def do_login(username, meal_sent=()):
     username = (username or "").strip()
     if not username:
         gr.Error("Please enter a username.")
-        blank_foods = [gr.update(choices=[])] * 9
+        blank_foods, meal_sent = _meal_updates(meal_sent, [([], None)] * len(MEAL_SLOTS))
         return (
             gr.update(value=None),
             gr.update(visible=False),
@@ -198,19 +162,17 @@ def do_login(username):
             gr.update(choices=[]),
             gr.update(choices=[]),
             gr.update(value=""),
-            *blank_foods
+            *blank_foods,
+            gr.update(choices=[], value=None),
+            None,
+            meal_sent,
         )
-    SESSION["current_user"] = username
     ensure_user(username)
-    bmi_series = {k: v["bmi"] for k, v in users[username]["bmi_records"].items()}
-    bmi_plot_path = plot_bmi_series(bmi_series)
-    # food choices for 9 dropdowns (B/L/D × Main/Dessert/Beverage)
-    main_c, des_c, bev_c = _food_choices(username)
-    food_updates = [
-        gr.update(choices=main_c), gr.update(choices=des_c), gr.update(choices=bev_c),  # Breakfast
-        gr.update(choices=main_c), gr.update(choices=des_c), gr.update(choices=bev_c),  # Lunch
-        gr.update(choices=main_c), gr.update(choices=des_c), gr.update(choices=bev_c),  # Dinner
-    ]
+    bmi_series = STORE.bmi_series(username)
+    bmi_plot_path = plot_bmi_series(bmi_series, username)
+    # food choices for 9 dropdowns (B/L/D × Main/Dessert/Beverage): 3 distinct lists
+    lists = {table: _meal_choices(username, table) for table in set(MEAL_SLOTS)}
+    food_updates, meal_sent = _meal_updates(meal_sent, [(lists[t], None) for t in MEAL_SLOTS])
     gr.Info(f"Welcome, {username}!")
     return (
         gr.update(value=username),
@@ -221,12 +183,14 @@ def do_login(username):
         gr.update(choices=_choices_bmi(username)),   # Tab2 BMI-date dropdown
         gr.update(choices=_choices_tdee(username)),  # Tab3 TDEE-date dropdown
         gr.update(value=""),                         # Tab2 output clear
-        *food_updates
+        *food_updates,
+        gr.update(choices=_template_choices(username), value=None),
+        username,                                    # per-session user
+        meal_sent,
     )
 
-def do_logout():
-    SESSION["current_user"] = None
-    blank_foods = [gr.update(choices=[])] * 9
+def do_logout(meal_sent=()):
+    blank_foods, meal_sent = _meal_updates(meal_sent, [([], None)] * len(MEAL_SLOTS))
     gr.Info("Logged out.")
     return (
         gr.update(value=""),
@@ -237,144 +201,124 @@ def do_logout():
         gr.update(choices=[]),
         gr.update(choices=[]),
         gr.update(value=""),
-        *blank_foods
+        *blank_foods,
+        gr.update(choices=[], value=None),
+        None,
+        meal_sent,
     )
 
 # -----------------------------
 # Tab 1 — BMI 
 # -----------------------------
-ALLOWED = {"h_cm_min": 100, "h_cm_max": 250, "w_kg_min": 30, "w_kg_max": 200, "bmi_min": 10, "bmi_max": 70}
-
-def bmi_add_record(unit, height_in, weight_in, date_text, confirm_out_of_range):
-    user = SESSION["current_user"]
+def bmi_add_record(user, unit, height_in, weight_in, date_text, confirm_out_of_range):
     if not user:
         gr.Error("Please login first.")
         return ("Please login first.", None, gr.update(choices=[]), gr.update(choices=[]),
-                gr.update(choices=[]), plot_bmi_series({}), gr.update(visible=False, value=None))
+                gr.update(choices=[]), empty_chart("bmi"), gr.update(visible=False, value=None))
     d_str = parse_date_str(date_text)
     if d_str is None:
         gr.Warning("Enter a valid date in YYYY-MM-DD format.")
         return ("Invalid date format.", None, gr.update(choices=_choices_bmi(user)),
                 gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_tdee(user)),
-                plot_bmi_series({k:v["bmi"] for k,v in users[user]["bmi_records"].items()}),
+                plot_bmi_series(STORE.bmi_series(user), user),
                 gr.update(visible=False, value=None))
     h_cm, w_kg = unit_to_metric(unit, height_in, weight_in)
     if h_cm is None or w_kg is None:
         gr.Warning("Height/Weight must be numbers.")
         return ("Height/Weight must be numbers.", None, gr.update(choices=_choices_bmi(user)),
                 gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_tdee(user)),
-                plot_bmi_series({k:v["bmi"] for k,v in users[user]["bmi_records"].items()}),
+                plot_bmi_series(STORE.bmi_series(user), user),
                 gr.update(visible=False, value=None))
-    if d_str in users[user]["bmi_records"]:
+    if d_str in STORE.bmi_records(user):
         gr.Warning(f"Data already exists on {d_str}. Clear it first to enter again.")
         return (f"You already have data on {d_str}. Clear it first to enter again.", None,
                 gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_bmi(user)),
                 gr.update(choices=_choices_tdee(user)),
-                plot_bmi_series({k:v["bmi"] for k,v in users[user]["bmi_records"].items()}),
+                plot_bmi_series(STORE.bmi_series(user), user),
                 gr.update(visible=False, value=None))
     bmi_val = calc_bmi(h_cm, w_kg)
     if bmi_val is None:
         gr.Error("Unable to compute BMI. Check your inputs.")
         return ("Unable to compute BMI.", None, gr.update(choices=_choices_bmi(user)),
                 gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_tdee(user)),
-                plot_bmi_series({k:v["bmi"] for k,v in users[user]["bmi_records"].items()}),
+                plot_bmi_series(STORE.bmi_series(user), user),
                 gr.update(visible=False, value=None))
-    out_of_range = not (ALLOWED["h_cm_min"] <= h_cm <= ALLOWED["h_cm_max"]) or \
-                   not (ALLOWED["w_kg_min"] <= w_kg <= ALLOWED["w_kg_max"]) or \
-                   not (ALLOWED["bmi_min"] <= bmi_val <= ALLOWED["bmi_max"])
+    out_of_range = is_out_of_range(h_cm, w_kg, bmi_val)
     if out_of_range and confirm_out_of_range is None:
         gr.Warning("Value looks out of the allowed range. Confirm True/False, then click Save again.")
         return ("Please confirm out-of-range entry.", None, gr.update(choices=_choices_bmi(user)),
                 gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_tdee(user)),
-                plot_bmi_series({k:v["bmi"] for k,v in users[user]["bmi_records"].items()}),
+                plot_bmi_series(STORE.bmi_series(user), user),
                 gr.update(visible=True, value=None))
     if out_of_range and confirm_out_of_range is False:
         gr.Info("Data NOT saved. Re-enter within allowed ranges.")
         return ("Data NOT saved. Use: Height 100–250 cm, Weight 30–200 kg, BMI 10–70.", None,
                 gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_bmi(user)),
                 gr.update(choices=_choices_tdee(user)),
-                plot_bmi_series({k:v["bmi"] for k,v in users[user]["bmi_records"].items()}),
+                plot_bmi_series(STORE.bmi_series(user), user),
                 gr.update(visible=False, value=None))
 
-    users[user]["bmi_records"][d_str] = {"h_cm": round(h_cm,2), "w_kg": round(w_kg,2), "bmi": round(bmi_val,2)}
+    STORE.put_bmi(user, d_str, {"h_cm": round(h_cm,2), "w_kg": round(w_kg,2), "bmi": round(bmi_val,2)})
     cat = bmi_category(bmi_val)
     msg = f"Saved for {d_str}: Height {h_cm:.1f} cm, Weight {w_kg:.1f} kg ⇒ BMI **{bmi_val:.1f}** ({cat})."
     if out_of_range and confirm_out_of_range is True:
         msg += " **You gotta be kidding me.**"
     gr.Info("BMI saved.")
-    series = {k:v["bmi"] for k,v in users[user]["bmi_records"].items()}
+    series = STORE.bmi_series(user)
     return (msg, round(bmi_val,2), gr.update(choices=_choices_bmi(user), value=d_str),
             gr.update(choices=_choices_bmi(user), value=d_str), gr.update(choices=_choices_tdee(user)),
-            plot_bmi_series(series), gr.update(visible=False, value=None))
+            plot_bmi_series(series, user), gr.update(visible=False, value=None))
 
-def bmi_view_on_date(date_text):
-    user = SESSION["current_user"]
+def bmi_view_on_date(user, date_text):
     if not user:
         gr.Error("Please login first."); return "Please login first."
     d_str = parse_date_str(date_text)
     if d_str is None:
         gr.Warning("Enter a valid date (YYYY-MM-DD)."); return "Invalid date."
-    rec = users[user]["bmi_records"].get(d_str)
+    rec = STORE.bmi_records(user).get(d_str)
     if not rec:
         gr.Info("No data on this date — please record your BMI first.")
         return "No data on this date — please record your BMI first."
     return f"{d_str}: Height {rec['h_cm']} cm, Weight {rec['w_kg']} kg, BMI **{rec['bmi']}** ({bmi_category(rec['bmi'])})."
 
-def bmi_clear_day(date_text):
-    user = SESSION["current_user"]
+def bmi_clear_day(user, date_text):
     if not user:
-        gr.Error("Please login first."); return ("Please login first.", plot_bmi_series({}),
+        gr.Error("Please login first."); return ("Please login first.", empty_chart("bmi"),
                                                  gr.update(choices=[]), gr.update(choices=[]), gr.update(choices=[]))
     d_str = parse_date_str(date_text)
     if d_str is None:
         gr.Warning("Enter a valid date (YYYY-MM-DD).")
-        return ("Invalid date.", plot_bmi_series({k:v["bmi"] for k,v in users[user]["bmi_records"].items()}),
+        return ("Invalid date.", plot_bmi_series(STORE.bmi_series(user), user),
                 gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_bmi(user)),
                 gr.update(choices=_choices_tdee(user)))
-    if d_str in users[user]["bmi_records"]:
-        users[user]["bmi_records"].pop(d_str, None)
-        users[user]["tdee_records"].pop(d_str, None)
+    if d_str in STORE.bmi_records(user):
+        STORE.delete_bmi(user, d_str)
+        STORE.delete_tdee(user, d_str)
         gr.Info(f"Cleared BMI (and linked TDEE) on {d_str}."); msg = f"Cleared BMI (and linked TDEE) on {d_str}."
     else:
         gr.Info("Nothing to clear for that date."); msg = "Nothing to clear for that date."
-    series = {k:v["bmi"] for k,v in users[user]["bmi_records"].items()}
-    return (msg, plot_bmi_series(series), gr.update(choices=_choices_bmi(user)),
+    series = STORE.bmi_series(user)
+    return (msg, plot_bmi_series(series, user), gr.update(choices=_choices_bmi(user)),
             gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_tdee(user)))
 
 # -----------------------------
 # Tab 2 — BMR/TDEE 
 # -----------------------------
-ACTIVITY_FACTORS = {
-    "Sedentary (little/no exercise)": 1.2,
-    "Light (1–3 days/wk)": 1.375,
-    "Moderate (3–5 days/wk)": 1.55,
-    "Active (6–7 days/wk)": 1.725,
-    "Very active (hard exercise)": 1.9
-}
-
-def hb_bmr(gender, age, h_cm, w_kg):
-    if gender == "Male":
-        return 88.362 + 13.397*w_kg + 4.799*h_cm - 5.677*age
-    else:
-        return 447.593 + 9.247*w_kg + 3.098*h_cm - 4.330*age
-
-def t2_on_date_change(bmi_date_choice):
-    user = SESSION["current_user"]
+def t2_on_date_change(user, bmi_date_choice):
     if not user:
         gr.Error("Please login first.")
         return ("Please login first.", gr.update(value=None), gr.update(value=None), gr.update(value=""))
     if not bmi_date_choice:
         gr.Warning("Pick a BMI date from Tab 1.")
         return ("Pick a BMI date from Tab 1.", gr.update(value=None), gr.update(value=None), gr.update(value=""))
-    rec = users[user]["bmi_records"].get(bmi_date_choice)
+    rec = STORE.bmi_records(user).get(bmi_date_choice)
     if not rec:
         gr.Warning("No BMI data on that date — record in Tab 1 first.")
         return ("No BMI data on that date — record in Tab 1 first.", gr.update(value=None), gr.update(value=None), gr.update(value=bmi_date_choice))
     gr.Info(f"Loaded height/weight from {bmi_date_choice}.")
     return (f"Loaded from Tab 1 ({bmi_date_choice}).", gr.update(value=rec["h_cm"]), gr.update(value=rec["w_kg"]), gr.update(value=bmi_date_choice))
 
-def t2_compute_and_save(t2_date_locked, gender, age, activity, height_cm, weight_kg, confirm_age_ok):
-    user = SESSION["current_user"]
+def t2_compute_and_save(user, t2_date_locked, gender, age, activity, height_cm, weight_kg, confirm_age_ok):
     if not user:
         gr.Error("Please login first.")
         return ("Please login first.", gr.update(value=""), gr.update(choices=_choices_tdee("n/a")), gr.update(visible=False, value=None))
@@ -402,179 +346,263 @@ def t2_compute_and_save(t2_date_locked, gender, age, activity, height_cm, weight
 
     bmr = hb_bmr(gender, age_val, float(height_cm), float(weight_kg))
     tdee = bmr * ACTIVITY_FACTORS[activity]
-    users[user]["tdee_records"][d_str] = {
+    STORE.put_tdee(user, d_str, {
         "bmr": round(bmr, 2), "tdee": round(tdee, 2), "gender": gender, "age": age_val,
         "activity": activity, "h_cm": float(height_cm), "w_kg": float(weight_kg),
-    }
-    html = f"""
-<div class="card">
-  <div class="card-title">TDEE Summary — {d_str}</div>
-  <div class="grid">
-    <div class="item"><div class="label">Gender</div><div class="value">{gender}</div></div>
-    <div class="item"><div class="label">Age</div><div class="value">{age_val}</div></div>
-    <div class="item"><div class="label">Height</div><div class="value">{float(height_cm):.1f} cm</div></div>
-    <div class="item"><div class="label">Weight</div><div class="value">{float(weight_kg):.1f} kg</div></div>
-    <div class="item"><div class="label">Activity</div><div class="value">{activity}</div></div>
-  </div>
-  <div class="stats">
-    <div class="stat"><div class="stat-label">BMR</div><div class="stat-value">{bmr:.0f} kcal/day</div></div>
-    <div class="stat"><div class="stat-label">TDEE</div><div class="stat-value">{tdee:.0f} kcal/day</div></div>
-  </div>
-</div>
-"""
+    })
+    html = cards.tdee_card(d_str, gender, age_val, float(height_cm), float(weight_kg), activity, bmr, tdee)
     gr.Info("TDEE saved.")
     return ("Calculated & saved.", gr.update(value=html), gr.update(choices=_choices_tdee(user)), gr.update(visible=False, value=None))
 
 # -----------------------------
 # Tab 3 — Food Tracker
 # -----------------------------
-GOALS = ["Lose (-20%)", "Maintenance (0%)", "Gain (+15%)"]
-
-def _meal_total_for_user(user, m, d, b):
-    foods = users[user]["foods"]
-    return foods["MAIN"].get(m, 0) + foods["DESSERT"].get(d, 0) + foods["BEVERAGE"].get(b, 0)
-
-def ft_on_date_or_goal_change(date_choice, goal_choice):
+def _period_summary(user, ref_date_str, target):
+    """Week / month totals, average per logged day and streak, from STORE.food_stats."""
+    if not user:
+        return ""
+    ref = ref_date_str or today_str()
+    stats = STORE.food_stats(user)
+    lines = []
+    for name, s in (("Last 7 days", stats.week(ref, target)), ("This month", stats.month(ref, target))):
+        line = f"**{name}** ({s['from']} → {s['to']}): {s['total']:.0f} kcal over {s['logged_days']} logged day(s), avg {s['avg']:.0f} kcal/day"
+        if s["vs_target"] is not None:
+            word = "surplus" if s["vs_target"] > 0 else "deficit"
+            line += f" — {word} {abs(s['vs_target']):.0f} kcal vs target"
+        lines.append(line)
+    lines.append(f"**Streak:** {stats.streak(ref)} day(s) logged in a row up to {ref}")
+    return "\n\n".join(lines)
+
+def ft_on_date_or_goal_change(user, date_choice, goal_choice):
     """Auto-link TDEE and recompute target when the date/goal changes. Also refresh chart."""
-    user = SESSION["current_user"]
     if not user:
         gr.Error("Please login first.")
-        return ("Please login first.", gr.update(value=0), "Target: 0 kcal", plot_food_week({}, None, 0))
+        return ("Please login first.", gr.update(value=0), "Target: 0 kcal", empty_chart("food"), "")
     if not date_choice:
-        return ("Pick a date that has TDEE (Tab 2).", gr.update(value=0), "Target: 0 kcal", plot_food_week(users[user]["food_log"], None, 0))
-    rec = users[user]["tdee_records"].get(date_choice)
+        return ("Pick a date that has TDEE (Tab 2).", gr.update(value=0), "Target: 0 kcal",
+                plot_food_week(STORE.food_stats(user), None, 0, user), _period_summary(user, None, 0))
+    rec = STORE.tdee_records(user).get(date_choice)
     if not rec:
         gr.Warning("No TDEE on this date — compute in Tab 2 first.")
-        return ("No TDEE on this date — compute in Tab 2 first.", gr.update(value=0), "Target: 0 kcal", plot_food_week(users[user]["food_log"], date_choice, 0))
+        return ("No TDEE on this date — compute in Tab 2 first.", gr.update(value=0), "Target: 0 kcal",
+                plot_food_week(STORE.food_stats(user), date_choice, 0, user), _period_summary(user, date_choice, 0))
     tdee = rec["tdee"]
     target = compute_target_from_goal(tdee, goal_choice)
     gr.Info(f"Linked TDEE for {date_choice}. Target: {target:.0f} kcal.")
-    chart = plot_food_week(users[user]["food_log"], date_choice, target)
-    return (f"Linked TDEE from Tab 2 ({date_choice}).", gr.update(value=tdee), f"Target: {target:.0f} kcal", chart)
-
-def ft_add_custom_food(name, ftype, kcal,
-                       bm, bd, bb, lm, ld, lb, dm, dd, db):
-    """Add new food to per-user tables and refresh ALL meal dropdowns."""
-    user = SESSION["current_user"]
+    chart = plot_food_week(STORE.food_stats(user), date_choice, target, user)
+    return (f"Linked TDEE from Tab 2 ({date_choice}).", gr.update(value=tdee), f"Target: {target:.0f} kcal", chart,
+            _period_summary(user, date_choice, target))
+
+def ft_add_custom_food(user, name, ftype, kcal,
+                       bm, bd, bb, lm, ld, lb, dm, dd, db, meal_sent=()):
+    """Add new food to per-user tables and refresh the meal dropdowns of its type."""
+    unchanged = [gr.skip()] * len(MEAL_SLOTS)
     if not user:
         gr.Error("Please login first.")
-        updates = [gr.update()] * 9
-        return "Please login first.", *updates
+        return "Please login first.", *unchanged, meal_sent
     name = (name or "").strip()
     if not name:
-        gr.Warning("Please enter a food name."); updates = [gr.update()] * 9
-        return "Enter a food name.", *updates
+        gr.Warning("Please enter a food name.")
+        return "Enter a food name.", *unchanged, meal_sent
     if ftype not in ("Main", "Dessert", "Beverage"):
-        gr.Warning("Choose a valid type."); updates = [gr.update()] * 9
-        return "Choose a valid type.", *updates
+        gr.Warning("Choose a valid type.")
+        return "Choose a valid type.", *unchanged, meal_sent
     try:
         kcal = float(kcal)
-        if kcal < 0: raise ValueError
+        if not math.isfinite(kcal) or kcal < 0: raise ValueError
     except Exception:
-        gr.Warning("Calories must be a positive number."); updates = [gr.update()] * 9
-        return "Calories must be a positive number.", *updates
+        gr.Warning("Calories must be a positive number.")
+        return "Calories must be a positive number.", *unchanged, meal_sent
 
     table_key = {"Main": "MAIN", "Dessert": "DESSERT", "Beverage": "BEVERAGE"}[ftype]
-    tbl = users[user]["foods"][table_key]
-    if name in tbl:
+    if name in STORE.foods(user)[table_key]:
         gr.Info("Updated existing food calories.")
-    new_tbl = {"-": 0, name: kcal}
-    for k, v in tbl.items():
-        if k == "-": continue
-        if k != name:
-            new_tbl[k] = v
-    users[user]["foods"][table_key] = new_tbl
-
-    main_c, des_c, bev_c = _food_choices(user)
-    gr.Info(f"Added '{name}' to {ftype}.")
-    def pick(value, choices):
-        return value if value in choices else "-"
-    return (
-        f"Added: {name} ({ftype}) = {kcal:.0f} kcal",
-        gr.update(choices=main_c, value=pick(bm, main_c)),
-        gr.update(choices=des_c, value=pick(bd, des_c)),
-        gr.update(choices=bev_c, value=pick(bb, bev_c)),
-        gr.update(choices=main_c, value=pick(lm, main_c)),
-        gr.update(choices=des_c, value=pick(ld, des_c)),
-        gr.update(choices=bev_c, value=pick(lb, bev_c)),
-        gr.update(choices=main_c, value=pick(dm, main_c)),
-        gr.update(choices=des_c, value=pick(dd, des_c)),
-        gr.update(choices=bev_c, value=pick(db, bev_c)),
-    )
+    STORE.put_food(user, table_key, name, kcal)
+    tables = STORE.foods(user)
+    for tpl_name, tpl in foods.reprice_templates(STORE.meal_templates(user), tables, name).items():
+        STORE.put_meal_template(user, tpl_name, tpl)
 
-def ft_log_day(date_choice, tdee_val, goal_choice,
+    gr.Info(f"Added '{name}' to {ftype}.")
+    # only the three dropdowns of this type can change; the other six are skipped
+    table = tables[table_key]
+    slots = []
+    for slot_table, value in zip(MEAL_SLOTS, (bm, bd, bb, lm, ld, lb, dm, dd, db)):
+        if slot_table != table_key:
+            slots.append(None)
+            continue
+        keep = value if value in table else foods.SENTINEL
+        slots.append((_meal_choices(user, table_key, current=keep), None if keep == value else keep))
+    updates, meal_sent = _meal_updates(meal_sent, slots)
+    return f"Added: {name} ({ftype}) = {kcal:.0f} kcal", *updates, meal_sent
+
+def ft_search_food(user, table, current, query):
+    """Refresh one meal dropdown with the top matches for what the user typed."""
+    if not user:
+        return gr.skip()
+    return gr.update(choices=_meal_choices(user, table, query, current))
+
+def _food_search(slot):
+    def ft_search_meal(user, current, meal_sent, key: gr.KeyUpData):
+        # the dropdown now shows search results, so forget what it was last sent
+        sent = list(meal_sent) if meal_sent and len(meal_sent) == len(MEAL_SLOTS) else [None] * len(MEAL_SLOTS)
+        sent[slot] = None
+        return ft_search_food(user, MEAL_SLOTS[slot], current, key.input_value), tuple(sent)
+    return ft_search_meal
+
+def ft_log_day(user, date_choice, tdee_val, goal_choice,
                bm, bd, bb, lm, ld, lb, dm, dd, db, manual):
-    user = SESSION["current_user"]
     if not user:
         gr.Error("Please login first.")
-        return (0, "Please login first.", plot_food_week({}, None, 0))
+        return (0, "Please login first.", empty_chart("food"), "")
     if not date_choice:
         gr.Warning("Pick a date from the dropdown.")
-        return (0, "Pick a date.", plot_food_week(users[user]["food_log"], None, 0))
+        return (0, "Pick a date.", plot_food_week(STORE.food_stats(user), None, 0, user), _period_summary(user, None, 0))
 
-    b = _meal_total_for_user(user, bm, bd, bb)
-    l = _meal_total_for_user(user, lm, ld, lb)
-    d = _meal_total_for_user(user, dm, dd, db)
-    manual = manual if (manual and manual > 0) else 0
+    b, l, d = foods.day_meals(STORE.foods(user), (bm, bd, bb, lm, ld, lb, dm, dd, db))
+    manual = manual if (manual and math.isfinite(manual) and manual > 0) else 0
     total = b + l + d + manual
 
-    users[user]["food_log"][date_choice] = total
+    STORE.put_food_log(user, date_choice, total)
 
     target = compute_target_from_goal(tdee_val, goal_choice)
-    if target > 0:
-        delta = total - target
-        diff = f" Over target by <b>+{delta:.0f} kcal</b>" if delta > 0 else f" Under target by <b>{abs(delta):.0f} kcal</b>"
-        pct = max(0, min(100, (total / target) * 100))
-    else:
-        diff = "ℹ️ Target is 0; select a date with TDEE and goal."
-        pct = 0
-
-    info_html = f"""
-<div class="card">
-  <div class="card-title">Daily Summary — {date_choice}</div>
-  <div class="grid" style="grid-template-columns: repeat(4,1fr);">
-    <div class="item"><div class="label">Breakfast</div><div class="value">{b} kcal</div></div>
-    <div class="item"><div class="label">Lunch</div><div class="value">{l} kcal</div></div>
-    <div class="item"><div class="label">Dinner</div><div class="value">{d} kcal</div></div>
-    <div class="item"><div class="label">Manual</div><div class="value">{manual} kcal</div></div>
-  </div>
-  <div class="stat" style="margin-top:10px;">
-    <div class="stat-label">Total</div>
-    <div class="stat-value">{total} kcal</div>
-  </div>
-  <div style="margin-top:10px">
-    <div class="label">Progress vs Target</div>
-    <div style="height:14px; background:#222; border:1px solid var(--neon); border-radius:10px; overflow:hidden;">
-      <div style="height:100%; width:{pct:.0f}%; background:linear-gradient(90deg, #39ff14, #ff9f1c);"></div>
-    </div>
-    <div style="margin-top:6px">Target: <b>{target:.0f} kcal</b> — {diff}</div>
-  </div>
-</div>
-"""
-    chart = plot_food_week(users[user]["food_log"], date_choice, target)
+    info_html = cards.day_card(date_choice, b, l, d, manual, total, target)
+    chart = plot_food_week(STORE.food_stats(user), date_choice, target, user)
     gr.Info("Logged today’s calories.")
-    return (total, info_html, chart)
+    return (total, info_html, chart, _period_summary(user, date_choice, target))
 
-def ft_reset_day(date_choice, goal_choice):
-    user = SESSION["current_user"]
+def ft_reset_day(user, date_choice, goal_choice):
     if not user:
-        gr.Error("Please login first."); return (0, "Please login first.", plot_food_week({}, None, 0))
+        gr.Error("Please login first."); return (0, "Please login first.", empty_chart("food"), "")
     if not date_choice:
         gr.Warning("Pick a date from the dropdown.")
-        return (0, "Pick a date.", plot_food_week(users[user]["food_log"], None, 0))
-    users[user]["food_log"][date_choice] = 0
-    target = compute_target_from_goal(users[user]["tdee_records"].get(date_choice, {}).get("tdee", 0), goal_choice)
+        return (0, "Pick a date.", plot_food_week(STORE.food_stats(user), None, 0, user), _period_summary(user, None, 0))
+    STORE.put_food_log(user, date_choice, 0)
+    target = compute_target_from_goal(STORE.tdee_records(user).get(date_choice, {}).get("tdee", 0), goal_choice)
     gr.Info(f"Cleared totals for {date_choice}.")
-    return (0, f"Cleared totals for {date_choice}.", plot_food_week(users[user]["food_log"], date_choice, target))
+    return (0, f"Cleared totals for {date_choice}.", plot_food_week(STORE.food_stats(user), date_choice, target, user),
+            _period_summary(user, date_choice, target))
 
-def ft_clear_all(goal_choice):
-    user = SESSION["current_user"]
+def ft_clear_all(user, goal_choice):
     if not user:
-        gr.Error("Please login first."); return (0, "Please login first.", plot_food_week({}, None, 0))
-    users[user]["food_log"].clear()
+        gr.Error("Please login first."); return (0, "Please login first.", empty_chart("food"), "")
+    STORE.clear_food_log(user)
     gr.Info("Cleared log.")
     target = 0
-    return (0, "Cleared log.", plot_food_week(users[user]["food_log"], None, target))
+    return (0, "Cleared log.", plot_food_week(STORE.food_stats(user), None, target, user), _period_summary(user, None, target))
+
+def _template_choices(user):
+    return sorted(STORE.meal_templates(user)) if user else []
+
+def ft_save_template(user, name, bm, bd, bb, lm, ld, lb, dm, dd, db):
+    """Save the nine current meal picks under `name`, priced once now."""
+    if not user:
+        gr.Error("Please login first."); return "Please login first.", gr.skip()
+    name = (name or "").strip()
+    if not name:
+        gr.Warning("Please enter a template name.")
+        return "Enter a template name.", gr.skip()
+    tpl = foods.meal_template(STORE.foods(user), (bm, bd, bb, lm, ld, lb, dm, dd, db))
+    STORE.put_meal_template(user, name, tpl)
+    b, l, d = tpl["meals"]
+    gr.Info(f"Saved template '{name}'.")
+    return (f"Saved **{name}**: breakfast {b:.0f} + lunch {l:.0f} + dinner {d:.0f} = {tpl['kcal']:.0f} kcal/day",
+            gr.update(choices=_template_choices(user), value=name))
+
+def ft_delete_template(user, name):
+    if not user:
+        gr.Error("Please login first."); return "Please login first.", gr.skip()
+    if not name:
+        gr.Warning("Pick a template."); return "Pick a template.", gr.skip()
+    STORE.delete_meal_template(user, name)
+    gr.Info(f"Deleted template '{name}'.")
+    return f"Deleted **{name}**.", gr.update(choices=_template_choices(user), value=None)
+
+def ft_apply_template(user, name, from_text, to_text, tdee_val, goal_choice):
+    """Log a template's total on every day from `from_text` to `to_text` (inclusive):
+    one store write and one chart for the whole range."""
+    if not user:
+        gr.Error("Please login first."); return ("Please login first.", empty_chart("food"), "")
+    tpl = STORE.meal_templates(user).get(name) if name else None
+    if tpl is None:
+        gr.Warning("Pick a template.")
+        return "Pick a template.", gr.skip(), gr.skip()
+    lo = dates.parse(from_text or "")
+    hi = dates.parse(to_text) if (to_text or "").strip() else lo
+    if lo is None or hi is None or hi < lo:
+        gr.Warning("Enter a valid date range (YYYY-MM-DD).")
+        return "Enter a valid date range (YYYY-MM-DD).", gr.skip(), gr.skip()
+    if hi - lo + 1 > MAX_TEMPLATE_DAYS:
+        gr.Warning(f"At most {MAX_TEMPLATE_DAYS} days at once.")
+        return f"At most {MAX_TEMPLATE_DAYS} days at once.", gr.skip(), gr.skip()
+
+    days = dates.to_days(range(lo, hi + 1))
+    STORE.put_food_log_many(user, [(day, tpl["kcal"]) for day in days])
+
+    target = compute_target_from_goal(tdee_val, goal_choice)
+    gr.Info(f"Applied '{name}' to {len(days)} day(s).")
+    return (f"Logged **{name}** ({tpl['kcal']:.0f} kcal) on {len(days)} day(s), {days[0]} → {days[-1]}.",
+            plot_food_week(STORE.food_stats(user), days[-1], target, user), _period_summary(user, days[-1], target))
+
+# -----------------------------
+# Tab 4 — Data (import / export)
+# -----------------------------
+def data_import(user, file_path, allow_out_of_range, progress=gr.Progress()):
+    if not user:
+        gr.Error("Please login first.")
+        return ("Please login first.", empty_chart("bmi"), gr.update(choices=[]), gr.update(choices=[]), gr.update(choices=[]))
+    if not file_path:
+        gr.Warning("Choose a CSV or JSONL file first.")
+        return ("Choose a CSV or JSONL file first.", plot_bmi_series(STORE.bmi_series(user), user),
+                gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_bmi(user)),
+                gr.update(choices=_choices_tdee(user)))
+
+    def on_batch(report, fraction):
+        progress(fraction, desc=f"{report.rows} rows ({report.rows_per_sec:,.0f} rows/s)")
+
+    report = importer.import_file(STORE, file_path, default_user=user,
+                                  allow_out_of_range=bool(allow_out_of_range), progress=on_batch)
+    msg = report.summary()
+    if report.errors:
+        shown = "\n".join(f"- row {n}: {err}" for n, err in report.errors[:50])
+        more = report.rejected - min(len(report.errors), 50)
+        msg += "\n\n**Rejected rows**\n" + shown + (f"\n- … and {more} more" if more > 0 else "")
+    gr.Info(f"Imported {report.bmi_saved + report.tdee_saved + report.food_saved} records.")
+    return (msg, plot_bmi_series(STORE.bmi_series(user), user),
+            gr.update(choices=_choices_bmi(user)), gr.update(choices=_choices_bmi(user)),
+            gr.update(choices=_choices_tdee(user)))
+
+def data_export(user, fmt):
+    if not user:
+        gr.Error("Please login first."); return "Please login first.", None
+    try:
+        path = exporter.export_user(STORE, user, fmt)
+    except (RuntimeError, ValueError) as e:
+        gr.Warning(str(e)); return str(e), None
+    gr.Info("Export ready.")
+    return f"Exported full history as {fmt}.", path
+
+# -----------------------------
+# Tab 5 — Cohort (clinicians)
+# -----------------------------
+def cohort_refresh(user):
+    """Category mix by month, average TDEE by activity and target adherence over every user."""
+    if user not in CLINICIANS:
+        gr.Error("The cohort view is for clinicians only.")
+        return "The cohort view is for clinicians only.", None, None, None
+    totals, info = cohort.compute(STORE)
+    cats = list(totals["current"])
+    current = ", ".join(f"{c} {n}" for c, n in totals["current"].items())
+    summary = (f"**{totals['users']} users** — {totals['with_bmi']} with BMI ({current}), "
+               f"{totals['with_food']} with food logs against a TDEE target.\n\n"
+               f"Computed in {info['seconds'] * 1000:.0f} ms ({info['recomputed']} user(s) recomputed, "
+               f"{info['users'] - info['recomputed']} cached).")
+    months = [[month, *(counts[c] for c in cats), sum(counts.values())] for month, counts in totals["months"].items()]
+    activity = [[act, n, round(avg)] for act, (avg, n) in totals["activity"].items()]
+    adherence = []
+    for goal, counts in totals["adherence"].items():             # under, within, over
+        n = sum(counts)
+        adherence.append([goal, n, *(round(100 * x / n, 1) if n else 0.0 for x in counts)])
+    return summary, months, activity, adherence
 
 # -----------------------------
 # Custom CSS 
@@ -619,6 +647,8 @@ div[class*="absolute"][class*="top-4"][class*="right-4"] {
 # -----------------------------
 with gr.Blocks(title="BME Health Calculator", css=CSS) as demo:
     gr.Markdown("# 🎮 BME Health Calculator")
+    session_user = gr.State(None)
+    meal_sent = gr.State(())      # hash of the choices each meal dropdown last received
     with gr.Row():
         username = gr.Textbox(label="Username", placeholder="Enter a username to start", scale=3)
         login_btn = gr.Button("Log in", variant="primary")
@@ -631,7 +661,7 @@ with gr.Blocks(title="BME Health Calculator", css=CSS) as demo:
         with gr.Tab("BMI Calculator"):
             gr.Markdown("### Record and visualize BMI (one record per day)")
             with gr.Row():
-                unit = gr.Dropdown(["Metric (cm, kg)", "Imperial (inch, lb)"], value="Metric (cm, kg)", label="Unit System")
+                unit = gr.Dropdown([METRIC, IMPERIAL], value=METRIC, label="Unit System")
                 height_in = gr.Number(label="Height", precision=2)
                 weight_in = gr.Number(label="Weight", precision=2)
                 bmi_date = gr.Textbox(label="Date (YYYY-MM-DD)", value=today_str(), info="Type e.g. 2025-10-16")
@@ -642,7 +672,7 @@ with gr.Blocks(title="BME Health Calculator", css=CSS) as demo:
                 clear_bmi_btn = gr.Button("Clear this day")
             bmi_msg = gr.Markdown()
             bmi_value = gr.Number(label="BMI", interactive=False)
-            bmi_plot = gr.Image(value=plot_bmi_series({}), label="BMI Over Time", height=300)
+            bmi_plot = chart_component("bmi", "BMI Over Time")
             bmi_dates_for_tab1 = gr.Dropdown(label="Existing BMI dates (from Tab 1)", choices=[])
             view_bmi_btn = gr.Button("View selected date summary")
             view_bmi_out = gr.Markdown()
@@ -714,73 +744,179 @@ with gr.Blocks(title="BME Health Calculator", css=CSS) as demo:
 
             total_out = gr.Number(label="Total Calories Today", value=0)
             info_out = gr.HTML()
-            chart_out = gr.Image(value=plot_food_week({}, None, 0), label="Recent Week Chart", height=300)
+
+            # Meal templates: save the picks above, log them on a range of days
+            gr.Markdown("#### 📋 Meal templates")
+            with gr.Row():
+                template_name = gr.Textbox(label="Template name", placeholder="e.g. Workday")
+                save_tpl_btn = gr.Button("Save current meals as template")
+            with gr.Row():
+                template_dd = gr.Dropdown(label="Template", choices=[])
+                tpl_from = gr.Textbox(label="From (YYYY-MM-DD)", value=today_str())
+                tpl_to = gr.Textbox(label="To (YYYY-MM-DD, optional)")
+            with gr.Row():
+                apply_tpl_btn = gr.Button("Apply template to range", variant="primary")
+                delete_tpl_btn = gr.Button("Delete template")
+            tpl_msg = gr.Markdown()
+
+            chart_out = chart_component("food", "Recent Week Chart")
+            period_out = gr.Markdown()
+
+        # --- Tab 4  ---
+        with gr.Tab("Data"):
+            gr.Markdown("### Import history (CSV or JSONL)")
+            gr.Markdown("BMI rows: `date,height,weight[,unit]` — food rows: `date,kcal` — files exported below import back as-is. "
+                        "Dates that already have data are skipped.")
+            with gr.Row():
+                import_upload = gr.File(label="History file", file_types=[".csv", ".jsonl", ".ndjson"], type="filepath")
+                import_allow_oor = gr.Checkbox(label="Accept out-of-range BMI rows", value=False)
+            import_btn = gr.Button("Import", variant="primary")
+            import_msg = gr.Markdown()
+
+            gr.Markdown("### Export full history")
+            with gr.Row():
+                export_fmt = gr.Dropdown(list(exporter.FORMATS), value="CSV", label="Format")
+                export_btn = gr.Button("Export")
+            export_msg = gr.Markdown()
+            export_file = gr.File(label="Download", interactive=False)
+
+        # --- Tab 5  ---
+        with gr.Tab("Cohort", visible=bool(CLINICIANS)):
+            gr.Markdown("### All users (clinicians listed in `BME_CLINICIANS` only)")
+            cohort_btn = gr.Button("Refresh cohort", variant="primary")
+            cohort_summary = gr.Markdown()
+            gr.Markdown("#### BMI category by month (each user's last record in the month)")
+            cohort_months = gr.Dataframe(headers=["Month", *BMI_CATEGORIES, "Users"], interactive=False)
+            gr.Markdown("#### Average TDEE by activity level (latest TDEE per user)")
+            cohort_activity = gr.Dataframe(headers=["Activity", "Users", "Avg TDEE (kcal)"], interactive=False)
+            gr.Markdown(f"#### Calorie target adherence (logged days; on target = within ±{cohort.ADHERENCE_BAND:.0%})")
+            cohort_adherence = gr.Dataframe(headers=["Goal", "Days", "Under %", "On target %", "Over %"],
+                                            interactive=False)
 
     # -----------------------------
     # Wiring
     # -----------------------------
     # Login/Logout
     login_btn.click(
-        do_login, inputs=[username],
+        async_handler(do_login), inputs=[username, meal_sent],
         outputs=[username, app_panel, login_info, bmi_plot, bmi_dates_for_tab1, link_date, ft_date_dd, t2_big_output,
-                 bm, bd, bb, lm, ld, lb, dm, dd, db],
+                 bm, bd, bb, lm, ld, lb, dm, dd, db, template_dd, session_user, meal_sent],
     )
     logout_btn.click(
-        do_logout,
+        async_handler(do_logout), inputs=[meal_sent],
         outputs=[username, app_panel, login_info, bmi_plot, bmi_dates_for_tab1, link_date, ft_date_dd, t2_big_output,
-                 bm, bd, bb, lm, ld, lb, dm, dd, db],
+                 bm, bd, bb, lm, ld, lb, dm, dd, db, template_dd, session_user, meal_sent],
     )
 
     # Tab 1
     add_bmi_btn.click(
-        bmi_add_record,
-        inputs=[unit, height_in, weight_in, bmi_date, confirm_out],
+        async_handler(bmi_add_record),
+        inputs=[session_user, unit, height_in, weight_in, bmi_date, confirm_out],
         outputs=[bmi_msg, bmi_value, bmi_dates_for_tab1, link_date, ft_date_dd, bmi_plot, confirm_out],
     )
     clear_bmi_btn.click(
-        bmi_clear_day,
-        inputs=[bmi_date],
+        async_handler(bmi_clear_day),
+        inputs=[session_user, bmi_date],
         outputs=[bmi_msg, bmi_plot, bmi_dates_for_tab1, link_date, ft_date_dd],
     )
-    view_bmi_btn.click(bmi_view_on_date, inputs=[bmi_date], outputs=[view_bmi_out])
+    view_bmi_btn.click(async_handler(bmi_view_on_date), inputs=[session_user, bmi_date], outputs=[view_bmi_out])
 
     # Tab 2
     link_date.change(
-        t2_on_date_change,
-        inputs=[link_date],
+        async_handler(t2_on_date_change),
+        inputs=[session_user, link_date],
         outputs=[link_status, height_cm_t2, weight_kg_t2, t2_date_locked],
     )
     compute_btn.click(
-        t2_compute_and_save,
-        inputs=[t2_date_locked, gender, age, activity, height_cm_t2, weight_kg_t2, confirm_age_ok],
+        async_handler(t2_compute_and_save),
+        inputs=[session_user, t2_date_locked, gender, age, activity, height_cm_t2, weight_kg_t2, confirm_age_ok],
         outputs=[login_info, t2_big_output, ft_date_dd, confirm_age_ok],
     )
 
     # Tab 3 
-    ft_date_dd.change(ft_on_date_or_goal_change, inputs=[ft_date_dd, goal_choice], outputs=[tdee_link_status, tdee_val, target_label, chart_out])
-    goal_choice.change(ft_on_date_or_goal_change, inputs=[ft_date_dd, goal_choice], outputs=[tdee_link_status, tdee_val, target_label, chart_out])
+    ft_date_dd.change(async_handler(ft_on_date_or_goal_change), inputs=[session_user, ft_date_dd, goal_choice], outputs=[tdee_link_status, tdee_val, target_label, chart_out, period_out])
+    goal_choice.change(async_handler(ft_on_date_or_goal_change), inputs=[session_user, ft_date_dd, goal_choice], outputs=[tdee_link_status, tdee_val, target_label, chart_out, period_out])
 
     add_food_btn.click(
-        ft_add_custom_food,
-        inputs=[add_name, add_type, add_kcal, bm, bd, bb, lm, ld, lb, dm, dd, db],
-        outputs=[add_food_msg, bm, bd, bb, lm, ld, lb, dm, dd, db],
+        async_handler(ft_add_custom_food),
+        inputs=[session_user, add_name, add_type, add_kcal, bm, bd, bb, lm, ld, lb, dm, dd, db, meal_sent],
+        outputs=[add_food_msg, bm, bd, bb, lm, ld, lb, dm, dd, db, meal_sent],
     )
+    for slot, meal_dd in enumerate((bm, bd, bb, lm, ld, lb, dm, dd, db)):
+        meal_dd.key_up(async_handler(_food_search(slot)), inputs=[session_user, meal_dd, meal_sent], outputs=[meal_dd, meal_sent],
+                       queue=False, show_progress="hidden", trigger_mode="always_last", show_api=False)
     add_day_btn.click(
-        ft_log_day,
-        inputs=[ft_date_dd, tdee_val, goal_choice, bm, bd, bb, lm, ld, lb, dm, dd, db, manual],
-        outputs=[total_out, info_out, chart_out],
+        async_handler(ft_log_day),
+        inputs=[session_user, ft_date_dd, tdee_val, goal_choice, bm, bd, bb, lm, ld, lb, dm, dd, db, manual],
+        outputs=[total_out, info_out, chart_out, period_out],
     )
     reset_day_btn.click(
-        ft_reset_day,
-        inputs=[ft_date_dd, goal_choice],
-        outputs=[total_out, info_out, chart_out],
+        async_handler(ft_reset_day),
+        inputs=[session_user, ft_date_dd, goal_choice],
+        outputs=[total_out, info_out, chart_out, period_out],
     )
     clear_week_btn.click(
-        lambda goal: ft_clear_all(goal),
-        inputs=[goal_choice],
-        outputs=[total_out, info_out, chart_out],
+        async_handler(ft_clear_all),
+        inputs=[session_user, goal_choice],
+        outputs=[total_out, info_out, chart_out, period_out],
     )
+    save_tpl_btn.click(
+        async_handler(ft_save_template),
+        inputs=[session_user, template_name, bm, bd, bb, lm, ld, lb, dm, dd, db],
+        outputs=[tpl_msg, template_dd],
+    )
+    delete_tpl_btn.click(async_handler(ft_delete_template), inputs=[session_user, template_dd], outputs=[tpl_msg, template_dd])
+    apply_tpl_btn.click(
+        async_handler(ft_apply_template),
+        inputs=[session_user, template_dd, tpl_from, tpl_to, tdee_val, goal_choice],
+        outputs=[tpl_msg, chart_out, period_out],
+    )
+
+    # Tab 4
+    import_btn.click(
+        async_handler(data_import),
+        inputs=[session_user, import_upload, import_allow_oor],
+        outputs=[import_msg, bmi_plot, bmi_dates_for_tab1, link_date, ft_date_dd],
+    )
+    export_btn.click(async_handler(data_export), inputs=[session_user, export_fmt], outputs=[export_msg, export_file])
+
+    # Tab 5
+    cohort_btn.click(async_handler(cohort_refresh), inputs=[session_user],
+                     outputs=[cohort_summary, cohort_months, cohort_activity, cohort_adherence])
+
+instrument.instrument_blocks(demo)
+
+# -----------------------------
+# Metrics: BME_METRICS_PORT serves Prometheus text at /metrics,
+# BME_METRICS_LOG logs a summary every N seconds.
+# -----------------------------
+def metrics_gauges():
+    return {f"bme_chart_{k}": v for k, v in charts.metrics().items()}
+
+def start_metrics():
+    port = int(os.environ.get("BME_METRICS_PORT", "0") or 0)
+    interval = float(os.environ.get("BME_METRICS_LOG", "0") or 0)
+    if port:
+        instrument.serve(port, metrics_gauges)
+    if interval > 0:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+        instrument.start_log_dump(interval)
+    instrument.start_profiler()
 
 # Launch
 if __name__ == "__main__":
+    # BME_WORKERS > 1: this process only supervises that many app processes
+    if int(os.environ.get("BME_WORKERS", "1")) > 1:
+        raise SystemExit(cluster.run(int(os.environ["BME_WORKERS"]), [os.path.abspath(__file__)]))
+    # Handlers keep no process-wide session state, so events may run in parallel.
+    recovered = getattr(STORE, "recovered", None)          # BME_JOURNAL: what startup replayed
+    if recovered:
+        print(f"Journal: snapshot {recovered['snapshot']}, {recovered['records']} records replayed "
+              f"in {recovered['seconds']:.2f}s", flush=True)
+    charts.preload()          # fork the render workers before the server starts its threads
+    if CLINICIANS:
+        cohort.preload()
+    demo.queue(default_concurrency_limit=int(os.environ.get("BME_CONCURRENCY", "16")))
+    threading.Thread(target=foods.build_indexes, args=(STORE.catalog,), daemon=True).start()
+    start_metrics()
     demo.launch()
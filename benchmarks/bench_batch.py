@@ -0,0 +1,72 @@
+"""Vectorized cohort metrics vs the scalar per-row loop.
+
+    python benchmarks/bench_batch.py [--rows 1000000]
+
+Checks that both paths agree, then reports rows/s for each.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bme_health import batch, core
+
+
+def cohort(n, seed=0):
+    rng = np.random.default_rng(seed)
+    activities = np.array(list(core.ACTIVITY_FACTORS))
+    return {
+        "height": rng.uniform(90, 260, n),
+        "weight": rng.uniform(25, 210, n),
+        "age": rng.integers(10, 81, n),
+        "gender": rng.choice(["Male", "Female"], n),
+        "activity": activities[rng.integers(0, len(activities), n)],
+    }
+
+
+def scalar_loop(c, goal):
+    out = []
+    for h, w, a, g, act in zip(c["height"].tolist(), c["weight"].tolist(), c["age"].tolist(),
+                               c["gender"].tolist(), c["activity"].tolist()):
+        b = core.calc_bmi(h, w)
+        bmr = core.hb_bmr(g, a, h, w)
+        tdee = bmr * core.ACTIVITY_FACTORS[act]
+        out.append((b, core.bmi_category(b), not core.is_out_of_range(h, w, b),
+                    bmr, tdee, core.compute_target_from_goal(tdee, goal)))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--goal", default="Lose (-20%)")
+    args = ap.parse_args()
+    c = cohort(args.rows)
+
+    t0 = time.perf_counter()
+    ref = scalar_loop(c, args.goal)
+    t_scalar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    res = batch.bulk_metrics(c["height"], c["weight"], c["age"], c["gender"], c["activity"], goal=args.goal)
+    t_vec = time.perf_counter() - t0
+
+    ref_bmi, ref_cat, ref_ok, ref_bmr, ref_tdee, ref_target = map(list, zip(*ref))
+    assert np.allclose(res["bmi"], ref_bmi)
+    assert batch.category_names(res["category"]).tolist() == ref_cat
+    assert res["in_range"].tolist() == ref_ok
+    assert np.allclose(res["bmr"], ref_bmr) and np.allclose(res["tdee"], ref_tdee)
+    assert np.allclose(res["target"], ref_target)
+
+    print(f"rows: {args.rows:,}")
+    print(f"scalar loop : {t_scalar:8.3f} s  ({args.rows / t_scalar:,.0f} rows/s)")
+    print(f"vectorized  : {t_vec:8.3f} s  ({args.rows / t_vec:,.0f} rows/s)")
+    print(f"speedup     : {t_scalar / t_vec:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Rendering throughput of the HTML summary cards (``bme_health.cards``).
+
+For the TDEE card and the daily food summary card, reports cards/s for:
+
+  * uncached — the template substitution alone (the memoized function's
+    ``__wrapped__``), i.e. what every call cost before memoization
+  * repeat   — the same inputs again (a view of the same day): a cache hit
+  * distinct — new inputs every call (cache misses, evicting when full)
+
+First it checks that cached cards match uncached rendering, including an
+int and a float total with equal values (they render differently).
+
+    python benchmarks/bench_cards.py [--min-time 0.5]
+"""
+import argparse
+import itertools
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bme_health import cards
+
+ACTIVITY = "Light (1–3 days/wk)"
+
+
+def rate(fn, min_time):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return number / min(timer.repeat(3, number))
+
+
+def check():
+    """Cached cards equal the uncached rendering, whichever of 545 / 545.0 comes first."""
+    cards.day_card.cache_clear()
+    for total in (545, 545.0, 545, 545.0):
+        got = cards.day_card("2025-06-30", 545, 0, 0, 0, total, 2000)
+        assert got == cards.day_card.__wrapped__("2025-06-30", 545, 0, 0, 0, total, 2000), total
+        assert f"{total} kcal</div>" in got, total
+    for age in (34, 34.0):
+        got = cards.tdee_card("2025-06-30", "Female", age, 165.0, 58.0, ACTIVITY, 1320.25, 2046.4)
+        assert f'<div class="value">{age}</div>' in got, age
+    cards.day_card.cache_clear()
+    cards._tdee_card.cache_clear()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--min-time", type=float, default=0.5, help="seconds per timing run")
+    args = ap.parse_args()
+    check()
+    counter = itertools.count()
+
+    def tdee_args(i=0):
+        return ("2025-06-30", "Female", 34, 165.0, 58.0 + i / 10, ACTIVITY, 1320.25 + i, 2046.4 + i)
+
+    def day_args(i=0):
+        return ("2025-06-30", 545, 380, 610 + i, 120, 1655 + i, 2046.4)
+
+    cases = [
+        ("tdee uncached", lambda: cards._tdee_card.__wrapped__("2025-06-30", "Female", 34, "165.0", "58.0",
+                                                               ACTIVITY, "1320", "2046")),
+        ("tdee repeat", lambda: cards.tdee_card(*tdee_args())),
+        ("tdee distinct", lambda: cards.tdee_card(*tdee_args(next(counter)))),
+        ("day uncached", lambda: cards.day_card.__wrapped__(*day_args())),
+        ("day repeat", lambda: cards.day_card(*day_args())),
+        ("day distinct", lambda: cards.day_card(*day_args(next(counter)))),
+    ]
+    print(f"{'case':<16} {'cards/s':>12} {'per card':>10}")
+    for name, fn in cases:
+        r = rate(fn, args.min_time)
+        print(f"{name:<16} {r:>12,.0f} {1e6 / r:>8.2f} µs", flush=True)
+
+
+if __name__ == "__main__":
+    main()
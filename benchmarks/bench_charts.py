@@ -0,0 +1,81 @@
+"""PNG vs client-rendered charts: server CPU and payload per re-plot.
+
+Every request plots different data (as after a save or a date/goal change),
+so the PNG path always misses its cache and rasterizes.  CPU is process
+time (all threads, including the render executor) per request, and for
+the client path includes gradio's serialization of the frame; payload is
+the PNG file the browser downloads vs the JSON the native plot receives.
+
+    python benchmarks/bench_charts.py [--requests 100] [--points 30]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("BME_CHART_DIR", tempfile.mkdtemp(prefix="bme_bench_charts_"))
+
+import gradio as gr
+
+from bme_health import charts, plotdata
+from bme_health.core import bmi_category
+
+
+def bmi_points(i, n):
+    start = date(2024, 1, 1)
+    out = []
+    for k in range(n):
+        v = 20 + ((i * 7 + k * 3) % 90) / 10
+        out.append(((start + timedelta(days=k)).isoformat(), v, bmi_category(v)))
+    return out
+
+
+def food_week(i):
+    end = date(2024, 1, 1) + timedelta(days=i)
+    labels = [(end - timedelta(days=d)).isoformat() for d in range(6, -1, -1)]
+    vals = [1500 + (i * 37 + d * 111) % 1200 for d in range(7)]
+    return labels, vals, 2000 + i % 300
+
+
+def run(name, make, payload_bytes, requests):
+    cpu, wall, size = [], [], []
+    for i in range(requests):
+        c0, w0 = time.process_time(), time.perf_counter()
+        out = make(i)
+        cpu.append(time.process_time() - c0)
+        wall.append(time.perf_counter() - w0)
+        size.append(payload_bytes(out))
+    print(f"{name:<14} {statistics.mean(cpu) * 1000:>10.2f} {statistics.median(wall) * 1000:>10.2f} "
+          f"{statistics.mean(size):>10.0f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--points", type=int, default=30, help="BMI records per chart")
+    args = ap.parse_args()
+
+    line = gr.LinePlot(x="date", y="bmi", color="series")
+    bar = gr.BarPlot(x="date", y="kcal", color="status")
+    png_size = os.path.getsize
+
+    def to_json(component, df):
+        return component.postprocess(df).model_dump_json().encode("utf-8")
+
+    # first render / first frame pay one-time imports; keep them out of the numbers
+    charts.bmi_series_png("warm", bmi_points(-1, 2))
+    to_json(line, plotdata.bmi_series_frame(bmi_points(-1, 2)))
+
+    print(f"{'chart':<14} {'cpu ms':>10} {'wall ms':>10} {'bytes':>10}")
+    run("bmi png", lambda i: charts.bmi_series_png("bench", bmi_points(i, args.points)), png_size, args.requests)
+    run("bmi client", lambda i: to_json(line, plotdata.bmi_series_frame(bmi_points(i, args.points))), len, args.requests)
+    run("food png", lambda i: charts.food_week_png("bench", *food_week(i)), png_size, args.requests)
+    run("food client", lambda i: to_json(bar, plotdata.food_week_frame(*food_week(i))), len, args.requests)
+
+
+if __name__ == "__main__":
+    main()
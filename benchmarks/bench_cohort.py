@@ -0,0 +1,89 @@
+"""Cohort dashboard aggregation (``bme_health.cohort``) over many users.
+
+Fills a store with U users of D days each (BMI, TDEE and food log), then
+times ``cohort.compute``:
+
+  * cold      — no cached partials, for each process count (0 = in-process)
+  * warm      — every partial cached
+  * one write — after one user saves a record (only they are recomputed)
+
+The store is a fresh SQLite file (workers read it themselves); with
+``--db memory`` every process count computes in-process.
+
+    python benchmarks/bench_cohort.py [--users 2000] [--days 365] [--procs 0,2,4] [--db memory]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bme_health import cohort, foods
+from bme_health.core import ACTIVITY_FACTORS
+from bme_health.store import open_store
+
+ACTIVITIES = list(ACTIVITY_FACTORS)
+
+
+def fill(store, users, days):
+    first = date(2025, 6, 30).toordinal() - days + 1
+    ds = [date.fromordinal(first + i).isoformat() for i in range(days)]
+    for u in range(users):
+        name = f"c{u}"
+        store.ensure_user(name)
+        bmi, tdee, food = [], [], []
+        for i, d in enumerate(ds):
+            h, w = 160.0 + u % 30, 50.0 + (u * 7 + i) % 60
+            bmi.append((d, {"h_cm": h, "w_kg": w, "bmi": round(w / (h / 100) ** 2, 2)}))
+            if i % 30 == 0:
+                bmr = round(10 * w + 6.25 * h - 5 * 30 + 5, 2)
+                tdee.append((d, {"bmr": bmr, "tdee": round(bmr * 1.5, 2), "gender": "Male", "age": 30,
+                                 "activity": ACTIVITIES[u % len(ACTIVITIES)], "h_cm": h, "w_kg": w}))
+            food.append((d, float(1400 + (u * 13 + i * 37) % 1400)))
+        store.put_bmi_many(name, bmi)
+        store.put_tdee_many(name, tdee)
+        store.put_food_log_many(name, food)
+
+
+def timed(store):
+    t0 = time.perf_counter()
+    _, info = cohort.compute(store)
+    return time.perf_counter() - t0, info["recomputed"]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--procs", default="0,2,4")
+    ap.add_argument("--db", default="", help='"memory" or an SQLite path (default: a temporary file)')
+    args = ap.parse_args()
+    tmp = None
+    if not args.db:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, "cohort.db")
+    store = open_store(args.db, {}, foods.DEFAULT_FOODS, shared=False, journal="")
+    t0 = time.perf_counter()
+    fill(store, args.users, args.days)
+    print(f"{args.users} users × {args.days} days built in {time.perf_counter() - t0:.1f}s, {os.cpu_count()} CPUs")
+    print(f"{'case':<22} {'seconds':>9} {'recomputed':>11}")
+    for procs in (int(p) for p in args.procs.split(",")):
+        cohort.COHORT_PROCS = procs
+        cohort._executor = None
+        if procs:
+            cohort.preload()
+        store._partials.clear()
+        seconds, n = timed(store)
+        print(f"{f'cold, procs={procs}':<22} {seconds:>9.3f} {n:>11}", flush=True)
+    seconds, n = timed(store)
+    print(f"{'warm':<22} {seconds:>9.3f} {n:>11}")
+    store.put_food_log("c0", "2025-07-01", 2000.0)
+    seconds, n = timed(store)
+    print(f"{'one write':<22} {seconds:>9.3f} {n:>11}")
+
+
+if __name__ == "__main__":
+    main()
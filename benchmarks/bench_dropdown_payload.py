@@ -0,0 +1,78 @@
+"""Bytes per event for the nine meal dropdowns: full updates vs diffed.
+
+Replays one session (login, add foods of each type, log out, log back in)
+through the App handlers with a user who already has many custom foods,
+and sizes the JSON of each event's meal-dropdown outputs two ways:
+
+  * full  — what every event used to send: all nine dropdowns with their
+    full choice lists;
+  * diff  — what the handlers send now: only dropdowns whose choices
+    changed since the session last sent them, gr.skip() for the rest.
+
+    python benchmarks/bench_dropdown_payload.py [--custom 2000]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import App
+
+N_MEAL = len(App.MEAL_SLOTS)
+
+
+def size(updates):
+    return len(json.dumps(list(updates), ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def full_updates(user, values=None):
+    if user is None:
+        return [App.gr.update(choices=[])] * N_MEAL
+    lists = {t: App._meal_choices(user, t) for t in set(App.MEAL_SLOTS)}
+    values = values or [None] * N_MEAL
+    return [App.gr.update(choices=lists[t], **({"value": v} if v else {})) for t, v in zip(App.MEAL_SLOTS, values)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--custom", type=int, default=2000, help="custom foods the user already has")
+    args = ap.parse_args()
+
+    user = "payload-bench"
+    App.ensure_user(user)
+    for i in range(args.custom):
+        App.STORE.put_food(user, App.MEAL_SLOTS[i % 3], f"Custom food {i}", 100 + i % 400)
+    picks = ["-"] * N_MEAL
+
+    sent = ()
+    rows = []
+
+    def record(event, full, out):
+        rows.append((event, size(full), size(out)))
+
+    out = App.do_login(user, sent); sent = out[-1]
+    record("login", full_updates(user), out[8:17])
+    for i, ftype in enumerate(("Main", "Dessert", "Beverage", "Main")):
+        out = App.ft_add_custom_food(user, f"Bench {ftype} {i}", ftype, 250, *picks, sent); sent = out[-1]
+        record(f"add {ftype.lower()}", full_updates(user, picks), out[1:10])
+    out = App.ft_add_custom_food(user, "", "Main", 1, *picks, sent); sent = out[-1]
+    record("add (rejected)", full_updates(user, picks), out[1:10])
+    out = App.do_logout(sent); sent = out[-1]
+    record("logout", full_updates(None), out[8:17])
+    out = App.do_logout(sent); sent = out[-1]
+    record("logout again", full_updates(None), out[8:17])
+    out = App.do_login(user, sent); sent = out[-1]
+    record("login again", full_updates(user), out[8:17])
+    out = App.do_login(user, sent); sent = out[-1]
+    record("re-login (same)", full_updates(user), out[8:17])
+
+    print(f"{'event':<16} {'full bytes':>11} {'diff bytes':>11}")
+    for event, full, diff in rows:
+        print(f"{event:<16} {full:>11,} {diff:>11,}")
+    print(f"{'total':<16} {sum(r[1] for r in rows):>11,} {sum(r[2] for r in rows):>11,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Export throughput and peak memory for a long-history user.
+
+    python benchmarks/bench_export.py [--years 10] [--store sqlite|memory]
+
+Fills one synthetic user with a BMI, TDEE and food entry for every day of
+`--years` years, then exports it in each format and reports rows/s and the
+peak Python allocation during the export (tracemalloc).
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bme_health import exporter
+from bme_health.store import open_store
+
+FOODS = {"MAIN": {"-": 0}, "DESSERT": {"-": 0}, "BEVERAGE": {"-": 0}}
+
+
+def fill(store, user, days):
+    store.ensure_user(user)
+    start = date(2000, 1, 1)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    store.put_bmi_many(user, ((d, {"h_cm": 170.0, "w_kg": 60 + i % 20, "bmi": 21.0}) for i, d in enumerate(dates)))
+    store.put_tdee_many(user, ((d, {"bmr": 1600.0, "tdee": 2200.0, "gender": "Male", "age": 30,
+                                    "activity": "Light (1–3 days/wk)", "h_cm": 170.0, "w_kg": 65.0})
+                               for d in dates))
+    store.put_food_log_many(user, ((d, 1800.0 + i % 500) for i, d in enumerate(dates)))
+    return 3 * days
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--years", type=int, default=10)
+    ap.add_argument("--store", choices=("sqlite", "memory"), default="sqlite")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bme_bench_")
+    try:
+        url = os.path.join(tmp, "bench.db") if args.store == "sqlite" else ""
+        store = open_store(url, {}, FOODS)
+        rows = fill(store, "bench", 365 * args.years)
+        print(f"{args.store} store, {rows:,} rows")
+        for fmt in exporter.FORMATS:
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            try:
+                path = exporter.export_user(store, "bench", fmt, out_dir=tmp)
+            except RuntimeError as e:
+                tracemalloc.stop()
+                print(f"{fmt:>8}: skipped ({e})")
+                continue
+            dt = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            size = os.path.getsize(path)
+            print(f"{fmt:>8}: {rows / dt:>10,.0f} rows/s  {size / 1e6:7.2f} MB  peak {peak / 1e6:6.2f} MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Food search latency over a large synthetic catalog.
+
+Builds a catalog of N generated food names (like a nutrition database),
+times building the prefix/trigram index, then times ``FoodTable.search``
+for queries as a user types them letter by letter, including typos.
+
+    python benchmarks/bench_food_search.py [--items 100000] [--k 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bme_health.foods import freeze_catalog, user_tables
+from bme_health.foodsearch import index_for
+
+WORDS = ("chicken beef pork tofu salmon tuna shrimp rice noodle curry soup salad fried grilled "
+         "steamed spicy sweet sour green red yellow thai basil garlic pepper coconut mango "
+         "sticky egg omelette bread toast cheese yogurt milk tea coffee juice smoothie").split()
+QUERIES = ("chicken curry", "grilled salmon", "mango sticky rice", "chiken cury", "garlik bread", "x")
+
+
+def make_catalog(n, seed=1):
+    rnd = random.Random(seed)
+    names = {"-": 0}
+    while len(names) < n:
+        name = " ".join(rnd.choice(WORDS).capitalize() for _ in range(rnd.randint(2, 4)))
+        names[f"{name} ({rnd.randint(50, 500)}g)"] = rnd.randint(20, 900)
+    return {"MAIN": names, "DESSERT": {"-": 0}, "BEVERAGE": {"-": 0}}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=100_000)
+    ap.add_argument("--k", type=int, default=20)
+    args = ap.parse_args()
+
+    catalog = freeze_catalog(make_catalog(args.items))
+    table = user_tables(catalog)["MAIN"]
+    table.set("My Chicken Curry", 450)
+
+    t0 = time.perf_counter()
+    index_for(catalog["MAIN"])
+    print(f"index build: {time.perf_counter() - t0:.2f}s for {args.items:,} names")
+
+    lat = []
+    print(f"{'query':<20} {'ms (p50 per keystroke)':>24}  top match")
+    for q in QUERIES:
+        per_key = []
+        for i in range(1, len(q) + 1):
+            t = time.perf_counter()
+            found = table.search(q[:i], args.k)
+            per_key.append((time.perf_counter() - t) * 1000)
+        lat += per_key
+        print(f"{q:<20} {statistics.median(per_key):>24.2f}  {found[0] if found else '-'}")
+    lat.sort()
+    print(f"all keystrokes: p50 {statistics.median(lat):.2f} ms, p99 {lat[int(len(lat) * 0.99) - 1]:.2f} ms, "
+          f"max {lat[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
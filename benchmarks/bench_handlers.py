@@ -0,0 +1,174 @@
+"""Per-call latency of the core functions and every UI handler, by history size.
+
+Drives ``bme_health.core`` and the handler functions in ``App`` directly
+(no UI server) for synthetic users with 10, 1k and 100k BMI, TDEE and food
+records each, and reports the median time per call.
+
+    python benchmarks/bench_handlers.py [--sizes 10,1000,100000] [--only ft_]
+    python benchmarks/bench_handlers.py --json today.json --compare baseline.json
+
+``--json`` saves the results so they can be tracked over time; ``--compare``
+prints the ratio to a saved run and exits 1 if any case got slower than
+``--tolerance`` (default 1.25x).  Charts use ``BME_CHART_MODE=client`` unless
+``--chart-mode png`` is given; PNG rendering has its own benchmarks
+(bench_charts.py, bench_render_pool.py).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+LAST_DAY = date(2025, 6, 30)
+METRIC_UNIT = "Metric (cm, kg)"
+ACTIVITY = "Light (1–3 days/wk)"
+GOAL = "Maintenance (0%)"
+
+
+def days(n):
+    """n consecutive "YYYY-MM-DD" dates ending at LAST_DAY, oldest first."""
+    first = LAST_DAY.toordinal() - n + 1
+    return [date.fromordinal(first + i).isoformat() for i in range(n)]
+
+
+def make_user(App, n):
+    """Fill a fresh user with n BMI, TDEE and food-log days; returns the name."""
+    user = f"bench{n}"
+    App.STORE.ensure_user(user)
+    ds = days(n)
+    bmi, tdee, food = [], [], []
+    for i, d in enumerate(ds):
+        h, w = 170.0, 60.0 + (i % 200) / 10
+        b = round(App.calc_bmi(h, w), 2)
+        bmi.append((d, {"h_cm": h, "w_kg": w, "bmi": b}))
+        bmr = App.hb_bmr("Male", 30, h, w)
+        tdee.append((d, {"bmr": round(bmr, 2), "tdee": round(bmr * 1.375, 2), "gender": "Male", "age": 30,
+                         "activity": ACTIVITY, "h_cm": h, "w_kg": w}))
+        food.append((d, float(1500 + (i * 37) % 1200)))
+    App.STORE.put_bmi_many(user, bmi)
+    App.STORE.put_tdee_many(user, tdee)
+    App.STORE.put_food_log_many(user, food)
+    return user
+
+
+def core_cases(App):
+    from bme_health import core
+    return [
+        ("calc_bmi", lambda: core.calc_bmi(172.5, 68.2)),
+        ("unit_to_metric", lambda: core.unit_to_metric(core.IMPERIAL, "68", "150")),
+        ("parse_date_str", lambda: core.parse_date_str("2025-06-30")),
+        ("hb_bmr", lambda: core.hb_bmr("Female", 34, 165.0, 58.0)),
+    ]
+
+
+def user_cases(App, user):
+    ds = days(1)
+    last = ds[-1]
+    free = (LAST_DAY + timedelta(days=1)).isoformat()       # a date with no record
+    meals = ["Pad Thai (1 plate)", "Brownie", "Water"] + ["-"] * 6
+
+    month = days(30)
+    with contextlib.redirect_stdout(io.StringIO()):          # gr.Info prints outside a request
+        App.ft_save_template(user, "bench", *meals)
+
+    def add_then_clear():
+        App.bmi_add_record(user, METRIC_UNIT, 170, 65, free, None)
+        App.bmi_clear_day(user, free)
+
+    return [
+        ("foods.day_meals", lambda: App.foods.day_meals(App.STORE.foods(user), meals)),
+        ("plot_bmi_series", lambda: App.plot_bmi_series(App.STORE.bmi_series(user), user)),
+        ("plot_food_week", lambda: App.plot_food_week(App.STORE.food_log(user), last, 2000, user)),
+        ("do_login", lambda: App.do_login(user)),
+        ("bmi_add_record+bmi_clear_day", add_then_clear),
+        ("bmi_view_on_date", lambda: App.bmi_view_on_date(user, last)),
+        ("t2_on_date_change", lambda: App.t2_on_date_change(user, last)),
+        ("t2_compute_and_save", lambda: App.t2_compute_and_save(user, last, "Male", 30, ACTIVITY, 170, 65, None)),
+        ("ft_on_date_or_goal_change", lambda: App.ft_on_date_or_goal_change(user, last, GOAL)),
+        ("ft_search_food", lambda: App.ft_search_food(user, "MAIN", "-", "chi")),
+        ("ft_log_day", lambda: App.ft_log_day(user, last, 2000, GOAL, *meals, 120)),
+        ("ft_reset_day", lambda: App.ft_reset_day(user, last, GOAL)),
+        ("ft_apply_template (30 days)", lambda: App.ft_apply_template(user, "bench", month[0], month[-1], 2000, GOAL)),
+        ("data_export", lambda: App.data_export(user, "CSV")),
+    ]
+
+
+def measure(fn, min_time, repeat):
+    """Median seconds per call over `repeat` runs of at least `min_time` each."""
+    fn()                                        # warm caches (dates, stats, charts)
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return statistics.median(t / number for t in timer.repeat(repeat, number))
+
+
+def fmt(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.1f} µs"
+    return f"{seconds * 1e3:8.2f} ms"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,1000,100000", help="records per synthetic user")
+    ap.add_argument("--only", default="", help="run cases whose name contains this")
+    ap.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--chart-mode", choices=("client", "png"), default="client")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="compare against results saved with --json")
+    ap.add_argument("--tolerance", type=float, default=1.25)
+    args = ap.parse_args()
+
+    os.environ["BME_CHART_MODE"] = args.chart_mode
+    os.environ.setdefault("BME_ASYNC", "0")
+    import App
+
+    cases = [(name, "-", fn) for name, fn in core_cases(App)]
+    for n in (int(s) for s in args.sizes.split(",") if s):
+        t0 = time.perf_counter()
+        user = make_user(App, n)
+        print(f"# user with {n:,} records built in {time.perf_counter() - t0:.1f}s")
+        cases += [(name, str(n), fn) for name, fn in user_cases(App, user)]
+
+    results = {}
+    for name, size, fn in cases:
+        if args.only and args.only not in name:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):      # gr.Info prints outside a request
+            results[f"{name}[{size}]"] = measure(fn, args.min_time, args.repeat)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    slower = []
+    print(f"{'case':<42} {'per call':>11}" + ("   vs baseline" if baseline else ""))
+    for key, sec in results.items():
+        line = f"{key:<42} {fmt(sec):>11}"
+        if key in baseline:
+            ratio = sec / baseline[key]
+            line += f"   {ratio:5.2f}x"
+            if ratio > args.tolerance:
+                line += "  SLOWER"
+                slower.append(key)
+        print(line)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"when": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                       "chart_mode": args.chart_mode, "results": results}, f, indent=1)
+    if slower:
+        print(f"{len(slower)} case(s) slower than {args.tolerance:g}x the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
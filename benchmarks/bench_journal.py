@@ -0,0 +1,133 @@
+"""Write overhead and recovery time of the journaled in-memory store (BME_JOURNAL).
+
+  * writes   — put_food_log / put_bmi calls from T threads on a plain
+    MemoryStore, then on a JournaledStore that waits for fsync (group
+    commit) and one that does not (async): per-write latency, writes/s and
+    writes per fsync
+  * recovery — a journal of N entries (default 1M) over U users, opened from
+    the journal alone and again after a snapshot
+
+    python benchmarks/bench_journal.py [--entries 1000000] [--users 1000] [--threads 1,8,32] [--dir /tmp/x]
+
+Use --dir on the disk the app would journal to; fsync cost is the whole story.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bme_health import foods
+from bme_health.foods import freeze_catalog
+from bme_health.journal import JournaledStore
+from bme_health.store import MemoryStore
+
+CATALOG = freeze_catalog(foods.DEFAULT_FOODS)
+FIRST = date(2000, 1, 1).toordinal()
+
+
+def day(i):
+    return date.fromordinal(FIRST + i).isoformat()
+
+
+def write(store, user, i):
+    if i % 2:
+        store.put_food_log(user, day(i // 2), float(1500 + i % 900))
+    else:
+        w = 50.0 + i % 50
+        store.put_bmi(user, day(i // 2), {"h_cm": 170.0, "w_kg": w, "bmi": round(w / 2.89, 2)})
+
+
+def run_writes(store, threads, per_thread):
+    lat = []
+
+    def worker(t):
+        user = f"w{t}"
+        store.ensure_user(user)
+        mine = []
+        for i in range(per_thread):
+            t0 = time.perf_counter()
+            write(store, user, i)
+            mine.append(time.perf_counter() - t0)
+        lat.extend(mine)
+
+    ts = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return len(lat) / (time.perf_counter() - t0), sorted(lat)
+
+
+def bench_writes(args, base):
+    print(f"{'store':<16} {'threads':>7} {'writes/s':>10} {'p50 µs':>9} {'p99 µs':>9} {'per fsync':>9}")
+    for threads in (int(t) for t in args.threads.split(",")):
+        per_thread = max(1, args.writes // threads)
+        for name, sync in (("memory", None), ("journal group", "group"), ("journal async", "async")):
+            d = os.path.join(base, f"w-{name.replace(' ', '-')}-{threads}")
+            store = (MemoryStore({}, CATALOG) if sync is None
+                     else JournaledStore({}, CATALOG, d, sync=sync, snapshot_every=1 << 62))
+            rate, lat = run_writes(store, threads, per_thread)
+            per_fsync = "-"
+            if sync:
+                store.close()
+                per_fsync = f"{len(lat) / max(1, store.journal.fsyncs):.1f}"
+            p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+            print(f"{name:<16} {threads:>7} {rate:>10,.0f} {statistics.median(lat) * 1e6:>9.1f} "
+                  f"{p99 * 1e6:>9.1f} {per_fsync:>9}", flush=True)
+
+
+def bench_recovery(args, base):
+    d = os.path.join(base, "recovery")
+    store = JournaledStore({}, CATALOG, d, sync="async", snapshot_every=1 << 62)
+    per_user = args.entries // args.users
+    t0 = time.perf_counter()
+    for u in range(args.users):
+        user = f"r{u}"
+        store.ensure_user(user)
+        for i in range(per_user - 1):              # ensure_user is one entry too
+            write(store, user, i)
+    store.close()
+    size = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+    print(f"\n{args.users * per_user:,} entries written in {time.perf_counter() - t0:.1f}s, journal {size / 1e6:.0f} MB")
+
+    reopened = JournaledStore({}, CATALOG, d, snapshot_every=1 << 62)
+    r = reopened.recovered
+    print(f"recover from journal:  {r['seconds']:.2f}s ({r['records']:,} records)")
+    t0 = time.perf_counter()
+    reopened.snapshot()
+    print(f"snapshot written:      {time.perf_counter() - t0:.2f}s "
+          f"({sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d)) / 1e6:.0f} MB on disk)")
+    reopened.close()
+    again = JournaledStore({}, CATALOG, d)
+    print(f"recover from snapshot: {again.recovered['seconds']:.2f}s")
+    assert sum(len(again.bmi_records(u)) + len(again.food_log(u)) for u in again.user_names()) == \
+        args.users * (per_user - 1)
+    again.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=1_000_000)
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--writes", type=int, default=4000, help="writes per store in the write test")
+    ap.add_argument("--threads", default="1,8,32")
+    ap.add_argument("--dir", default=None, help="where to put the journals (default: a temp dir)")
+    args = ap.parse_args()
+    base = tempfile.mkdtemp(prefix="bme_journal_", dir=args.dir)
+    try:
+        bench_writes(args, base)
+        bench_recovery(args, base)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Bytes per stored record: the old dict-of-dicts layout vs ``RecordColumns``.
+
+Builds N days of BMI, TDEE and food-log records for one user both ways and
+measures the memory each holds with tracemalloc.  The day codec caches
+(``bme_health.dates``) are shared by every user and bounded, so they are
+filled first and reported on their own line rather than charged to
+whichever kind is measured first.
+
+    python benchmarks/bench_memory.py [--records 200000]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bme_health import columns, dates
+from bme_health.core import ACTIVITY_FACTORS
+
+ACTIVITIES = list(ACTIVITY_FACTORS)
+
+
+def make_rows(n):
+    """n days of (day, bmi rec, tdee rec, kcal), with values as the app saves them."""
+    first = date(2025, 6, 30).toordinal() - n + 1
+    for i in range(n):
+        day = date.fromordinal(first + i).isoformat()
+        h, w = round(150 + (i % 500) / 10, 2), round(45 + (i % 700) / 10, 2)
+        bmi = round(w / (h / 100) ** 2, 2)
+        bmr = round(10 * w + 6.25 * h - 5 * 30 + 5, 2)
+        tdee = {"bmr": bmr, "tdee": round(bmr * 1.375, 2), "gender": ("Male", "Female")[i % 2], "age": 30 + i % 40,
+                "activity": ACTIVITIES[i % len(ACTIVITIES)], "h_cm": h, "w_kg": w}
+        yield day, {"h_cm": h, "w_kg": w, "bmi": bmi}, tdee, float(1200 + (i * 37) % 1500)
+
+
+def measure(build):
+    """(object, bytes allocated and still held by building it).
+
+    Tracing runs for the whole benchmark (see main), so codec cache entries
+    evicted while building count as freed."""
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    obj = build()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    held = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    return obj, held
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=200_000)
+    args = ap.parse_args()
+    n = args.records
+    rows = list(make_rows(n))
+    tracemalloc.start()
+
+    def as_dicts(kind):
+        # copy the records, as the dict store held its own objects per entry; the
+        # date-string keys are shared with `rows`, so their ~60 B/rec is not counted
+        if kind == "bmi":
+            return {d: dict(b) for d, b, _, _ in rows}
+        if kind == "tdee":
+            return {d: dict(t) for d, _, t, _ in rows}
+        return {d: float(k) for d, _, _, k in rows}
+
+    def as_columns(kind):
+        make = {"bmi": columns.bmi_columns, "tdee": columns.tdee_columns, "food": columns.food_columns}[kind]
+        recs = make()
+        idx = {"bmi": 1, "tdee": 2, "food": 3}[kind]
+        recs.put_many((r[0], r[idx]) for r in rows)
+        return recs
+
+    def warm_codec():
+        # then a to_ordinal pass like the ones building the columns makes: with
+        # more days than the caches hold, it is what leaves them in the state
+        # they stay in (to_ordinal's values no longer the ints keying to_day)
+        dates.to_ordinal.cache_clear()
+        dates.to_day.cache_clear()
+        for d, _, _, _ in rows:
+            dates.to_day(dates.to_ordinal(d))
+        for d, _, _, _ in rows:
+            dates.to_ordinal(d)
+
+    _, codec_bytes = measure(warm_codec)
+    print(f"{n:,} records per kind")
+    print(f"day codec caches: {codec_bytes / 1e6:.1f} MB for {dates.to_ordinal.cache_info().currsize:,} days "
+          f"(shared by all users, at most {dates.CACHE_DAYS:,} per direction)")
+    print(f"{'kind':<6} {'dicts B/rec':>12} {'columns B/rec':>14} {'ratio':>7}")
+    for kind in ("bmi", "tdee", "food"):
+        d, d_bytes = measure(lambda kind=kind: as_dicts(kind))
+        c, c_bytes = measure(lambda kind=kind: as_columns(kind))
+        assert len(d) == len(c) == n
+        day = rows[n // 2][0]
+        assert c[day] == d[day], (c[day], d[day])
+        print(f"{kind:<6} {d_bytes / n:12.1f} {c_bytes / n:14.1f} {d_bytes / max(c_bytes, 1):6.1f}x")
+        del d, c
+
+
+if __name__ == "__main__":
+    main()
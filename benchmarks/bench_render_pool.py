@@ -0,0 +1,69 @@
+"""Render pool: threads vs worker processes, and backpressure.
+
+For each configuration a fresh interpreter renders --charts distinct BMI
+charts requested from --clients threads at once (cache misses, like many
+users saving at the same moment), and reports charts/s, per-request
+latency, how many requests were shed to the last cached chart, and the
+pool's own metrics (max queue depth, mean render time in the worker).
+
+    python benchmarks/bench_render_pool.py [--charts 60] [--clients 16] [--queue 0]
+
+--queue sets BME_RENDER_QUEUE (0 = the default of 8 per worker).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+RUN = """
+import json, statistics, time
+from concurrent.futures import ThreadPoolExecutor
+from bme_health import charts
+for f in charts.preload():
+    f.result()
+n, clients = {charts}, {clients}
+
+def one(i):
+    pts = [("2024-01-%02d" % (d + 1), 20 + ((i * 7 + d) % 50) / 10, "Normal") for d in range(30)]
+    t = time.perf_counter()
+    charts.bmi_series_png("bench-%d" % (i % clients), pts)
+    return time.perf_counter() - t
+
+t0 = time.perf_counter()
+with ThreadPoolExecutor(clients) as ex:
+    lat = sorted(ex.map(one, range(n)))
+wall = time.perf_counter() - t0
+m = charts.metrics()
+print(json.dumps({{"rate": n / wall, "p50": statistics.median(lat), "p99": lat[min(n - 1, int(n * 0.99))], **m}}))
+"""
+
+CONFIGS = (("threads x2", {"BME_RENDER_PROCS": "0", "BME_RENDER_THREADS": "2"}),
+           ("processes x2", {"BME_RENDER_PROCS": "2"}),
+           ("processes x4", {"BME_RENDER_PROCS": "4"}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--charts", type=int, default=60)
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--queue", type=int, default=0)
+    args = ap.parse_args()
+
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'pool':<14} {'charts/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'shed':>5} {'max depth':>9} {'render ms':>10}")
+    for name, extra in CONFIGS:
+        chart_dir = tempfile.mkdtemp(prefix="bme_bench_pool_")     # empty cache: every chart renders
+        env = dict(os.environ, **extra, BME_CHART_DIR=chart_dir, BME_RENDER_QUEUE=str(args.queue))
+        out = subprocess.run([sys.executable, "-c", RUN.format(charts=args.charts, clients=args.clients)],
+                             cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{name:<14} {r['rate']:>9.1f} {r['p50'] * 1000:>8.0f} {r['p99'] * 1000:>8.0f} {r['shed']:>5} "
+              f"{r['max_depth']:>9} {r['avg_render_seconds'] * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Cold-start benchmark: import time and first-request latency of App.py.
+
+Every run is a fresh interpreter, as on a new replica:
+
+  * import   — ``import App`` (module load + Blocks construction)
+  * ready    — process start until the server answers HTTP
+  * login    — first /do_login call (empty BMI chart: static placeholder)
+  * 1st chart — first /bmi_add_record (first real render; matplotlib is
+    loaded then, or earlier in the background with --preload, as
+    ``python App.py`` does)
+
+    python benchmarks/bench_startup.py [--runs 5] [--preload]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import App; print(time.perf_counter() - t)"
+
+SERVER_SNIPPET = """
+import sys, time
+import App
+from bme_health import charts
+App.demo.queue()
+if {preload}:
+    charts.preload()
+_, url, _ = App.demo.launch(prevent_thread_lock=True, quiet=True)
+print(url, flush=True)
+sys.stdin.read()
+"""
+
+
+def measure_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=_env(),
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def measure_first_requests(preload):
+    from gradio_client import Client
+
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", SERVER_SNIPPET.format(preload=preload)], cwd=ROOT,
+                            env=_env(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        url = proc.stdout.readline().strip()
+        ready = time.perf_counter() - t0
+        c = Client(url, verbose=False)
+        t = time.perf_counter()
+        c.predict("cold-start", api_name="/do_login")
+        login = time.perf_counter() - t
+        t = time.perf_counter()
+        c.predict("Metric (cm, kg)", 170, 65, "2024-01-01", None, api_name="/bmi_add_record")
+        chart = time.perf_counter() - t
+    finally:
+        proc.stdin.close()
+        proc.kill()
+        proc.wait()
+    return ready, login, chart
+
+
+def _env():
+    env = dict(os.environ)
+    env["GRADIO_ANALYTICS_ENABLED"] = "False"
+    env.pop("BME_DB", None)
+    return env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--preload", action="store_true", help="warm matplotlib up in the background at launch")
+    args = ap.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    firsts = [measure_first_requests(args.preload) for _ in range(args.runs)]
+    med = statistics.median
+    print(f"{'phase':<10} {'median s':>9} {'max s':>7}")
+    print(f"{'import':<10} {med(imports):>9.3f} {max(imports):>7.3f}")
+    for i, name in enumerate(("ready", "login", "1st chart")):
+        col = [f[i] for f in firsts]
+        print(f"{name:<10} {med(col):>9.3f} {max(col):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
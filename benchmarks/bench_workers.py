@@ -0,0 +1,113 @@
+"""Requests/s of the multi-worker mode (BME_WORKERS) as workers are added.
+
+For each worker count, starts that many App processes on one fresh SQLite
+database (as ``BME_WORKERS=N python App.py`` does), first checks that a
+BMI saved through one worker shows up in the date dropdown of a session on
+another worker whose cache was already warm, then drives the workers with
+gradio_client sessions spread round-robin over them (as a sticky proxy
+would): each logs in as its own user and saves BMI records.
+
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--sessions 32] [--events 10]
+
+Charts are client-rendered (BME_CHART_MODE=client) unless the environment
+says otherwise, so the numbers are about handlers and the shared store.
+Scaling needs free cores: with one CPU, more workers only add overhead.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bme_health import cluster  # noqa: E402
+
+
+def wait_ready(urls, timeout=180):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                urllib.request.urlopen(url, timeout=2).read(1)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker at {url} did not start")
+                time.sleep(0.3)
+
+
+def client(url, timeout):
+    from gradio_client import Client
+    return Client(url, verbose=False, httpx_kwargs={"timeout": timeout})
+
+
+def check_shared(urls, timeout):
+    """A save on worker 0 must appear in worker 1's dropdown right away."""
+    if len(urls) < 2:
+        return
+    a, b = client(urls[0], timeout), client(urls[1], timeout)
+    b.predict("shared-user", api_name="/do_login")              # warms worker 1's date index
+    a.predict("shared-user", api_name="/do_login")
+    a.predict("Metric (cm, kg)", 170, 65, "2024-02-01", None, api_name="/bmi_add_record")
+    choices = [c[0] for c in b.predict("shared-user", api_name="/do_login")[3]["choices"]]
+    assert "2024-02-01" in choices, f"worker 1 did not see worker 0's save: {choices}"
+
+
+def session(url, name, events, timeout):
+    c = client(url, timeout)
+    lat = []
+    t = time.perf_counter()
+    c.predict(name, api_name="/do_login")
+    lat.append(time.perf_counter() - t)
+    for i in range(events):
+        day = f"2024-01-{i % 28 + 1:02d}"
+        t = time.perf_counter()
+        msg = c.predict("Metric (cm, kg)", 170, 60 + i % 28, day, None, api_name="/bmi_add_record")[0]
+        lat.append(time.perf_counter() - t)
+        assert msg.startswith(f"Saved for {day}"), msg
+    return lat
+
+
+def run_level(n, args):
+    db = os.path.join(tempfile.mkdtemp(prefix="bme_workers_"), "health.db")
+    env = dict(os.environ, BME_DB=db, GRADIO_ANALYTICS_ENABLED="False")
+    env.setdefault("BME_CHART_MODE", "client")
+    procs = cluster.start(n, [os.path.join(ROOT, "App.py")], base_port=args.port, env=env, cwd=ROOT,
+                          stdout=open(os.devnull, "w"), stderr=open(os.devnull, "w"))
+    urls = [f"http://127.0.0.1:{args.port + i}/" for i in range(n)]
+    try:
+        wait_ready(urls)
+        check_shared(urls, args.timeout)
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as ex:
+            futs = [ex.submit(session, urls[i % n], f"w{n}-s{i}", args.events, args.timeout)
+                    for i in range(args.sessions)]
+            lat = sorted(x for f in futs for x in f.result())
+        return len(lat) / (time.perf_counter() - t0), lat
+    finally:
+        cluster.stop(procs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--sessions", type=int, default=32)
+    ap.add_argument("--events", type=int, default=10, help="BMI saves per session")
+    ap.add_argument("--port", type=int, default=7900, help="first worker port")
+    ap.add_argument("--timeout", type=float, default=300)
+    args = ap.parse_args()
+    print(f"{os.cpu_count()} CPUs, {args.sessions} sessions × {args.events + 1} requests")
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for n in (int(x) for x in args.workers.split(",")):
+        rate, lat = run_level(n, args)
+        p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+        print(f"{n:>7} {rate:>8.1f} {statistics.median(lat) * 1000:>9.0f} {p99 * 1000:>9.0f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Load test: throughput and latency of concurrent sessions against a local server.
+
+Launches App.demo in a separate process (so the clients do not compete
+for its GIL) with a queue that allows as many events in parallel as there
+are sessions, then drives it with independent gradio_client sessions
+(each with its own per-session state).  Every session logs in as a
+different user and saves BMI records (each save re-renders the BMI chart),
+checking that it never sees another session's data.  Reports events/s and
+the p50/p99 latency of a single event.
+
+    python benchmarks/load_sessions.py [--levels 1,16,200] [--events 20] [--sync]
+
+--sync registers the plain handlers (BME_ASYNC=0) for comparison.  Set
+BME_CHART_MODE=client to take server-side rendering out of the numbers.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SERVER_SNIPPET = """
+import sys
+import App
+App.charts.preload()
+App.demo.queue(default_concurrency_limit={limit})
+_, url, _ = App.demo.launch(prevent_thread_lock=True, quiet=True)
+print(url, flush=True)
+sys.stdin.read()
+"""
+
+
+def session(url, name, events, timeout):
+    from gradio_client import Client
+
+    c = Client(url, verbose=False, httpx_kwargs={"timeout": timeout})
+    lat = []
+    t = time.perf_counter()
+    c.predict(name, api_name="/do_login")
+    lat.append(time.perf_counter() - t)
+    for i in range(events):
+        day = f"2024-01-{i % 28 + 1:02d}"
+        t = time.perf_counter()
+        msg = c.predict("Metric (cm, kg)", 170, 60 + i % 28, day, None, api_name="/bmi_add_record")[0]
+        lat.append(time.perf_counter() - t)
+        # a duplicate date from another user would mean sessions leaked into each other
+        assert msg.startswith(f"Saved for {day}"), msg
+    return lat
+
+
+def run_level(url, level, events, timeout):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=level) as ex:
+        futs = [ex.submit(session, url, f"load-{level}-{i}-{os.getpid()}", events, timeout) for i in range(level)]
+        lat = sorted(x for f in futs for x in f.result())
+    return len(lat) / (time.perf_counter() - t0), lat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--levels", default="1,16,200")
+    ap.add_argument("--events", type=int, default=20)
+    ap.add_argument("--sync", action="store_true", help="register plain (sync) handlers")
+    ap.add_argument("--timeout", type=float, default=600, help="per-request client timeout (s)")
+    args = ap.parse_args()
+    levels = [int(x) for x in args.levels.split(",")]
+    env = dict(os.environ, GRADIO_ANALYTICS_ENABLED="False", BME_ASYNC="0" if args.sync else "1")
+    server = subprocess.Popen([sys.executable, "-c", SERVER_SNIPPET.format(limit=max(levels))], cwd=ROOT, env=env,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    url = server.stdout.readline().strip()
+    try:
+        print(f"{'mode':>5} {'sessions':>8} {'events/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        for level in levels:
+            rate, lat = run_level(url, level, args.events, args.timeout)
+            p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+            print(f"{'sync' if args.sync else 'async':>5} {level:>8} {rate:>10.1f} "
+                  f"{statistics.median(lat) * 1000:>9.0f} {p99 * 1000:>9.0f}")
+    finally:
+        server.stdin.close()
+        server.kill()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Support modules for the BME Health Calculator (App.py)."""
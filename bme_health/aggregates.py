@@ -0,0 +1,120 @@
+"""Incremental running totals over a user's food log.
+
+``FoodStats`` keeps three Fenwick (binary indexed) trees keyed by day
+ordinal: kcal, number of logged days, and number of days with kcal > 0.
+Setting or resetting one day is O(log D) and any date-range total, count
+or average is O(log D), where D is the ordinal span (every date up to
+``date.max``).  Trees are sparse dicts, so memory grows
+with the number of logged days, not with D.  Exact per-day values are
+kept alongside for point lookups.
+
+The store owns one ``FoodStats`` per user and updates it from
+``put_food_log`` / ``clear_food_log``; nothing ever rescans the log.
+"""
+from datetime import date
+
+from bme_health.dates import month_bounds, to_day, to_ordinal as _ordinal
+
+_SIZE = date.max.toordinal() + 1     # positions 1..date.max
+
+
+class _Fenwick:
+    __slots__ = ("tree",)
+
+    def __init__(self):
+        self.tree = {}
+
+    def add(self, i, delta):
+        tree = self.tree
+        while i < _SIZE:
+            tree[i] = tree.get(i, 0) + delta
+            i += i & -i
+
+    def prefix(self, i):
+        """Sum of positions 1..i."""
+        s, tree = 0, self.tree
+        while i > 0:
+            s += tree.get(i, 0)
+            i -= i & -i
+        return s
+
+    def range(self, lo, hi):
+        return self.prefix(hi) - self.prefix(lo - 1) if hi >= lo else 0
+
+
+class FoodStats:
+    def __init__(self, items=()):
+        self._values = {}             # ordinal -> kcal
+        self._kcal = _Fenwick()
+        self._logged = _Fenwick()
+        self._eaten = _Fenwick()      # days with kcal > 0 (for streaks)
+        for day, kcal in items:
+            self.set(day, kcal)
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+    def set(self, day, kcal):
+        i = _ordinal(day)
+        old = self._values.get(i)
+        self._values[i] = kcal
+        if old is not None:
+            self._kcal.add(i, kcal - old)
+            self._eaten.add(i, (kcal > 0) - (old > 0))
+        else:
+            self._kcal.add(i, kcal)
+            self._logged.add(i, 1)
+            self._eaten.add(i, int(kcal > 0))
+
+    def clear(self):
+        self.__init__()
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def get(self, day, default=0):
+        """Logged total for one day (like food_log.get)."""
+        return self._values.get(_ordinal(day), default)
+
+    def total(self, lo, hi):
+        return self._kcal.range(_ordinal(lo), _ordinal(hi))
+
+    def logged_days(self, lo, hi):
+        return self._logged.range(_ordinal(lo), _ordinal(hi))
+
+    def summary(self, lo, hi, target=0.0):
+        """Totals for lo..hi (inclusive "YYYY-MM-DD" strings)."""
+        return self._summary(_ordinal(lo), _ordinal(hi), target)
+
+    def _summary(self, lo, hi, target):
+        total = self._kcal.range(lo, hi)
+        days = self._logged.range(lo, hi)
+        avg = total / days if days else 0.0
+        return {
+            "from": to_day(lo), "to": to_day(hi), "total": total, "logged_days": days, "avg": avg,
+            # against the target on every logged day; positive = surplus
+            "vs_target": (total - target * days) if target and target > 0 else None,
+        }
+
+    def week(self, ref, target=0.0):
+        """The 7 days ending at `ref` (same window as the week chart)."""
+        end = _ordinal(ref)
+        return self._summary(max(1, end - 6), end, target)
+
+    def month(self, ref, target=0.0):
+        """The calendar month containing `ref`."""
+        return self._summary(*month_bounds(_ordinal(ref)), target)
+
+    def streak(self, ref):
+        """Consecutive days with kcal > 0 ending at `ref` (binary search, O(log² D))."""
+        end = _ordinal(ref)
+        if not self._eaten.range(end, end):
+            return 0
+        lo, hi = 1, end                 # streak length in [lo, hi]
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._eaten.range(end - mid + 1, end) == mid:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
@@ -0,0 +1,114 @@
+"""Vectorized BMI / BMR / TDEE for whole cohorts (NumPy).
+
+``bulk_metrics`` is the column-wise counterpart of ``calc_bmi``,
+``bmi_category``, ``is_out_of_range``, ``hb_bmr`` and
+``compute_target_from_goal`` in ``bme_health.core``; it reads the same
+constants (ALLOWED, BMI_THRESHOLDS, ACTIVITY_FACTORS, GOAL_MULTIPLIERS), so
+changing them there changes both paths.
+
+Where the scalar code returns None (e.g. height <= 0) the arrays hold NaN,
+and the category code is -1.
+"""
+import numpy as np
+
+from bme_health import core
+
+CATEGORY_NAMES = core.BMI_CATEGORIES          # code i -> name; -1 -> "-"
+
+
+def _as_float(x):
+    return np.asarray(x, dtype=np.float64)
+
+
+def _lookup(labels, table, default):
+    """Map an array of string labels through `table` ({label: value})."""
+    labels = np.asarray(labels)
+    if labels.dtype.kind not in "US" and labels.dtype != object:
+        return labels.astype(np.float64)          # already numeric factors
+    out = np.full(labels.shape, default, dtype=np.float64)
+    for label, value in table.items():    # a handful of labels: one pass each
+        out[labels == label] = value
+    return out
+
+
+def to_metric(unit, height, weight):
+    """Vectorized ``unit_to_metric``; `unit` is one label or an array of labels."""
+    h, w = _as_float(height), _as_float(weight)
+    metric = np.asarray(unit) == core.METRIC
+    return (np.where(metric, h, h * core.INCH_TO_CM),
+            np.where(metric, w, w * core.LB_TO_KG))
+
+
+def bmi(h_cm, w_kg):
+    h_cm, w_kg = _as_float(h_cm), _as_float(w_kg)
+    h_m = np.where(h_cm > 0, h_cm / 100.0, np.nan)
+    return w_kg / (h_m * h_m)
+
+
+def bmi_category_codes(bmi_vals):
+    """Index into CATEGORY_NAMES for each BMI (int8), -1 where BMI is NaN."""
+    bmi_vals = _as_float(bmi_vals)
+    codes = np.searchsorted(np.asarray(core.BMI_THRESHOLDS, dtype=np.float64),
+                            bmi_vals, side="right").astype(np.int8)
+    codes[np.isnan(bmi_vals)] = -1
+    return codes
+
+
+def in_range_mask(h_cm, w_kg, bmi_vals):
+    """True where ``core.is_out_of_range`` would be False."""
+    a = core.ALLOWED
+    h_cm, w_kg, bmi_vals = _as_float(h_cm), _as_float(w_kg), _as_float(bmi_vals)
+    return ((a["h_cm_min"] <= h_cm) & (h_cm <= a["h_cm_max"]) &
+            (a["w_kg_min"] <= w_kg) & (w_kg <= a["w_kg_max"]) &
+            (a["bmi_min"] <= bmi_vals) & (bmi_vals <= a["bmi_max"]))
+
+
+def bmr(gender, age, h_cm, w_kg):
+    """Harris–Benedict; `gender` is "Male"/"Female" labels or a bool is-male array."""
+    g = np.asarray(gender)
+    male = g if g.dtype == bool else (g == "Male")
+    age, h_cm, w_kg = _as_float(age), _as_float(h_cm), _as_float(w_kg)
+    return np.where(male,
+                    88.362 + 13.397*w_kg + 4.799*h_cm - 5.677*age,
+                    447.593 + 9.247*w_kg + 3.098*h_cm - 4.330*age)
+
+
+def tdee(bmr_vals, activity):
+    """`activity` is ACTIVITY_FACTORS labels (unknown -> NaN) or numeric factors."""
+    return _as_float(bmr_vals) * _lookup(activity, core.ACTIVITY_FACTORS, np.nan)
+
+
+def goal_target(tdee_vals, goal):
+    t = _as_float(tdee_vals)
+    m = _lookup(goal, core.GOAL_MULTIPLIERS, 1.00)
+    return np.where(t > 0, t * m, 0.0)
+
+
+def bulk_metrics(height, weight, age=None, gender=None, activity=None,
+                 goal="Maintenance (0%)", unit=core.METRIC):
+    """Compute every metric for equally long columns of inputs.
+
+    Returns a dict of arrays: ``h_cm``, ``w_kg``, ``bmi``, ``category``
+    (int8 codes into CATEGORY_NAMES), ``in_range`` (bool), and — when age,
+    gender and activity are given — ``bmr``, ``tdee`` and ``target``.
+    """
+    h_cm, w_kg = to_metric(unit, height, weight)
+    b = bmi(h_cm, w_kg)
+    out = {
+        "h_cm": h_cm,
+        "w_kg": w_kg,
+        "bmi": b,
+        "category": bmi_category_codes(b),
+        "in_range": in_range_mask(h_cm, w_kg, b),
+    }
+    if age is not None and gender is not None and activity is not None:
+        out["bmr"] = bmr(gender, age, h_cm, w_kg)
+        out["tdee"] = tdee(out["bmr"], activity)
+        out["target"] = goal_target(out["tdee"], goal)
+    return out
+
+
+def category_names(codes):
+    """Decode category codes back to the labels used by ``bmi_category``."""
+    names = np.array(CATEGORY_NAMES + ("-",), dtype=object)
+    return names[np.asarray(codes, dtype=np.intp)]
@@ -0,0 +1,85 @@
+"""HTML summary cards (TDEE in Tab 2, daily food summary in Tab 3).
+
+The markup is parsed once into ``string.Template`` objects at import, and
+each card function is memoized on its inputs (day, values and target), so
+showing the same card again is a dict lookup.  TDEE card values are
+rounded to what the card displays before the lookup, so inputs that
+render identically share one entry.  The caches are typed: 545 and 545.0
+render differently ("545" vs "545.0"), so they are separate entries.  The cards' styles live in App's
+``CSS``, which Gradio sends once with the page, not with each card.
+"""
+from functools import lru_cache
+from html import escape
+from string import Template
+
+CARD_CACHE = 4096            # cached cards per kind
+
+_TDEE = Template("""
+<div class="card">
+  <div class="card-title">TDEE Summary — $day</div>
+  <div class="grid">
+    <div class="item"><div class="label">Gender</div><div class="value">$gender</div></div>
+    <div class="item"><div class="label">Age</div><div class="value">$age</div></div>
+    <div class="item"><div class="label">Height</div><div class="value">$height cm</div></div>
+    <div class="item"><div class="label">Weight</div><div class="value">$weight kg</div></div>
+    <div class="item"><div class="label">Activity</div><div class="value">$activity</div></div>
+  </div>
+  <div class="stats">
+    <div class="stat"><div class="stat-label">BMR</div><div class="stat-value">$bmr kcal/day</div></div>
+    <div class="stat"><div class="stat-label">TDEE</div><div class="stat-value">$tdee kcal/day</div></div>
+  </div>
+</div>
+""")
+
+_DAY = Template("""
+<div class="card">
+  <div class="card-title">Daily Summary — $day</div>
+  <div class="grid" style="grid-template-columns: repeat(4,1fr);">
+    <div class="item"><div class="label">Breakfast</div><div class="value">$breakfast kcal</div></div>
+    <div class="item"><div class="label">Lunch</div><div class="value">$lunch kcal</div></div>
+    <div class="item"><div class="label">Dinner</div><div class="value">$dinner kcal</div></div>
+    <div class="item"><div class="label">Manual</div><div class="value">$manual kcal</div></div>
+  </div>
+  <div class="stat" style="margin-top:10px;">
+    <div class="stat-label">Total</div>
+    <div class="stat-value">$total kcal</div>
+  </div>
+  <div style="margin-top:10px">
+    <div class="label">Progress vs Target</div>
+    <div style="height:14px; background:#222; border:1px solid var(--neon); border-radius:10px; overflow:hidden;">
+      <div style="height:100%; width:$pct%; background:linear-gradient(90deg, #39ff14, #ff9f1c);"></div>
+    </div>
+    <div style="margin-top:6px">Target: <b>$target kcal</b> — $diff</div>
+  </div>
+</div>
+""")
+
+
+def tdee_card(day, gender, age, h_cm, w_kg, activity, bmr, tdee):
+    """TDEE summary card for one saved TDEE record."""
+    return _tdee_card(day, gender, age, f"{h_cm:.1f}", f"{w_kg:.1f}", activity, f"{bmr:.0f}", f"{tdee:.0f}")
+
+
+@lru_cache(maxsize=CARD_CACHE, typed=True)
+def _tdee_card(day, gender, age, height, weight, activity, bmr, tdee):
+    return _TDEE.substitute(day=escape(day), gender=escape(gender), age=age, height=height, weight=weight,
+                            activity=escape(activity), bmr=bmr, tdee=tdee)
+
+
+@lru_cache(maxsize=CARD_CACHE, typed=True)
+def day_card(day, breakfast, lunch, dinner, manual, total, target):
+    """Daily food summary card: the three meals, manual extra, total and a progress bar vs `target`."""
+    if target > 0:
+        delta = total - target
+        diff = f" Over target by <b>+{delta:.0f} kcal</b>" if delta > 0 else f" Under target by <b>{abs(delta):.0f} kcal</b>"
+        pct = max(0, min(100, (total / target) * 100))
+    else:
+        diff = "ℹ️ Target is 0; select a date with TDEE and goal."
+        pct = 0
+    return _DAY.substitute(day=escape(day), breakfast=breakfast, lunch=lunch, dinner=dinner, manual=manual,
+                           total=total, pct=f"{pct:.0f}", target=f"{target:.0f}", diff=diff)
+
+
+def cache_info():
+    """{card kind: functools cache statistics}."""
+    return {"tdee": _tdee_card.cache_info(), "day": day_card.cache_info()}
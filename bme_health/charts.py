@@ -0,0 +1,354 @@
+"""Chart rendering with a per-user PNG cache.
+
+Every chart is identified by (user, kind, content hash of the plotted data).
+If the PNG for that key already exists it is returned as-is, so asking for an
+unchanged chart never touches matplotlib.  A PNG's mtime is its last use
+(cache hits touch it), and files are only deleted once unused for a while:
+one that drops out of a user's last ``KEEP_PER_USER`` right away if idle
+for ``EVICT_GRACE`` seconds, any other once idle for ``BME_CHART_TTL``
+(``sweep()``, run at startup and then every ``SWEEP_EVERY`` seconds).  A
+path just handed to Gradio is therefore never deleted under it.  Processes
+sharing ``CACHE_DIR`` (``bme_health.cluster`` workers) run with
+``BME_CHART_SWEEP=0`` and delete nothing themselves: one process's recent
+list says nothing about another's, so only the supervisor sweeps, by age.
+Rendering uses the object-oriented Agg ``Figure`` API (no global pyplot
+state) and concurrent requests for the same chart share one render.
+
+Renders run in a pool of ``BME_RENDER_PROCS`` persistent worker processes
+(matplotlib holds the GIL, so threads do not scale), each of which imports
+matplotlib once when it starts.  At most ``BME_RENDER_QUEUE`` renders may be
+queued or running; when the queue is full a caller gets the user's last
+chart of that kind (or the empty-state image) instead of waiting, and the
+miss is counted.  ``metrics()`` reports queue depth, render times and those
+counters.  ``BME_RENDER_PROCS=0`` renders on ``BME_RENDER_THREADS`` threads
+in-process instead.
+
+matplotlib itself (about half a second to import) is loaded on the first
+render, not at import time.  Empty-state charts are static PNGs shipped in
+``bme_health/assets`` (regenerate with ``python -m bme_health.charts``), so
+building the UI and showing a new user's empty BMI chart render nothing.
+``preload()`` starts the render workers (and their matplotlib import) in
+the background.
+
+Inside ``deferred_renders()`` (set up by App's async handlers) a chart that
+has to be rendered comes back as a ``RenderJob`` instead of blocking the
+calling thread; ``resolve()`` awaits those on the event loop.
+"""
+import asyncio
+import contextvars
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+CACHE_DIR = os.environ.get("BME_CHART_DIR") or os.path.join(tempfile.gettempdir(), "bme_charts")
+RENDER_PROCS = int(os.environ.get("BME_RENDER_PROCS", "2"))
+RENDER_THREADS = int(os.environ.get("BME_RENDER_THREADS", "2"))     # used when RENDER_PROCS is 0
+RENDER_QUEUE = int(os.environ.get("BME_RENDER_QUEUE", "0")) or 8 * max(RENDER_PROCS, RENDER_THREADS, 1)
+KEEP_PER_USER = 4          # PNGs kept per (user, kind); older ones are deleted once idle
+EVICT_GRACE = 300          # seconds unused before an evicted PNG is deleted
+CHART_TTL = int(os.environ.get("BME_CHART_TTL", "3600"))    # seconds unused before sweep() deletes a PNG
+SWEEP_EVERY = 600          # seconds between background sweeps
+MAX_RECENT = 10_000        # (user, kind) entries in _recent, least recently used dropped
+SWEEP = os.environ.get("BME_CHART_SWEEP", "1") != "0"    # 0: another process deletes PNGs
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+_executor = None           # created on first use, see _pool()
+_pool_lock = threading.Lock()
+_lock = threading.Lock()
+_inflight = {}             # path -> Future of a render in progress
+_recent = OrderedDict()    # (user, kind) -> OrderedDict of recent paths, LRU order
+_next_sweep = 0.0          # time.monotonic() of the next background sweep
+_defer = contextvars.ContextVar("bme_defer_renders", default=False)
+_stats = {"cache_hits": 0, "rendered": 0, "failed": 0, "shed": 0, "max_depth": 0,
+          "render_seconds": 0.0, "max_render_seconds": 0.0}
+
+# -----------------------------
+# Cache bookkeeping
+# -----------------------------
+def _digest(*parts) -> str:
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+
+def chart_path(user, kind, payload) -> str:
+    """Cache path for a chart of `kind` showing `payload` for `user`."""
+    user_tag = _digest(user or "")[:10]
+    return os.path.join(CACHE_DIR, f"{kind}-{user_tag}-{_digest(kind, payload)}.png")
+
+def _touch(path):
+    """Mark `path` used now; False if it no longer exists."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+def _remove_if_idle(path, max_age, now=None):
+    try:
+        if (now or time.time()) - os.stat(path).st_mtime >= max_age:
+            os.remove(path)
+            return True
+    except OSError:
+        pass
+    return False
+
+def _remember(user, kind, path):
+    """Record `path` as the newest chart of (user, kind); caller holds _lock."""
+    recent = _recent.get((user, kind))
+    if recent is None:
+        recent = _recent[(user, kind)] = OrderedDict()
+        while len(_recent) > MAX_RECENT:           # their files are left to sweep()
+            _recent.popitem(last=False)
+    else:
+        _recent.move_to_end((user, kind))
+    recent[path] = None
+    recent.move_to_end(path)
+    while len(recent) > KEEP_PER_USER:
+        old, _ = recent.popitem(last=False)
+        if SWEEP:
+            _remove_if_idle(old, EVICT_GRACE)
+    if SWEEP:
+        _maybe_sweep()
+
+def sweep(max_age=None):
+    """Delete cached PNGs (and stray temp files) unused for `max_age` seconds
+    (default ``CHART_TTL``); returns how many were removed."""
+    max_age = CHART_TTL if max_age is None else max_age
+    now, removed = time.time(), 0
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        if name.endswith(".png"):
+            removed += _remove_if_idle(os.path.join(CACHE_DIR, name), max_age, now)
+    return removed
+
+def _maybe_sweep():
+    global _next_sweep
+    now = time.monotonic()
+    if now >= _next_sweep:
+        _next_sweep = now + SWEEP_EVERY
+        threading.Thread(target=sweep, name="chart-sweep", daemon=True).start()
+
+def last_chart(user, kind):
+    """Most recently produced chart of `kind` for `user`, or None."""
+    with _lock:
+        recent = _recent.get((user, kind))
+        return next(reversed(recent)) if recent else None
+
+class RenderJob:
+    """A chart still being rendered: `future` finishes once `path` is written."""
+    __slots__ = ("future", "path")
+
+    def __init__(self, future, path):
+        self.future = future
+        self.path = path
+
+def deferred_renders():
+    """Make renders in the current context return RenderJob instead of waiting."""
+    _defer.set(True)
+
+async def resolve(outputs):
+    """Await every RenderJob in a handler's outputs (a tuple or one value)."""
+    if isinstance(outputs, RenderJob):
+        await asyncio.wrap_future(outputs.future)
+        return outputs.path
+    if isinstance(outputs, tuple) and any(isinstance(o, RenderJob) for o in outputs):
+        return tuple([await resolve(o) if isinstance(o, RenderJob) else o for o in outputs])
+    return outputs
+
+def _finish(user, kind, path, fut):
+    with _lock:
+        if _inflight.get(path) is not fut:
+            return                      # already accounted for
+        del _inflight[path]
+        if fut.exception() is None:
+            seconds = fut.result()
+            _stats["rendered"] += 1
+            _stats["render_seconds"] += seconds
+            _stats["max_render_seconds"] = max(_stats["max_render_seconds"], seconds)
+            _remember(user, kind, path)
+        else:
+            _stats["failed"] += 1
+
+def _fallback(user, kind):
+    """What to show when the render queue is full: the last chart, else the empty state."""
+    path = last_chart(user, kind)
+    if path and _touch(path):
+        return path
+    asset = os.path.join(ASSET_DIR, f"{kind.split('-')[0]}_empty.png")
+    return asset if os.path.exists(asset) else None
+
+def _cached_render(user, kind, payload, draw):
+    path = chart_path(user, kind, payload)
+    shed = False
+    with _lock:
+        if path not in _inflight and _touch(path):
+            _stats["cache_hits"] += 1
+            _remember(user, kind, path)
+            return path
+        fut = _inflight.get(path)
+        if fut is None:
+            if len(_inflight) >= RENDER_QUEUE:
+                _stats["shed"] += 1
+                shed = True
+            else:
+                fut = _pool().submit(_render_to, path, draw, payload)
+                _inflight[path] = fut
+                _stats["max_depth"] = max(_stats["max_depth"], len(_inflight))
+    if shed:
+        return _fallback(user, kind)
+    fut.add_done_callback(lambda f: _finish(user, kind, path, f))
+    if _defer.get():
+        return RenderJob(fut, path)
+    fut.result()
+    _finish(user, kind, path, fut)     # the callback may not have run yet
+    return path
+
+def metrics():
+    """Render pool counters: queue depth now / max, renders, sheds, render seconds."""
+    with _lock:
+        m = dict(_stats, queue_depth=len(_inflight), queue_limit=RENDER_QUEUE,
+                 workers=RENDER_PROCS or RENDER_THREADS, processes=RENDER_PROCS > 0)
+    m["avg_render_seconds"] = m["render_seconds"] / m["rendered"] if m["rendered"] else 0.0
+    return m
+
+# -----------------------------
+# Render pool
+# -----------------------------
+def _matplotlib():
+    """(Figure, FigureCanvasAgg), imported on first use."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    return Figure, FigureCanvasAgg
+
+def _warm():
+    _matplotlib()
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                if RENDER_PROCS > 0:
+                    # fork keeps workers from re-importing the app's __main__ (Linux);
+                    # elsewhere use the platform default
+                    ctx = (multiprocessing.get_context("fork") if sys.platform.startswith("linux")
+                           else multiprocessing.get_context())
+                    _executor = ProcessPoolExecutor(max_workers=RENDER_PROCS, mp_context=ctx,
+                                                    initializer=_warm)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=RENDER_THREADS, thread_name_prefix="chart")
+    return _executor
+
+def preload():
+    """Sweep charts left idle by earlier runs (unless ``SWEEP`` is off) and
+    start the render workers (each imports matplotlib) without waiting for them.
+
+    Call it early, before the server starts its threads, so forked workers
+    begin from a quiet process."""
+    global _next_sweep
+    if SWEEP:
+        sweep()
+        _next_sweep = time.monotonic() + SWEEP_EVERY
+    pool = _pool()
+    return [pool.submit(_warm) for _ in range(max(RENDER_PROCS, 1))]
+
+def _render_to(path, draw, payload):
+    """Render one chart to `path` (in a worker); returns the seconds it took."""
+    t0 = time.perf_counter()
+    Figure, FigureCanvasAgg = _matplotlib()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig = Figure(figsize=(7.6, 3.8))
+    FigureCanvasAgg(fig)
+    draw(fig.add_subplot(), payload)
+    fig.tight_layout()
+    # write-then-rename so readers never see a half-written PNG
+    fd, tmp = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(path))
+    os.close(fd)
+    fig.savefig(tmp, format="png")
+    os.replace(tmp, path)
+    return time.perf_counter() - t0
+
+# -----------------------------
+# Chart kinds
+# -----------------------------
+def _draw_bmi_series(ax, payload):
+    points = payload
+    ax.axhspan(0, 18.5, color="#6ec1ff22")
+    ax.axhspan(18.5, 25, color="#39ff1433")
+    ax.axhspan(25, 30, color="#ffdd0033")
+    ax.axhspan(30, 80, color="#ff3b3b2a")
+    ax.set_title("BMI Over Time (category bands)")
+    ax.set_ylabel("BMI")
+    ax.grid(True, linestyle="--", alpha=0.35)
+    if points:
+        xs = [x for x, _, _ in points]
+        ys = [y for _, y, _ in points]
+        ax.plot(xs, ys, marker="o", linewidth=2)
+        for x, y, cat in points:
+            ax.annotate(f"{y:.1f}\n{cat}", (x, y), textcoords="offset points",
+                        xytext=(0, 8), ha="center", fontsize=9)
+        ax.tick_params(axis="x", labelrotation=25)
+        for lbl in ax.get_xticklabels():
+            lbl.set_ha("right")
+    else:
+        ax.text(0.5, 0.5, "No BMI data yet", ha="center", va="center",
+                transform=ax.transAxes, fontsize=12, alpha=0.7)
+
+def _draw_food_week(ax, payload):
+    labels, vals, target_kcal = payload
+    bars = ax.bar(labels, vals, color="Orange")
+    ax.grid(axis="y", linestyle="--", alpha=0.35)
+    ax.tick_params(axis="x", labelrotation=25)
+    for lbl in ax.get_xticklabels():
+        lbl.set_ha("right")
+    ax.set_ylabel("Calories (kcal)")
+    ax.set_title(f"Daily Calories — {labels[0]} to {labels[-1]}")
+    if target_kcal and target_kcal > 0:
+        ax.axhline(target_kcal, linestyle="--", linewidth=2)
+    for b in bars:
+        v = b.get_height()
+        ax.annotate(f"{v:.0f}", (b.get_x() + b.get_width()/2, v),
+                    ha="center", va="bottom", fontsize=9, xytext=(0, 3),
+                    textcoords="offset points")
+
+def _draw_food_empty(ax, payload):
+    ax.set_title("Daily Calories — last 7 days")
+    ax.set_ylabel("Calories (kcal)")
+    ax.grid(axis="y", linestyle="--", alpha=0.35)
+    ax.set_xticks([])
+    ax.tick_params(axis="y", labelleft=False)
+    ax.text(0.5, 0.5, "Log in and pick a date to see your week", ha="center", va="center",
+            transform=ax.transAxes, fontsize=12, alpha=0.7)
+
+_PLACEHOLDERS = {"bmi": _draw_bmi_series, "food": _draw_food_empty}
+
+def placeholder(kind):
+    """Path of the static empty-state PNG for `kind` ("bmi" or "food")."""
+    path = os.path.join(ASSET_DIR, f"{kind}_empty.png")
+    if os.path.exists(path):
+        return path
+    # assets missing (e.g. a stripped install): render once into the cache
+    return _cached_render(None, f"{kind}-empty", (), _PLACEHOLDERS[kind])
+
+def bmi_series_png(user, points):
+    """`points` is a date-sorted sequence of (date_str, bmi, category)."""
+    if not points:
+        return placeholder("bmi")
+    return _cached_render(user, "bmi", tuple(points), _draw_bmi_series)
+
+def food_week_png(user, labels, vals, target_kcal):
+    payload = (tuple(labels), tuple(float(v) for v in vals), round(float(target_kcal or 0), 2))
+    return _cached_render(user, "food", payload, _draw_food_week)
+
+
+if __name__ == "__main__":
+    for kind, draw in _PLACEHOLDERS.items():   # rendered in-process
+        _render_to(os.path.join(ASSET_DIR, f"{kind}_empty.png"), draw, ())
+        print("wrote", os.path.join(ASSET_DIR, f"{kind}_empty.png"))
@@ -0,0 +1,61 @@
+"""Command line for batch jobs that need neither a web server nor Gradio.
+
+    python -m bme_health report logs/*.csv --out reports/ [--goal lose] [--procs 4]
+
+writes ``reports/summary.csv`` and one ``<user>-<hash>_daily.csv`` per user (see
+``bme_health.pipeline``) and prints the summary table.
+"""
+import argparse
+import sys
+import time
+
+from bme_health import pipeline
+from bme_health.core import GOALS
+
+_GOAL_SHORT = {g.split()[0].lower(): g for g in GOALS}      # lose / maintenance / gain
+
+
+def _goal(text):
+    goal = _GOAL_SHORT.get(text.strip().lower(), text)
+    if goal not in GOALS:
+        raise argparse.ArgumentTypeError(f"goal must be one of {', '.join(_GOAL_SHORT)}")
+    return goal
+
+
+def _fmt(v):
+    return "-" if v is None else str(v)
+
+
+def report(args):
+    t0 = time.perf_counter()
+    summaries = pipeline.run(args.inputs, args.out, goal=args.goal, procs=args.procs, food_db=args.foods,
+                             allow_out_of_range=args.allow_out_of_range, write_daily=not args.summary_only)
+    if not args.quiet:
+        cols = ("user", "rows", "rejected", "last_date", "bmi_last", "category_last", "target_last", "avg_kcal")
+        print("\t".join(cols))
+        for s in summaries:
+            print("\t".join(_fmt(s[c]) for c in cols))
+    rows = sum(s["rows"] for s in summaries)
+    print(f"{len(summaries)} users, {rows} rows in {time.perf_counter() - t0:.2f}s"
+          + (f" -> {args.out}" if args.out else ""), file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bme_health", description=__doc__.split("\n")[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("report", help="per-user BMI / TDEE / food reports from CSV or JSONL files")
+    rp.add_argument("inputs", nargs="+", help="CSV or JSONL files (rows without a user column belong to the file's name)")
+    rp.add_argument("--out", help="directory for summary.csv and the per-user daily CSVs")
+    rp.add_argument("--goal", type=_goal, default="Maintenance (0%)", help="lose, maintenance or gain")
+    rp.add_argument("--procs", type=int, default=None, help="worker processes (default: one per CPU)")
+    rp.add_argument("--foods", default="", help="extra food database for meal rows (as BME_FOOD_DB)")
+    rp.add_argument("--allow-out-of-range", action="store_true")
+    rp.add_argument("--summary-only", action="store_true", help="skip the per-user daily CSVs")
+    rp.add_argument("-q", "--quiet", action="store_true", help="don't print the summary table")
+    rp.set_defaults(func=report)
+    args = ap.parse_args(argv)
+    try:
+        return args.func(args)
+    except OSError as e:
+        ap.exit(1, f"error: {e}\n")
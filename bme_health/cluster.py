@@ -0,0 +1,77 @@
+"""Serve the app from several worker processes sharing one SQLite store.
+
+``BME_WORKERS=N python App.py`` starts N copies of the app, worker i on
+port ``GRADIO_SERVER_PORT + i`` (default 7860 + i), each with
+``BME_SHARED=1`` so its store invalidates cached indexes when another
+worker writes (see ``bme_health.store``) and, if ``BME_METRICS_PORT`` is
+set, its metrics on that port + i.  All workers must use the same
+``BME_DB``; the in-memory store cannot be shared.
+
+Workers also share the chart cache directory, so they start with
+``BME_CHART_SWEEP=0`` and this supervisor alone deletes PNGs, by age
+(``charts.sweep()`` every ``charts.SWEEP_EVERY`` seconds).
+
+A Gradio session keeps its queue and event stream in one process, so the
+reverse proxy in front of the workers must be sticky, e.g. nginx
+``upstream bme { ip_hash; server 127.0.0.1:7860; server 127.0.0.1:7861; }``.
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from bme_health import charts
+
+BASE_PORT = int(os.environ.get("GRADIO_SERVER_PORT", "7860"))
+
+
+def worker_env(i, base_port=BASE_PORT, env=None):
+    """Environment for worker `i`: its own port, one process, shared store,
+    no chart deletion (the supervisor sweeps)."""
+    env = dict(os.environ if env is None else env)
+    env.update(BME_WORKERS="1", BME_WORKER_INDEX=str(i), BME_SHARED="1",
+               BME_CHART_SWEEP="0", GRADIO_SERVER_PORT=str(base_port + i))
+    if env.get("BME_METRICS_PORT"):           # one metrics endpoint per worker
+        env["BME_METRICS_PORT"] = str(int(env["BME_METRICS_PORT"]) + i)
+    return env
+
+
+def start(n, argv, base_port=BASE_PORT, env=None, **popen_kwargs):
+    """Start `n` workers running `argv` (after the interpreter); returns the Popen list."""
+    if not (env or os.environ).get("BME_DB"):
+        raise SystemExit("BME_WORKERS > 1 needs BME_DB: workers share user data through SQLite.")
+    return [subprocess.Popen([sys.executable, *argv], env=worker_env(i, base_port, env), **popen_kwargs)
+            for i in range(n)]
+
+
+def stop(procs, timeout=10):
+    for p in procs:
+        if p.poll() is None:
+            p.send_signal(signal.SIGINT if os.name != "nt" else signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    for p in procs:
+        try:
+            p.wait(max(0.1, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def run(n, argv, base_port=BASE_PORT):
+    """Start `n` workers and wait, sweeping the shared chart cache meanwhile;
+    Ctrl-C (or one worker exiting) stops them all."""
+    charts.sweep()
+    procs = start(n, argv, base_port)
+    print(f"{n} workers on ports {base_port}–{base_port + n - 1}", flush=True)
+    next_sweep = time.monotonic() + charts.SWEEP_EVERY
+    try:
+        while all(p.poll() is None for p in procs):
+            time.sleep(0.5)
+            if time.monotonic() >= next_sweep:
+                charts.sweep()
+                next_sweep = time.monotonic() + charts.SWEEP_EVERY
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(procs)
+    return max((p.returncode or 0) for p in procs)
@@ -0,0 +1,170 @@
+"""Cross-user (cohort) aggregates for the clinician dashboard.
+
+Each user is reduced on their own to a small *partial* (``user_partial``):
+the BMI category at the end of every month they have a BMI record for,
+their latest TDEE and activity level, and, per goal, how many logged food
+days were under, within or over that day's target (the latest TDEE on or
+before the day × the goal; "within" is ±``ADHERENCE_BAND``).  Partials are
+then summed (``combine``) into the cohort view.
+
+The store caches every user's partial and drops it on any write to that
+user's records (``UserStore.cohort_partial``), so a refresh only
+recomputes users whose data changed.  With an SQLite store those are
+mapped over a pool of ``BME_COHORT_PROCS`` worker processes (default: one
+per CPU, at most 4; ``0`` computes in the calling thread): only user names
+go to a worker, which reads their records over its own connection, and
+only partials come back.  An in-memory store is computed in the calling
+thread, since its records exist only in this process and pickling them
+costs about as much as reducing them.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bme_health.core import BMI_CATEGORIES, GOAL_MULTIPLIERS, bmi_category
+from bme_health.store import SQLiteStore
+
+COHORT_PROCS = int(os.environ.get("BME_COHORT_PROCS", str(min(4, os.cpu_count() or 1))))
+ADHERENCE_BAND = 0.10             # within ±10% of the target counts as on target
+MIN_PARALLEL = 8                  # fewer users than this are computed in-process
+
+_executor = None
+_pool_lock = threading.Lock()
+_readers = {}                     # in a worker: SQLite path -> its own store
+
+
+def user_partial(bmi, tdee, food):
+    """Partial aggregate of one user.
+
+    `bmi` is [(day, bmi)], `tdee` [(day, tdee, activity)] and `food`
+    [(day, kcal)], each sorted by "YYYY-MM-DD" day.  Days with 0 kcal
+    (reset) or with no TDEE yet are not counted for adherence."""
+    months = {}
+    for day, value in bmi:
+        months[day[:7]] = bmi_category(value)          # the month's last record wins
+    adherence = {goal: [0, 0, 0] for goal in GOAL_MULTIPLIERS}     # under, within, over
+    j, current = 0, None
+    for day, kcal in food:
+        while j < len(tdee) and tdee[j][0] <= day:
+            current = tdee[j][1]
+            j += 1
+        if not current or not kcal:
+            continue
+        for goal, m in GOAL_MULTIPLIERS.items():
+            ratio = kcal / (current * m)
+            adherence[goal][0 if ratio < 1 - ADHERENCE_BAND else 2 if ratio > 1 + ADHERENCE_BAND else 1] += 1
+    return {
+        "months": months,
+        "category": bmi_category(bmi[-1][1]) if bmi else None,
+        "tdee": (tdee[-1][2], tdee[-1][1]) if tdee else None,
+        "adherence": adherence,
+    }
+
+
+def combine(partials):
+    """Cohort totals from an iterable of user partials."""
+    months, current, activity = {}, dict.fromkeys(BMI_CATEGORIES, 0), {}
+    adherence = {goal: [0, 0, 0] for goal in GOAL_MULTIPLIERS}
+    users = with_bmi = with_food = 0
+    for p in partials:
+        users += 1
+        for month, cat in p["months"].items():
+            counts = months.get(month)
+            if counts is None:
+                counts = months[month] = dict.fromkeys(BMI_CATEGORIES, 0)
+            counts[cat] += 1
+        if p["category"] is not None:
+            with_bmi += 1
+            current[p["category"]] += 1
+        if p["tdee"] is not None:
+            act, value = p["tdee"]
+            total = activity.setdefault(act, [0.0, 0])
+            total[0] += value
+            total[1] += 1
+        logged = False
+        for goal, counts in p["adherence"].items():
+            total = adherence[goal]
+            for i in range(3):
+                total[i] += counts[i]
+            logged = logged or any(counts)
+        with_food += logged
+    return {
+        "users": users, "with_bmi": with_bmi, "with_food": with_food,
+        "months": dict(sorted(months.items())),
+        "current": current,
+        "activity": {act: (s / n, n) for act, (s, n) in sorted(activity.items())},
+        "adherence": adherence,
+    }
+
+
+def _inputs(store, user):
+    bmi = [(day, r["bmi"]) for day, r in store.iter_records(user, "bmi")]
+    tdee = [(day, r["tdee"], r["activity"]) for day, r in store.iter_records(user, "tdee")]
+    food = list(store.iter_records(user, "food"))
+    return sorted(bmi), sorted(tdee), sorted(food)
+
+
+def _partial_from_db(item):
+    """Worker side: read one user's records from the SQLite file and reduce them."""
+    path, user = item
+    store = _readers.get(path)
+    if store is None:
+        store = _readers[path] = SQLiteStore(path, None, pool_size=1)
+    return user_partial(*_inputs(store, user))
+
+
+def _warm():
+    pass
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                # fork keeps workers from re-importing the app's __main__ (Linux), as in charts
+                ctx = (multiprocessing.get_context("fork") if sys.platform.startswith("linux")
+                       else multiprocessing.get_context())
+                _executor = ProcessPoolExecutor(max_workers=COHORT_PROCS, mp_context=ctx)
+    return _executor
+
+
+def preload():
+    """Start the worker processes now and wait until they are up (call
+    before the server starts its threads, so they fork from a quiet process)."""
+    if COHORT_PROCS > 0:
+        pool = _pool()
+        for f in [pool.submit(_warm) for _ in range(COHORT_PROCS)]:
+            f.result()
+
+
+def compute(store, users=None):
+    """(cohort totals, info) over `users` (default: every user in `store`).
+
+    `info` has "users", "recomputed" (partials that were not cached) and
+    "seconds"."""
+    t0 = time.perf_counter()
+    users = list(store.user_names() if users is None else users)
+    partials, missing = [], []
+    for user in users:
+        p = store.cohort_partial(user)
+        if p is None:
+            missing.append(user)
+        else:
+            partials.append(p)
+    if missing:
+        tokens = [store.cohort_token(u) for u in missing]      # taken before reading the records
+        if isinstance(store, SQLiteStore) and COHORT_PROCS > 0 and len(missing) >= MIN_PARALLEL:
+            chunk = max(1, len(missing) // (COHORT_PROCS * 4))
+            items = [(store.path, u) for u in missing]
+            fresh = list(_pool().map(_partial_from_db, items, chunksize=chunk))
+        else:
+            fresh = [user_partial(*_inputs(store, u)) for u in missing]
+        for user, token, p in zip(missing, tokens, fresh):
+            store.put_cohort_partial(user, token, p)
+        partials.extend(fresh)
+    totals = combine(partials)
+    return totals, {"users": len(users), "recomputed": len(missing), "seconds": time.perf_counter() - t0}
@@ -0,0 +1,375 @@
+"""Column-oriented record tables for the in-memory store.
+
+A ``RecordColumns`` holds one user's records of one kind as parallel
+``array`` columns sorted by day: an int32 day ordinal, int32 fixed-point
+columns (hundredths) for measurements, an int16 column for age and int8
+codes for repeated strings (gender, activity).  A
+BMI record costs 16 bytes and a TDEE record 24, instead of a dict, its
+float objects and a date string key (several hundred bytes).
+
+A value that does not fit its compact column (a confirmed out-of-range
+weight of 3e7 kg, an imported 1e12 kcal day, an age of 40000, inf) switches
+that column to float64 for good, so the store keeps whatever SQLite would.
+An int16 column reserves its minimum, which no stored value takes, for
+None, and a float64 column uses NaN for it.
+
+It is a read-only ``Mapping`` keyed by "YYYY-MM-DD" like the dicts it
+replaces: ``recs[day]`` builds the record dict on demand, so handlers keep
+using ``in``, ``get`` and ``recs[day]["bmi"]``.  Writes go through
+``put`` / ``put_many`` / ``delete`` / ``clear``; ``dump`` / ``load`` copy
+the raw columns for journal snapshots.  Measurements keep 2 decimals, the
+precision the app saves and shows (same size as float32, but exact).  A
+lock keeps the columns aligned under concurrent writes.
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from functools import partial
+import numpy as np
+
+from bme_health.core import ACTIVITY_FACTORS
+from bme_health.dates import to_day, to_ordinal
+
+SCALE = 100                    # fixed-point columns hold value * SCALE
+_INT32_MAX = 2**31 - 1         # largest magnitude a compact column holds
+_INT16_MAX = 2**15 - 1
+_NULL = -2**15                 # None in an int16 column
+_WIDE = "d"                    # float64: the value itself, NaN for None
+
+
+class _Codes:
+    """Small-int codes for a repeated string column (codes grow as values appear).
+
+    Codes live in int8 columns, so at most MAX_CODES distinct values; a new
+    one beyond that raises ValueError (the app only stores values it has
+    checked against a short list)."""
+    MAX_CODES = 128
+    __slots__ = ("values", "_code", "_lock")
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self._code = {v: i for i, v in enumerate(self.values)}
+        self._lock = threading.Lock()
+
+    def encode(self, value):
+        code = self._code.get(value)
+        if code is None:
+            with self._lock:
+                code = self._code.get(value)
+                if code is None:
+                    code = len(self.values)
+                    if code >= self.MAX_CODES:
+                        raise ValueError(f"more than {self.MAX_CODES} distinct values; "
+                                         f"{value!r} not stored")
+                    self.values.append(value)
+                    self._code[value] = code
+        return code
+
+    def decode(self, code):
+        return self.values[code]
+
+
+def _typecode(kind):
+    """Compact typecode of a column kind (before any widening)."""
+    return "b" if isinstance(kind, _Codes) else "i" if kind == "c" else kind
+
+
+def _cents(v):
+    """`v` in a compact measurement column (OverflowError if it does not fit)."""
+    x = float(v) * SCALE
+    if -_INT32_MAX <= x <= _INT32_MAX:                  # NaN and inf never fit
+        return round(x)
+    raise OverflowError(v)
+
+
+def _short(v):
+    """`v` in a compact int16 column (OverflowError if it does not fit)."""
+    if v is None:
+        return _NULL
+    if -_INT16_MAX <= v <= _INT16_MAX:
+        return int(v)
+    raise OverflowError(v)
+
+
+def _wide(kind, v):
+    """`v` as stored in a float64 column (measurements still rounded to hundredths)."""
+    if kind == "h":
+        return math.nan if v is None else float(v)
+    x = float(v) * SCALE
+    return round(x) / SCALE if math.isfinite(x) else float(v)
+
+
+def _from_cents(v):
+    return v / SCALE
+
+
+def _from_short(v):
+    return None if v == _NULL else v
+
+
+def _from_wide_int(v):
+    return None if math.isnan(v) else int(v)
+
+
+def _decode_column(col, kind):
+    """A whole column as a list of Python values (measurements scaled back in bulk)."""
+    if isinstance(kind, _Codes):
+        values = kind.values
+        return [values[c] for c in col]
+    if col.typecode == _WIDE:
+        return [None if math.isnan(v) else int(v) for v in col] if kind == "h" else col.tolist()
+    if kind == "h":
+        return [None if v == _NULL else v for v in col]
+    return (np.frombuffer(col, dtype=np.int32) / SCALE).tolist()
+
+
+class RecordColumns(Mapping):
+    """Date-keyed records stored column-wise.
+
+    `fields` is a sequence of (name, typecode) where typecode is "c" for a
+    measurement in hundredths (int32), "h" for an int16 (None allowed) or a
+    ``_Codes`` for an enum column; "c" and "h" columns widen to float64 when
+    a value does not fit.  With `scalar` the mapping's values are
+    the single field's value instead of a dict (the food log)."""
+
+    def __init__(self, fields, scalar=False):
+        self._names = tuple(name for name, _ in fields)
+        self._kinds = tuple(kind for _, kind in fields)
+        self._scalar = scalar
+        self._lock = threading.Lock()
+        self.clear()
+
+    # -----------------------------
+    # Encoding
+    # -----------------------------
+    # The _encode* and _widen methods run under self._lock, since what a
+    # value encodes to depends on whether its column has been widened.
+    def _values(self, rec):
+        return [rec] if self._scalar else [rec.get(name) for name in self._names]
+
+    def _set_codecs(self):
+        """Per-column encode / decode functions for the columns' current typecodes."""
+        self._encoders, self._decoders = [], []
+        for kind, col in zip(self._kinds, self._cols):
+            if isinstance(kind, _Codes):
+                enc, dec = kind.encode, kind.decode
+            elif col.typecode == _WIDE:
+                enc, dec = partial(_wide, kind), _from_wide_int if kind == "h" else float
+            else:
+                enc, dec = (_short, _from_short) if kind == "h" else (_cents, _from_cents)
+            self._encoders.append(enc)
+            self._decoders.append(dec)
+
+    def _encode_row(self, values):
+        try:
+            return [enc(v) for enc, v in zip(self._encoders, values)]
+        except OverflowError:
+            pass
+        row = []
+        for j, v in enumerate(values):
+            try:
+                row.append(self._encoders[j](v))
+            except OverflowError:
+                self._widen(j)
+                row.append(self._encoders[j](v))
+        return row
+
+    def _encode_column(self, j, values):
+        """Column j's values for a batch as an array of its typecode
+        (measurements scaled in bulk)."""
+        kind = self._kinds[j]
+        if isinstance(kind, _Codes):
+            return array("b", [kind.encode(v) for v in values])
+        if kind == "c" and self._cols[j].typecode != _WIDE:
+            x = np.asarray(values, dtype=np.float64) * SCALE
+            if (np.abs(x) <= _INT32_MAX).all():                 # NaN and inf fail
+                return array("i", np.rint(x).astype(np.int32).tobytes())
+            self._widen(j)
+        elif kind == "h" and self._cols[j].typecode != _WIDE:
+            try:
+                return array("h", [_short(v) for v in values])
+            except OverflowError:
+                self._widen(j)
+        return array(_WIDE, [_wide(kind, v) for v in values])
+
+    def _widen(self, j):
+        """Switch column j to float64, converting what it holds."""
+        values = _decode_column(self._cols[j], self._kinds[j])
+        self._cols[j] = array(_WIDE, [math.nan if v is None else v for v in values])
+        self._set_codecs()
+
+    def _decode(self, cols, i):
+        vals = [dec(col[i]) for dec, col in zip(self._decoders, cols)]
+        return vals[0] if self._scalar else dict(zip(self._names, vals))
+
+    def _find(self, ordinal):
+        i = bisect_left(self._days, ordinal)
+        return i, i < len(self._days) and self._days[i] == ordinal
+
+    # -----------------------------
+    # Mapping
+    # -----------------------------
+    def __getitem__(self, day):
+        try:
+            ordinal = to_ordinal(day)
+        except (TypeError, ValueError):
+            raise KeyError(day) from None
+        with self._lock:
+            i, found = self._find(ordinal)
+            if not found:
+                raise KeyError(day)
+            return self._decode(self._cols, i)
+
+    def __contains__(self, day):
+        try:
+            ordinal = to_ordinal(day)
+        except (TypeError, ValueError):
+            return False
+        with self._lock:
+            return self._find(ordinal)[1]
+
+    def __len__(self):
+        return len(self._days)
+
+    def __iter__(self):
+        with self._lock:
+            days = self._days[:]
+        return (to_day(o) for o in days)
+
+    def ordinals(self):
+        """Day ordinals in date order (a copy)."""
+        with self._lock:
+            return self._days[:]
+
+    def iter_items(self):
+        """(day, record) in date order, over a snapshot of the columns."""
+        with self._lock:
+            days = self._days[:]
+            cols = [c[:] for c in self._cols]
+        values = [_decode_column(col, kind) for col, kind in zip(cols, self._kinds)]
+        if self._scalar:
+            rows = values[0]
+        else:
+            names = self._names
+            rows = (dict(zip(names, row)) for row in zip(*values))
+        for o, rec in zip(days, rows):
+            yield to_day(o), rec
+
+    def column(self, name):
+        """(day ordinals, values) of one column in date order, decoded like records."""
+        j = self._names.index(name)
+        with self._lock:
+            days = self._days[:]
+            col = self._cols[j][:]
+        return days, _decode_column(col, self._kinds[j])
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def put(self, day, rec):
+        ordinal, values = to_ordinal(day), self._values(rec)
+        with self._lock:
+            row = self._encode_row(values)
+            i, found = self._find(ordinal)
+            if found:
+                for col, v in zip(self._cols, row):
+                    col[i] = v
+            else:
+                self._days.insert(i, ordinal)
+                for col, v in zip(self._cols, row):
+                    col.insert(i, v)
+
+    def put_many(self, items):
+        """Like put() for each (day, rec); one rebuild instead of many inserts."""
+        self._put_rows({to_ordinal(day): self._values(rec) for day, rec in items})
+
+    def put_rows(self, items):
+        """Like put_many() for (day, [field values in field order]) (journal replay)."""
+        self._put_rows({to_ordinal(day): values for day, values in items})
+
+    def _put_rows(self, rows):
+        """Write {ordinal: field values}, encoding each column in bulk."""
+        if not rows:
+            return
+        days = sorted(rows)
+        with self._lock:
+            by_column = zip(*(rows[o] for o in days))
+            cols = [self._encode_column(j, col) for j, col in enumerate(by_column)]
+            if not self._days or days[0] > self._days[-1]:
+                self._days.extend(days)                # all after the last day: append
+                for mine, col in zip(self._cols, cols):
+                    mine.extend(col)
+                return
+            merged = dict(zip(days, zip(*cols)))
+            for i, o in enumerate(self._days):
+                merged.setdefault(o, [col[i] for col in self._cols])
+            new = sorted(merged)
+            self._days = array("i", new)
+            self._cols = [array(col.typecode, [merged[o][j] for o in new])
+                          for j, col in enumerate(self._cols)]
+
+    def delete(self, day):
+        try:
+            ordinal = to_ordinal(day)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            i, found = self._find(ordinal)
+            if found:
+                del self._days[i]
+                for col in self._cols:
+                    del col[i]
+
+    def clear(self):
+        with self._lock:
+            self._days = array("i")
+            self._cols = [array(_typecode(k)) for k in self._kinds]
+            self._set_codecs()
+
+    def dump(self):
+        """(days, columns, enum value lists, column typecodes) as bytes and
+        lists, for a snapshot."""
+        with self._lock:
+            return (self._days.tobytes(), [c.tobytes() for c in self._cols],
+                    [list(k.values) if isinstance(k, _Codes) else None for k in self._kinds],
+                    [c.typecode for c in self._cols])
+
+    def load(self, state):
+        """Replace the contents with a ``dump()`` (enum codes are re-mapped if they differ)."""
+        days_bytes, col_bytes, code_values, typecodes = state
+        days = array("i")
+        days.frombytes(days_bytes)
+        cols = []
+        for data, kind, values, typecode in zip(col_bytes, self._kinds, code_values, typecodes):
+            col = array(typecode)
+            col.frombytes(data)
+            if values is not None and values != kind.values[:len(values)]:
+                remap = [kind.encode(v) for v in values]
+                col = array(col.typecode, (remap[c] for c in col))
+            cols.append(col)
+        with self._lock:
+            self._days, self._cols = days, cols
+            self._set_codecs()
+
+    def nbytes(self):
+        """Bytes held by the columns (excluding list/array object headers)."""
+        return sum(c.itemsize * len(c) for c in [self._days, *self._cols])
+
+
+GENDERS = _Codes(("Male", "Female"))
+ACTIVITIES = _Codes(ACTIVITY_FACTORS)
+
+
+def bmi_columns():
+    return RecordColumns((("h_cm", "c"), ("w_kg", "c"), ("bmi", "c")))
+
+
+def tdee_columns():
+    return RecordColumns((("bmr", "c"), ("tdee", "c"), ("gender", GENDERS), ("age", "h"),
+                          ("activity", ACTIVITIES), ("h_cm", "c"), ("w_kg", "c")))
+
+
+def food_columns():
+    return RecordColumns((("kcal", "c"),), scalar=True)
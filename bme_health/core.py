@@ -0,0 +1,95 @@
+"""Biomedical formulas and input parsing shared by the UI and batch tools.
+
+Nothing here imports Gradio or matplotlib.
+"""
+from datetime import date
+
+from bme_health import dates
+
+ALLOWED = {"h_cm_min": 100, "h_cm_max": 250, "w_kg_min": 30, "w_kg_max": 200, "bmi_min": 10, "bmi_max": 70}
+
+# BMI < 18.5 Underweight, < 25 Normal, < 30 Overweight, otherwise Obese
+BMI_THRESHOLDS = (18.5, 25, 30)
+BMI_CATEGORIES = ("Underweight", "Normal", "Overweight", "Obese")
+
+ACTIVITY_FACTORS = {
+    "Sedentary (little/no exercise)": 1.2,
+    "Light (1–3 days/wk)": 1.375,
+    "Moderate (3–5 days/wk)": 1.55,
+    "Active (6–7 days/wk)": 1.725,
+    "Very active (hard exercise)": 1.9
+}
+
+GOAL_MULTIPLIERS = {"Lose (-20%)": 0.80, "Maintenance (0%)": 1.00, "Gain (+15%)": 1.15}
+GOALS = list(GOAL_MULTIPLIERS)
+
+METRIC = "Metric (cm, kg)"
+IMPERIAL = "Imperial (inch, lb)"
+INCH_TO_CM = 2.54
+LB_TO_KG = 0.453592
+
+# -----------------------------
+# Utilities
+# -----------------------------
+def ymd(d: date) -> str:
+    return d.strftime("%Y-%m-%d")
+
+def today_str() -> str:
+    return dates.to_day(dates.today())
+
+def parse_date_str(s: str):
+    """Canonical "YYYY-MM-DD" for user-typed text, or None (parses are cached)."""
+    if not s or not isinstance(s, str):
+        return None
+    o = dates.parse(s)
+    return None if o is None else dates.to_day(o)
+
+def to_float(x):
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+def unit_to_metric(unit, height_val, weight_val):
+    h = to_float(height_val)
+    w = to_float(weight_val)
+    if h is None or w is None:
+        return None, None
+    if unit == METRIC:
+        return h, w
+    return h * INCH_TO_CM, w * LB_TO_KG
+
+# -----------------------------
+# Formulas
+# -----------------------------
+def calc_bmi(h_cm, w_kg):
+    if h_cm is None or w_kg is None or h_cm <= 0:
+        return None
+    h_m = h_cm / 100.0
+    return w_kg / (h_m ** 2)
+
+def bmi_category(bmi):
+    if bmi is None:
+        return "-"
+    for limit, name in zip(BMI_THRESHOLDS, BMI_CATEGORIES):
+        if bmi < limit:
+            return name
+    return BMI_CATEGORIES[-1]
+
+def is_out_of_range(h_cm, w_kg, bmi):
+    return not (ALLOWED["h_cm_min"] <= h_cm <= ALLOWED["h_cm_max"]) or \
+           not (ALLOWED["w_kg_min"] <= w_kg <= ALLOWED["w_kg_max"]) or \
+           not (ALLOWED["bmi_min"] <= bmi <= ALLOWED["bmi_max"])
+
+def hb_bmr(gender, age, h_cm, w_kg):
+    if gender == "Male":
+        return 88.362 + 13.397*w_kg + 4.799*h_cm - 5.677*age
+    else:
+        return 447.593 + 9.247*w_kg + 3.098*h_cm - 4.330*age
+
+def compute_target_from_goal(tdee: float, goal: str) -> float:
+    if not tdee or tdee <= 0:
+        return 0.0
+
+    m = GOAL_MULTIPLIERS.get(goal, 1.00)
+    return tdee * m
@@ -0,0 +1,95 @@
+"""Sorted index of the dates that have a record, per user and record type.
+
+Days are kept as int ordinals (``bme_health.dates``) in an ``array``, so
+lookups, inserts and deletes are a binary search over machine ints.  New
+records are usually today's date, which lands at the tail and costs only
+the search; an insert in the middle also shifts the array, a memmove that
+stays in the microseconds even for decades of daily entries.  The public
+methods take and return "YYYY-MM-DD" strings.
+
+``choices()`` returns an immutable tuple of strings that is reused until
+the next change (and patched, not rebuilt, by a single add or discard),
+so building several dropdowns in one request costs one copy.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+from bme_health.dates import to_day, to_days, to_ordinal
+
+
+def _ordinal(day):
+    try:
+        return to_ordinal(day)
+    except (TypeError, ValueError):
+        return None
+
+
+class SortedDates:
+    __slots__ = ("_days", "_snapshot")
+
+    def __init__(self, days=()):
+        self._days = array("i", sorted({to_ordinal(d) for d in days}))
+        self._snapshot = None
+
+    @classmethod
+    def from_ordinals(cls, ordinals):
+        """Index over already sorted, distinct day ordinals."""
+        idx = cls()
+        idx._days = array("i", ordinals)
+        return idx
+
+    def __len__(self):
+        return len(self._days)
+
+    def __contains__(self, day):
+        o = _ordinal(day)
+        if o is None:
+            return False
+        i = bisect_left(self._days, o)
+        return i < len(self._days) and self._days[i] == o
+
+    def __iter__(self):
+        return iter(self.choices())
+
+    def add(self, day):
+        o = to_ordinal(day)
+        i = bisect_left(self._days, o)
+        if i == len(self._days) or self._days[i] != o:
+            self._days.insert(i, o)
+            snap = self._snapshot
+            if snap is not None:            # patch the tuple rather than re-format every day
+                self._snapshot = snap[:i] + (to_day(o),) + snap[i:]
+
+    def discard(self, day):
+        o = _ordinal(day)
+        if o is None:
+            return
+        i = bisect_left(self._days, o)
+        if i < len(self._days) and self._days[i] == o:
+            del self._days[i]
+            snap = self._snapshot
+            if snap is not None:
+                self._snapshot = snap[:i] + snap[i + 1:]
+
+    def clear(self):
+        self._days = array("i")
+        self._snapshot = None
+
+    def choices(self):
+        """All dates in order, as a tuple shared until the next change."""
+        if self._snapshot is None:
+            self._snapshot = tuple(to_days(self._days))
+        return self._snapshot
+
+    def ordinals(self):
+        """All days as ordinals, in order (a copy)."""
+        return self._days[:]
+
+    def between(self, lo=None, hi=None):
+        """Dates d with lo <= d <= hi (either bound may be None)."""
+        i = 0 if lo is None else bisect_left(self._days, to_ordinal(lo))
+        j = len(self._days) if hi is None else bisect_right(self._days, to_ordinal(hi))
+        return to_days(self._days[i:j])
+
+    def last(self):
+        return to_day(self._days[-1]) if self._days else None
@@ -0,0 +1,58 @@
+"""Day ordinals and a memoized "YYYY-MM-DD" <-> ordinal codec.
+
+Internally a day is its proleptic Gregorian ordinal (``date.toordinal()``),
+so sorting, ranges and windows ("the 7 days ending at ref") are integer
+arithmetic.  Strings exist only at the edges: user input, dropdown
+choices, chart labels and exported rows.  Converting either way is cached,
+since the same few thousand days are converted over and over.  The caches
+are shared by every user and hold CACHE_DAYS days per direction (about
+45 years), least recently used first out; a longer history still converts,
+just not from the cache.
+"""
+from calendar import monthrange
+from datetime import date, datetime
+from functools import lru_cache
+
+CACHE_DAYS = 1 << 14          # distinct days cached per direction (~45 years)
+
+
+@lru_cache(maxsize=CACHE_DAYS)
+def to_ordinal(day):
+    """Ordinal of a canonical "YYYY-MM-DD" string (ValueError if it is not one)."""
+    return date.fromisoformat(day).toordinal()
+
+
+@lru_cache(maxsize=CACHE_DAYS)
+def to_day(ordinal):
+    """"YYYY-MM-DD" for a day ordinal."""
+    return date.fromordinal(ordinal).isoformat()
+
+
+@lru_cache(maxsize=4096)
+def parse(text):
+    """Ordinal of user-typed "YYYY-M-D" text (padding optional), or None if invalid."""
+    try:
+        return datetime.strptime(text.strip(), "%Y-%m-%d").toordinal()
+    except (AttributeError, ValueError):
+        return None
+
+
+def today():
+    return date.today().toordinal()
+
+
+def window(end, n):
+    """Ordinals of the `n` days ending at `end`, oldest first."""
+    return range(end - n + 1, end + 1)
+
+
+def month_bounds(ordinal):
+    """(first, last) ordinals of the calendar month containing `ordinal`."""
+    d = date.fromordinal(ordinal)
+    first = d.replace(day=1).toordinal()
+    return first, first + monthrange(d.year, d.month)[1] - 1
+
+
+def to_days(ordinals):
+    """List of "YYYY-MM-DD" strings for an iterable of ordinals."""
+    return [to_day(o) for o in ordinals]
@@ -0,0 +1,131 @@
+"""Streaming export of one user's BMI, TDEE and food-log history.
+
+Every format is produced from generators over ``store.iter_records``, so
+rows go from the store to the output file a chunk at a time and a long
+history is never materialized in memory.  CSV and JSONL use only the
+standard library; Parquet needs the optional ``pyarrow`` package.
+
+The CSV/JSONL columns are a superset of what ``bme_health.importer``
+reads, so BMI and food rows can be imported back.
+
+Files go to one export directory (``BME_EXPORT_DIR``, default
+``<tmp>/bme_exports``); each export first deletes the ones older than
+``EXPORT_TTL`` seconds there.  Gradio copies a returned file into its own
+cache, so ours only has to outlive the request.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+
+FORMATS = ("CSV", "JSONL", "Parquet")
+COLUMNS = ("type", "date", "height", "weight", "unit", "bmi",
+           "bmr", "tdee", "gender", "age", "activity", "kcal")
+PARQUET_BATCH = 10000
+EXPORT_DIR = os.environ.get("BME_EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "bme_exports")
+EXPORT_TTL = 3600          # seconds an export file is kept
+_EXT = {"CSV": ".csv", "JSONL": ".jsonl", "Parquet": ".parquet"}
+_EXTENSIONS = tuple(_EXT.values())
+
+
+def iter_export_rows(store, user):
+    """Yield one dict per record: BMI rows, then TDEE rows, then food rows."""
+    for day, r in store.iter_records(user, "bmi"):
+        yield {"type": "bmi", "date": day, "height": r["h_cm"], "weight": r["w_kg"],
+               "unit": "metric", "bmi": r["bmi"]}
+    for day, r in store.iter_records(user, "tdee"):
+        yield {"type": "tdee", "date": day, "height": r["h_cm"], "weight": r["w_kg"],
+               "unit": "metric", "bmr": r["bmr"], "tdee": r["tdee"], "gender": r["gender"],
+               "age": r["age"], "activity": r["activity"]}
+    for day, kcal in store.iter_records(user, "food"):
+        yield {"type": "food", "date": day, "kcal": kcal}
+
+
+def iter_csv(rows):
+    """Yield CSV text chunks (header first) for an iterable of row dicts."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=COLUMNS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for n, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if n % 1000 == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _write_parquet(rows, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the 'pyarrow' package (pip install pyarrow).")
+    schema = pa.schema([
+        ("type", pa.string()), ("date", pa.string()), ("height", pa.float64()),
+        ("weight", pa.float64()), ("unit", pa.string()), ("bmi", pa.float64()),
+        ("bmr", pa.float64()), ("tdee", pa.float64()), ("gender", pa.string()),
+        ("age", pa.int32()), ("activity", pa.string()), ("kcal", pa.float64()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                batch.clear()
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+
+
+def remove_old(out_dir=None, max_age=EXPORT_TTL):
+    """Delete export files (``*_history_*`` ones we wrote) in `out_dir`
+    (default EXPORT_DIR) older than `max_age` seconds."""
+    out_dir = out_dir or EXPORT_DIR
+    now = time.time()
+    try:
+        names = os.listdir(out_dir)
+    except OSError:
+        return
+    for name in names:
+        if "_history_" not in name or not name.endswith(_EXTENSIONS):
+            continue
+        path = os.path.join(out_dir, name)
+        try:
+            if now - os.stat(path).st_mtime >= max_age:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def export_user(store, user, fmt="CSV", out_dir=None):
+    """Write `user`'s full history to a new file in `out_dir` (default
+    EXPORT_DIR) and return its path."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    ext = _EXT[fmt]
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in user) or "user"
+    out_dir = out_dir or EXPORT_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    remove_old(out_dir)
+    fd, path = tempfile.mkstemp(prefix=f"{safe}_history_", suffix=ext, dir=out_dir)
+    os.close(fd)
+    rows = iter_export_rows(store, user)
+    try:
+        if fmt == "Parquet":
+            _write_parquet(rows, path)
+            return path
+        chunks = iter_csv(rows) if fmt == "CSV" else iter_jsonl(rows)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,182 @@
+"""Food tables: one shared read-only catalog plus a small per-user overlay.
+
+The default catalog is frozen once and shared by every user.  A user's
+``FoodTable`` only stores the foods they added or re-priced; lookups check
+that overlay first and fall through to the shared catalog, so nothing is
+copied per user and adding a food is a single dict write.
+
+Iteration order matches the dropdowns: the "-" sentinel, then the user's
+foods newest first, then the rest of the catalog.
+
+The catalog can be extended from a food database file (``load_food_db``);
+with 100k+ names the UI never lists a whole table, it asks
+``FoodTable.search`` for the top matches of what the user typed.
+"""
+import math
+import os
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from bme_health import foodsearch
+
+SENTINEL = "-"
+TABLES = ("MAIN", "DESSERT", "BEVERAGE")
+_TYPE_ALIASES = {
+    "main": "MAIN", "meal": "MAIN", "food": "MAIN", "dish": "MAIN",
+    "dessert": "DESSERT", "snack": "DESSERT", "sweet": "DESSERT", "fruit": "DESSERT",
+    "beverage": "BEVERAGE", "drink": "BEVERAGE", "drinks": "BEVERAGE",
+}
+
+# Built-in catalog (kcal per serving); BME_FOOD_DB / load_food_db adds to it
+DEFAULT_FOODS = {
+    "MAIN": {
+        "-": 0,
+        "Pad Thai (1 plate)": 545,
+        "Khao Man Gai": 600,
+        "Fried Rice": 520,
+        "Chicken Breast (100g)": 165,
+        "Grilled Salmon (100g)": 208,
+        "Beef (lean, 100g)": 250,
+        "Rice (1 cup)": 206,
+        "Spaghetti (1 cup)": 220,
+        "Green Curry Chicken": 320,
+    },
+    "DESSERT": {
+        "-": 0,
+        "Sticky Rice with Mango": 380,
+        "Ice Cream (100g)": 207,
+        "Brownie": 250,
+        "Fruit (Apple 100g)": 52,
+        "Fruit (Banana 100g)": 89,
+    },
+    "BEVERAGE": {
+        "-": 0,
+        "Water": 0,
+        "Coffee (black)": 5,
+        "Milk (1 cup)": 150,
+        "Thai Iced Tea": 250,
+        "Bubble Tea": 340,
+        "Coke (1 can)": 140,
+    },
+}
+
+
+def freeze_catalog(tables):
+    """Read-only copy of {table: {name: kcal}} to share between users."""
+    return MappingProxyType({t: MappingProxyType(dict(items)) for t, items in tables.items()})
+
+
+class FoodTable(Mapping):
+    __slots__ = ("base", "overlay")
+
+    def __init__(self, base, overlay=None):
+        self.base = base
+        self.overlay = {} if overlay is None else overlay
+
+    def __getitem__(self, name):
+        try:
+            return self.overlay[name]
+        except KeyError:
+            return self.base[name]
+
+    def get(self, name, default=None):
+        v = self.overlay.get(name)
+        return self.base.get(name, default) if v is None else v
+
+    def __contains__(self, name):
+        return name in self.overlay or name in self.base
+
+    def __iter__(self):
+        if SENTINEL in self.base:
+            yield SENTINEL
+        for name in reversed(self.overlay):
+            if name != SENTINEL:
+                yield name
+        for name in self.base:
+            if name != SENTINEL and name not in self.overlay:
+                yield name
+
+    def __len__(self):
+        return len(self.base) + sum(1 for k in self.overlay if k not in self.base)
+
+    def set(self, name, kcal):
+        """Add or re-price `name`; it moves to the front of the table."""
+        self.overlay.pop(name, None)
+        self.overlay[name] = kcal
+
+    def search(self, query, k=20):
+        """Top-`k` names matching `query` (the user's own foods included), best first."""
+        found = foodsearch.index_for(self.base).search(query, k + 1, extra=self.overlay)
+        return [n for n in found if n != SENTINEL][:k]
+
+
+def user_tables(catalog, overlays=None):
+    """{table: FoodTable} for one user over the shared `catalog`."""
+    overlays = overlays or {}
+    return {t: FoodTable(base, overlays.get(t)) for t, base in catalog.items()}
+
+
+def meal_total(tables, main, dessert, beverage):
+    """kcal of one meal: a main, a dessert and a beverage looked up in `tables`
+    (unknown names and "-" count as 0)."""
+    return tables["MAIN"].get(main, 0) + tables["DESSERT"].get(dessert, 0) + tables["BEVERAGE"].get(beverage, 0)
+
+
+def day_meals(tables, items):
+    """(breakfast, lunch, dinner) kcal for the nine picks `items` (B/L/D × main/dessert/beverage)."""
+    main, dessert, beverage = tables["MAIN"], tables["DESSERT"], tables["BEVERAGE"]
+    return tuple(main.get(items[i], 0) + dessert.get(items[i + 1], 0) + beverage.get(items[i + 2], 0)
+                 for i in (0, 3, 6))
+
+
+def meal_template(tables, items):
+    """A saved day of meals: the nine picks and their kcal, priced once now.
+
+    Applying a template to many days then costs nothing per day; templates
+    that use a food are re-priced when the user changes its kcal
+    (``reprice_templates``)."""
+    items = tuple(str(x or SENTINEL) for x in items)
+    if len(items) != 9:
+        raise ValueError("a meal template needs 9 picks (B/L/D × main/dessert/beverage)")
+    meals = day_meals(tables, items)
+    return {"items": items, "meals": meals, "kcal": sum(meals)}
+
+
+def reprice_templates(templates, tables, name):
+    """{template name: re-priced template} for the `templates` that use food `name`."""
+    return {t: meal_template(tables, tpl["items"]) for t, tpl in templates.items() if name in tpl["items"]}
+
+
+def build_indexes(catalog):
+    """Build the search index of every catalog table now instead of on first search."""
+    for table in catalog.values():
+        foodsearch.index_for(table)
+
+
+def load_food_db(path, tables):
+    """{table: {name: kcal}}: `tables` plus every food in the CSV/JSONL file at `path`.
+
+    Rows need ``name`` and ``kcal``; an optional ``type`` (main / dessert /
+    beverage, or a close synonym) picks the table, defaulting to MAIN.  Rows
+    without a usable name or a non-negative kcal are skipped, and names
+    already in `tables` keep their built-in value.  An empty `path` returns
+    `tables` unchanged.
+    """
+    if not path:
+        return tables
+    from bme_health.core import to_float
+    from bme_health.importer import is_jsonl, iter_rows
+
+    merged = {t: dict(tables.get(t, {})) for t in TABLES}
+    with open(os.path.expanduser(path), "r", encoding="utf-8", newline="") as f:
+        for _, row in iter_rows(f, is_jsonl(path)):
+            if not row:
+                continue
+            row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+            name = str(row.get("name") or "").strip()
+            kcal = to_float(row.get("kcal"))
+            if not name or name == SENTINEL or kcal is None or not math.isfinite(kcal) or kcal < 0:
+                continue
+            table = _TYPE_ALIASES.get(str(row.get("type") or "").strip().lower(), "MAIN")
+            merged[table].setdefault(name, kcal)
+    return merged
@@ -0,0 +1,140 @@
+"""Prefix + trigram search over food names.
+
+One ``FoodIndex`` is built per shared catalog table (on first search) and
+reused by every user.  It keeps:
+
+  * a sorted list of (word, id) pairs, so a one-letter query like "c"
+    finds names with a word starting "c" by binary search;
+  * a trigram -> ids posting list, so longer queries match anywhere in the
+    name and tolerate a typo ("chiken" still finds "Chicken").
+
+A query counts shared trigrams per name with one ``np.bincount`` over the
+concatenated posting lists, keeps the few best-overlapping candidates and
+ranks them: whole-name prefix first, then word prefix, then trigram
+overlap, then shorter names.  A user's own foods are few and are scored on
+the fly with the same ranking.
+"""
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+import numpy as np
+
+RANK_POOL = 10                # rank at most k * RANK_POOL candidates in Python
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    return _NON_WORD.sub(" ", str(text).lower()).strip()
+
+
+def trigrams(norm, open_end=False):
+    """Trigrams of " <norm> "; with `open_end` the trailing space is left off,
+    so a half-typed last word still matches names that continue it."""
+    padded = " " + norm if open_end else " " + norm + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodIndex:
+    def __init__(self, names):
+        self.names = list(names)
+        self.norm = [normalize(n) for n in self.names]
+        words = []
+        postings = {}
+        starts = {}                   # first trigram of the whole name -> ids
+        for i, norm in enumerate(self.norm):
+            for w in set(norm.split()):
+                words.append((w, i))
+            for t in trigrams(norm):
+                postings.setdefault(t, array("I")).append(i)
+            if len(norm) >= 2:
+                starts.setdefault(" " + norm[:2], array("I")).append(i)
+        words.sort()
+        self._words = words
+        self._postings = {t: np.frombuffer(ids, dtype=np.uint32) for t, ids in postings.items()}
+        self._starts = {t: np.frombuffer(ids, dtype=np.uint32) for t, ids in starts.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _word_prefix_ids(self, prefix, limit):
+        words = self._words
+        i = bisect_left(words, (prefix,))
+        out = []
+        while i < len(words) and words[i][0].startswith(prefix) and len(out) < limit:
+            out.append(words[i][1])
+            i += 1
+        return out
+
+    def search(self, query, k=20, extra=None):
+        """Best `k` names for `query`.  `extra` is a small {name: ...} mapping
+        (a user's own foods) searched too; its names win over catalog duplicates."""
+        q = normalize(query)
+        extra = extra or {}
+        if not q:
+            head = list(reversed(extra))[:k]
+            rest = (n for n in self.names if n not in extra)
+            return head + list(islice(rest, k - len(head)))
+        qtri = trigrams(q, open_end=True)
+        first = q.split()[0]
+
+        hits = [self._postings[t] for t in qtri if t in self._postings] if len(q) >= 2 else []
+        if hits:
+            # names that start like the query get one extra count, so a whole-name
+            # prefix match is always in the top group
+            head = self._starts.get(" " + q[:2])
+            if head is not None:
+                hits.append(head)
+            counts = np.bincount(np.concatenate(hits), minlength=len(self.names))
+            cands = self._top_ids(counts, k * RANK_POOL, max(1, (len(qtri) * 3 + 4) // 5))
+        else:
+            counts = None
+            cands = self._word_prefix_ids(first, k * RANK_POOL)
+
+        n_tri = len(qtri) or 1
+        scored = [(self._rank(q, first, self.norm[i], 0 if counts is None else int(counts[i]) / n_tri),
+                   self.names[i])
+                  for i in cands if self.names[i] not in extra]
+        for name in extra:
+            norm = normalize(name)
+            shared = len(qtri & trigrams(norm)) / n_tri
+            if shared or first in norm:
+                scored.append((self._rank(q, first, norm, shared), name))
+        return [name for _, name in heapq.nlargest(k, scored)]
+
+    @staticmethod
+    def _top_ids(counts, pool, floor):
+        """Ids with the highest counts: the best group, widened until it has
+        `pool` names or the count would drop below `floor` (~60% of the query)."""
+        best = int(counts.max())
+        thr = best
+        ids = np.flatnonzero(counts >= thr)
+        while len(ids) < pool and thr > floor:
+            thr -= 1
+            ids = np.flatnonzero(counts >= thr)
+        return ids[:pool].tolist()
+
+    @staticmethod
+    def _rank(q, first, norm, overlap):
+        word_prefix = norm.startswith(first) or (" " + first) in norm
+        return (norm.startswith(q), word_prefix, overlap, -len(norm))
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def index_for(table):
+    """Shared FoodIndex for a frozen catalog table (built once per table)."""
+    key = id(table)
+    entry = _indexes.get(key)
+    if entry is None or entry[0] is not table:
+        with _lock:
+            entry = _indexes.get(key)
+            if entry is None or entry[0] is not table:
+                entry = _indexes[key] = (table, FoodIndex(table.keys()))
+    return entry[1]
@@ -0,0 +1,219 @@
+"""Streaming bulk import of historical BMI and food-log rows.
+
+Accepted files are CSV (with a header row) or JSONL (one object per line).
+Each row is either a BMI record or a food-log total:
+
+    type,date,height,weight,unit           -> BMI   (unit defaults to metric)
+    type,date,kcal                         -> food  (daily total)
+    type,date,height,weight,gender,age,activity[,unit] -> TDEE (type=tdee)
+
+``type`` may be omitted; rows with ``kcal`` are food rows, all others BMI
+rows.  TDEE rows get BMR/TDEE recomputed from their inputs.  An optional ``user`` column overrides the importing user per row
+(only when ``per_row_user`` is set; the UI imports into the logged-in
+account only).
+
+Rows are read lazily and written in batches, so memory stays bounded by
+the batch size (plus one set of already-seen dates for duplicate checks).
+Validation matches the UI: ``parse_date_str``, ``unit_to_metric``,
+``calc_bmi`` and the ALLOWED ranges, and a date that already has a record
+(in the store or earlier in the file) is rejected rather than overwritten.
+Out-of-range rows are rejected unless ``allow_out_of_range`` is set, since
+there is nobody to confirm them.
+"""
+import csv
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+
+from bme_health.core import (
+    ACTIVITY_FACTORS, METRIC, IMPERIAL,
+    calc_bmi, hb_bmr, is_out_of_range, parse_date_str, to_float, unit_to_metric,
+)
+
+BATCH_SIZE = 5000
+MAX_ERRORS_KEPT = 1000
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    bmi_saved: int = 0
+    tdee_saved: int = 0
+    food_saved: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)   # (row number, message), first MAX_ERRORS_KEPT
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def error(self, row_no, msg):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS_KEPT:
+            self.errors.append((row_no, msg))
+
+    def summary(self):
+        return (f"{self.rows} rows in {self.seconds:.1f}s ({self.rows_per_sec:,.0f} rows/s): "
+                f"{self.bmi_saved} BMI, {self.tdee_saved} TDEE and {self.food_saved} food days saved, {self.rejected} rejected.")
+
+
+def is_jsonl(path):
+    return path.lower().endswith((".jsonl", ".ndjson", ".json"))
+
+
+def iter_rows(f, jsonl):
+    """Yield (row number, dict or None) from an open text file, lazily."""
+    if jsonl:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield n, row if isinstance(row, dict) else None
+    else:
+        for n, row in enumerate(csv.DictReader(f), start=2):   # line 1 is the header
+            yield n, row
+
+
+def _norm_unit(u):
+    u = (u or "").strip().lower()
+    if not u or u.startswith("metric") or u in ("cm", "kg", "si"):
+        return METRIC
+    if u.startswith("imperial") or u in ("in", "inch", "lb", "us"):
+        return IMPERIAL
+    return None
+
+
+def parse_row(row, default_user, allow_out_of_range=False, per_row_user=False):
+    """Validate one raw row.
+
+    Returns ("bmi", user, day, record), ("tdee", user, day, record),
+    ("food", user, day, kcal) or ("error", message).
+    """
+    if row is None:
+        return ("error", "not a valid row")
+    row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    user = str((row.get("user") if per_row_user else None) or default_user or "").strip()
+    if not user:
+        return ("error", "no user")
+    day = parse_date_str(str(row.get("date") or ""))
+    if day is None:
+        return ("error", "invalid date (use YYYY-MM-DD)")
+    kind = str(row.get("type") or "").strip().lower() or ("food" if row.get("kcal") not in (None, "") else "bmi")
+
+    if kind == "food":
+        kcal = to_float(row.get("kcal"))
+        if kcal is None or not math.isfinite(kcal) or kcal < 0:
+            return ("error", "kcal must be a finite, non-negative number")
+        return ("food", user, day, kcal)
+    if kind not in ("bmi", "tdee"):
+        return ("error", f"unknown type {kind!r}")
+
+    unit = _norm_unit(row.get("unit"))
+    if unit is None:
+        return ("error", "unit must be metric or imperial")
+    h_cm, w_kg = unit_to_metric(unit, row.get("height"), row.get("weight"))
+    if h_cm is None or w_kg is None:
+        return ("error", "height/weight must be numbers")
+    bmi_val = calc_bmi(h_cm, w_kg)
+    if bmi_val is None:
+        return ("error", "unable to compute BMI")
+    if is_out_of_range(h_cm, w_kg, bmi_val) and not allow_out_of_range:
+        return ("error", "out of range (Height 100–250 cm, Weight 30–200 kg, BMI 10–70)")
+    if kind == "tdee":
+        return _parse_tdee(row, user, day, h_cm, w_kg, allow_out_of_range)
+    return ("bmi", user, day, {"h_cm": round(h_cm, 2), "w_kg": round(w_kg, 2), "bmi": round(bmi_val, 2)})
+
+
+def _parse_tdee(row, user, day, h_cm, w_kg, allow_out_of_range):
+    gender = str(row.get("gender") or "").strip()
+    activity = str(row.get("activity") or "").strip()
+    if gender not in ("Male", "Female"):
+        return ("error", "gender must be Male or Female")
+    if activity not in ACTIVITY_FACTORS:
+        return ("error", "unknown activity level")
+    age = to_float(row.get("age"))
+    if age is None or not math.isfinite(age) or age != int(age):
+        return ("error", "age must be a whole number")
+    age = int(age)
+    if not 10 <= age <= 80 and not allow_out_of_range:
+        return ("error", "age out of range (10–80)")
+    bmr = hb_bmr(gender, age, h_cm, w_kg)
+    tdee = bmr * ACTIVITY_FACTORS[activity]
+    return ("tdee", user, day, {"bmr": round(bmr, 2), "tdee": round(tdee, 2), "gender": gender, "age": age,
+                                "activity": activity, "h_cm": h_cm, "w_kg": w_kg})
+
+
+def import_file(store, path, default_user=None, batch_size=BATCH_SIZE,
+                allow_out_of_range=False, per_row_user=False, progress=None):
+    """Stream `path` into `store`; returns an ImportReport.
+
+    `progress(report, fraction)` is called after every batch, where
+    `fraction` is the share of the file read so far.
+    """
+    report = ImportReport()
+    size = os.path.getsize(path) or 1
+    seen = set()                      # (kind, user, day) accepted so far
+    pending = []
+    known_users = set()
+    t0 = time.perf_counter()
+
+    def flush(fraction):
+        _write_batch(store, pending, report, known_users)
+        pending.clear()
+        report.seconds = time.perf_counter() - t0
+        if progress:
+            progress(report, fraction)
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for n, row in iter_rows(f, is_jsonl(path)):
+            report.rows += 1
+            parsed = parse_row(row, default_user, allow_out_of_range, per_row_user)
+            if parsed[0] == "error":
+                report.error(n, parsed[1])
+                continue
+            key = parsed[:3]
+            if key in seen:
+                report.error(n, f"duplicate {parsed[0]} date {parsed[2]} in file")
+                continue
+            seen.add(key)
+            pending.append((n, *parsed))
+            if len(pending) >= batch_size:
+                flush(min(1.0, f.buffer.tell() / size))
+    flush(1.0)
+    return report
+
+
+def _write_batch(store, pending, report, known_users):
+    if not pending:
+        return
+    groups = {}
+    for n, kind, user, day, value in pending:
+        groups.setdefault((kind, user), []).append((n, day, value))
+    for (kind, user), items in groups.items():
+        if user not in known_users:
+            store.ensure_user(user)
+            known_users.add(user)
+        days = [day for _, day, _ in items]
+        existing = store.existing_days(user, kind, days)
+        fresh = []
+        for n, day, value in items:
+            if day in existing:
+                report.error(n, f"{kind} data already exists on {day}")
+            else:
+                fresh.append((day, value))
+        if kind == "bmi":
+            store.put_bmi_many(user, fresh)
+            report.bmi_saved += len(fresh)
+        elif kind == "tdee":
+            store.put_tdee_many(user, fresh)
+            report.tdee_saved += len(fresh)
+        else:
+            store.put_food_log_many(user, fresh)
+            report.food_saved += len(fresh)
@@ -0,0 +1,373 @@
+"""Latency histograms for UI events, split into phases.
+
+Every Gradio event handler runs inside ``event(name)``, which times the
+whole call and the phases inside it:
+
+  * ``queue``         -- waiting for a thread of the I/O pool (async handlers);
+  * ``storage``       -- calls on the store (see ``timed_store``);
+  * ``render``        -- producing charts, including awaiting the render pool;
+  * ``serialization`` -- Gradio turning the outputs into the JSON payload
+                         (see ``instrument_blocks``);
+  * ``validation``    -- the rest of the handler body: parsing and checking
+                         inputs and formatting the reply.
+
+Durations go into fixed-bucket histograms, one per (event, phase) plus one
+per store method, and are read out with ``prometheus_text()`` (Prometheus
+text format, served on ``BME_METRICS_PORT`` by ``serve()``) or written to
+the log every ``BME_METRICS_LOG`` seconds by ``start_log_dump()``.
+``BME_METRICS=0`` turns the timers into no-ops.
+
+``BME_PROFILE=cprofile`` also runs every handler body under cProfile and
+``BME_PROFILE=sample`` samples the stacks of threads running app code every
+``BME_PROFILE_INTERVAL`` seconds; either way the result is written to
+``BME_PROFILE_OUT`` at exit and with every log dump.  Profiling is for
+diagnosis only: cProfile serializes handler bodies.
+"""
+import atexit
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("BME_METRICS", "1").strip() != "0"
+PROFILE = os.environ.get("BME_PROFILE", "").strip().lower()          # "", "cprofile" or "sample"
+PROFILE_OUT = os.environ.get("BME_PROFILE_OUT", "bme_profile.txt")
+PROFILE_INTERVAL = float(os.environ.get("BME_PROFILE_INTERVAL", "0.005"))
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger("bme_health.metrics")
+
+_lock = threading.Lock()
+_histograms = {}           # (metric, labels) -> Histogram
+_current = contextvars.ContextVar("bme_event_phases", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds."""
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)        # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bucket bound holding the q-th quantile (inf if past the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def observe(metric, seconds, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = Histogram()
+        h.observe(seconds)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+# -----------------------------
+# Timers
+# -----------------------------
+@contextlib.contextmanager
+def event(name):
+    """Time one UI event; phases entered inside it (on any thread that
+    inherited this context) are recorded against `name`."""
+    if not ENABLED:
+        yield
+        return
+    phases = {}
+    token = _current.set(phases)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - t0
+        _current.reset(token)
+        observe("bme_event_seconds", total, event=name)
+        for ph, seconds in phases.items():
+            observe("bme_event_phase_seconds", seconds, event=name, phase=ph)
+        rest = total - sum(phases.values())
+        observe("bme_event_phase_seconds", max(rest, 0.0), event=name, phase="validation")
+
+
+def add(name, seconds):
+    """Add `seconds` to phase `name` of the current event, if any."""
+    phases = _current.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Add the time spent in the block to phase `name` of the current event."""
+    if _current.get() is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - t0)
+
+
+def timed(event_name):
+    """Decorator form of ``event`` for plain handlers (profiled too if enabled)."""
+    def wrap(fn):
+        body = profiled(fn)
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with event(event_name):
+                return body(*args, **kwargs)
+        return run
+    return wrap
+
+
+class _TimedStore:
+    """Store proxy that times every method call as the "storage" phase."""
+
+    def __init__(self, store):
+        self._store = store
+        self._methods = {}
+
+    def __getattr__(self, attr):
+        fn = self._methods.get(attr)
+        if fn is not None:
+            return fn
+        method = getattr(self._store, attr)
+        if not callable(method):
+            return method
+
+        def fn(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - t0
+                observe("bme_store_seconds", seconds, method=attr)
+                add("storage", seconds)
+        self._methods[attr] = fn
+        return fn
+
+
+def timed_store(store):
+    """`store`, with its method calls timed (unchanged when metrics are off)."""
+    return _TimedStore(store) if ENABLED else store
+
+
+def instrument_blocks(demo):
+    """Time Gradio's output post-processing per event as the "serialization" phase
+    (events are named after their handler functions, as in App)."""
+    if not ENABLED:
+        return demo
+    postprocess = demo.postprocess_data
+
+    @functools.wraps(postprocess)
+    async def timed_postprocess(block_fn, predictions, state):
+        t0 = time.perf_counter()
+        try:
+            return await postprocess(block_fn, predictions, state)
+        finally:
+            observe("bme_event_phase_seconds", time.perf_counter() - t0,
+                    event=getattr(block_fn, "name", None) or "unknown", phase="serialization")
+    demo.postprocess_data = timed_postprocess
+    return demo
+
+# -----------------------------
+# Output
+# -----------------------------
+def _label_text(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def prometheus_text(gauges=None):
+    """All histograms (and `gauges`, a {name: number} dict) in Prometheus text format."""
+    with _lock:
+        snap = [(m, labels, list(h.counts), h.count, h.sum) for (m, labels), h in sorted(_histograms.items())]
+    lines, typed = [], set()
+    for metric, labels, counts, count, total in snap:
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cum = 0
+        for bound, n in zip(BUCKETS, counts):
+            cum += n
+            lines.append(f"{metric}_bucket{_label_text(labels, [('le', f'{bound:g}')])} {cum}")
+        lines.append(f"{metric}_bucket{_label_text(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{metric}_sum{_label_text(labels)} {total:.6f}")
+        lines.append(f"{metric}_count{_label_text(labels)} {count}")
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {float(value):g}")
+    return "\n".join(lines) + "\n"
+
+
+def summary_lines():
+    """One line per (event, phase): count, mean and p50/p99 bucket bounds in ms."""
+    with _lock:
+        snap = sorted(((m, dict(labels), h.count, h.sum, h.quantile(0.5), h.quantile(0.99))
+                       for (m, labels), h in _histograms.items()), key=lambda r: (r[0], sorted(r[1].items())))
+    out = []
+    for metric, labels, count, total, p50, p99 in snap:
+        tag = " ".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        out.append(f"{metric} {tag} n={count} mean={1000 * total / count:.1f}ms "
+                   f"p50<={1000 * p50:g}ms p99<={1000 * p99:g}ms")
+    return out
+
+
+def serve(port, gauges=None):
+    """Serve ``prometheus_text()`` at http://0.0.0.0:<port>/metrics on a daemon thread.
+
+    `gauges` is a callable returning extra {name: number} values per scrape."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = prometheus_text(gauges() if gauges else None).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_log_dump(interval):
+    """Log ``summary_lines()`` (and write the profile, if any) every `interval` seconds."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            for line in summary_lines():
+                log.info(line)
+            dump_profile()
+    t = threading.Thread(target=loop, name="metrics-log", daemon=True)
+    t.start()
+    return t
+
+# -----------------------------
+# Profiling (BME_PROFILE)
+# -----------------------------
+_profile_stats = None      # pstats.Stats merged from every profiled call
+_samples = Counter()       # (file, line, function) -> samples seen on top of a stack
+_profile_lock = threading.Lock()
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_sampler = None
+
+
+def profiled(fn):
+    """`fn`, run under cProfile when BME_PROFILE=cprofile (otherwise unchanged).
+
+    Profiled calls run one at a time: Python 3.12+ allows a single active
+    cProfile per process."""
+    if PROFILE != "cprofile":
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        global _profile_stats
+        prof = cProfile.Profile()
+        try:
+            with _profile_lock:
+                return prof.runcall(fn, *args, **kwargs)
+        finally:
+            with _lock:
+                if _profile_stats is None:
+                    _profile_stats = pstats.Stats(prof)
+                else:
+                    _profile_stats.add(prof)
+    return run
+
+
+def _in_app(frame):
+    """True if the stack under `frame` runs app code (App.py or bme_health, not this module)."""
+    while frame is not None:
+        fn = frame.f_code.co_filename
+        if fn.startswith(_APP_ROOT) and fn != __file__ and "site-packages" not in fn:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _sample_loop(interval):
+    # the main thread only sits in demo.launch(); handlers run on pool threads
+    skip = {threading.get_ident(), threading.main_thread().ident}
+    while True:
+        time.sleep(interval)
+        for tid, frame in sys._current_frames().items():
+            if tid in skip or not _in_app(frame):
+                continue           # idle server/pool threads are not interesting
+            code = frame.f_code
+            with _lock:
+                _samples[(code.co_filename, frame.f_lineno, code.co_name)] += 1
+
+
+def start_profiler():
+    """Start the sampler for BME_PROFILE=sample; both modes dump at exit."""
+    global _sampler
+    if PROFILE == "sample" and _sampler is None:
+        _sampler = threading.Thread(target=_sample_loop, args=(PROFILE_INTERVAL,),
+                                    name="metrics-sampler", daemon=True)
+        _sampler.start()
+    if PROFILE in ("cprofile", "sample"):
+        atexit.register(dump_profile)
+
+
+def dump_profile(path=None, limit=40):
+    """Write the collected profile (top `limit` entries) to `path`; returns the path or None."""
+    path = path or PROFILE_OUT
+    if PROFILE == "cprofile":
+        with _lock:
+            if _profile_stats is None:
+                return None
+            buf = io.StringIO()
+            _profile_stats.stream = buf
+            _profile_stats.sort_stats("cumulative").print_stats(limit)
+        text = buf.getvalue()
+    elif PROFILE == "sample":
+        with _lock:
+            top = _samples.most_common(limit)
+            total = sum(_samples.values()) or 1
+        text = "".join(f"{n:8d} {100 * n / total:5.1f}%  {fn}:{line} {name}\n"
+                       for (fn, line, name), n in top)
+    else:
+        return None
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
@@ -0,0 +1,445 @@
+"""Write-ahead journal and snapshots that make the in-memory store durable.
+
+With ``BME_JOURNAL=/path/dir`` (and no ``BME_DB``), ``open_store`` returns a
+``JournaledStore``: a ``MemoryStore`` that also appends every write (new
+user, BMI / TDEE / food-log records, deletes and clears, custom foods,
+meal templates, bulk imports) as one JSON line to the current
+``journal-<n>.log`` segment in that directory.  A write reaches memory
+only after its line is fsynced (writes are applied in journal order), so
+a failed fsync leaves the store as it was and raises ``OSError``.
+
+Group commit: writers only queue their line; one flusher thread writes
+everything queued so far and fsyncs once, then wakes every writer in that
+batch.  While one fsync runs the next batch collects, so concurrent
+writers share fsyncs instead of queueing behind each other.
+``BME_JOURNAL_SYNC=async`` returns without waiting (the flusher still
+fsyncs every batch, so a crash loses at most the last few milliseconds).
+
+Snapshots: after ``BME_JOURNAL_SNAPSHOT`` writes (default 100000) the
+store starts a new segment and, in the background, pickles every user's
+raw record columns to ``snapshot-<n>.pkl`` (written to a temp file,
+fsynced, then renamed), after which older segments and snapshots are
+deleted.  Startup loads the newest snapshot and replays the segments after
+it, batching each user's records into one ``put_many`` per kind.  A torn
+last line (a crash mid-write) is cut off, and a write the live store
+rejected (journaled before it was applied, e.g. an unknown food table) is
+skipped again.
+"""
+import atexit
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from functools import partial
+
+from bme_health.columns import bmi_columns, food_columns, tdee_columns
+from bme_health.foods import user_tables
+from bme_health.store import MemoryStore
+
+SYNC = os.environ.get("BME_JOURNAL_SYNC", "group")                 # group | async
+SNAPSHOT_EVERY = int(os.environ.get("BME_JOURNAL_SNAPSHOT", "100000"))
+
+BMI_FIELDS = ("h_cm", "w_kg", "bmi")
+TDEE_FIELDS = ("bmr", "tdee", "gender", "age", "activity", "h_cm", "w_kg")
+REPLAY_CHUNK = 50_000           # journal lines decoded per json.loads call
+_COLUMNS = {"bmi_records": bmi_columns, "tdee_records": tdee_columns, "food_log": food_columns}
+# record op -> (columns key, whether it carries many rows); "-x" deletes a day
+_RECORD_OPS = {"b": ("bmi_records", False), "B": ("bmi_records", True), "-b": ("bmi_records", False),
+               "t": ("tdee_records", False), "T": ("tdee_records", True), "-t": ("tdee_records", False),
+               "f": ("food_log", False), "F": ("food_log", True)}
+_FILE = re.compile(r"(journal|snapshot)-(\d{8})\.(?:log|pkl)$")
+
+
+def _segment(directory, seq):
+    return os.path.join(directory, f"journal-{seq:08d}.log")
+
+
+def _snapshot(directory, seq):
+    return os.path.join(directory, f"snapshot-{seq:08d}.pkl")
+
+
+def _files(directory, kind):
+    """Sorted sequence numbers of the `kind` ("journal" / "snapshot") files in `directory`."""
+    found = []
+    for name in os.listdir(directory):
+        m = _FILE.match(name)
+        if m and m.group(1) == kind:
+            found.append(int(m.group(2)))
+    return sorted(found)
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:                    # e.g. Windows: directories cannot be opened
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Append-only segment files, fsynced in batches by one flusher thread."""
+
+    def __init__(self, directory, seq, sync=SYNC):
+        self.directory = directory
+        self.seq = seq
+        self.sync = sync
+        self.fsyncs = 0
+        self._buf = []
+        self._appended = self._synced = 0
+        self._flushing = False
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._file = open(_segment(directory, seq), "ab")
+        self._thread = threading.Thread(target=self._flush_loop, name="journal", daemon=True)
+        self._thread.start()
+
+    def append(self, record):
+        """Queue one record; returns the ticket to pass to ``wait``."""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("journal is closed")
+            self._buf.append(line)
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    def wait(self, ticket):
+        """Block until record `ticket` is on disk (returns at once with sync="async")."""
+        if self.sync != "group":
+            return
+        with self._cond:
+            while self._synced < ticket and self._error is None:
+                self._cond.wait()
+            if self._synced < ticket:
+                raise OSError(f"journal write failed: {self._error}")
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._buf and not self._closed:
+                    self._cond.wait()
+                if not self._buf:
+                    return
+                batch, self._buf = self._buf, []
+                upto, f = self._appended, self._file
+                self._flushing = True
+            try:
+                f.write(b"".join(batch))
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError as e:
+                with self._cond:
+                    self._error = e
+                    self._flushing = False
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._synced = upto
+                self.fsyncs += 1
+                self._flushing = False
+                self._cond.notify_all()
+
+    def _drain(self):
+        while (self._buf or self._flushing) and self._error is None:
+            self._cond.wait()
+
+    def rotate(self):
+        """Close the current segment once it is on disk and start the next;
+        returns the new segment's number.  Callers stop appending meanwhile."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("journal is closed")
+            self._drain()
+            self._file.close()
+            self.seq += 1
+            self._file = open(_segment(self.directory, self.seq), "ab")
+            return self.seq
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._drain()
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
+
+
+# -----------------------------
+# Recovery
+# -----------------------------
+def _load_snapshot(store, path):
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    for user, saved in state["users"].items():
+        u = store.users[user] = {}
+        for key, make in _COLUMNS.items():
+            u[key] = make()
+            u[key].load(saved[key])
+        u["foods"] = user_tables(store.catalog, saved["foods"])
+        u["meal_templates"] = saved["meal_templates"]
+
+
+def _apply(store, rec, pending):
+    """Apply one journal record.  Record puts and deletes only go into
+    `pending` ({columns key: {user: {day: values or None}}}), which
+    ``_flush_pending`` writes with one ``put_rows`` per user and kind."""
+    op, user = rec[0], rec[1]
+    if op in _RECORD_OPS:
+        key, many = _RECORD_OPS[op]
+        days = pending[key].setdefault(user, {})
+        if many:
+            for row in rec[2]:
+                days[row[0]] = row[1:]
+        else:
+            days[rec[2]] = None if op[0] == "-" else rec[3:]
+        return
+    if user not in store.users:
+        MemoryStore.ensure_user(store, user)
+    u = store.users[user]
+    if op == "u":
+        pass
+    elif op == "-f":
+        u["food_log"].clear()
+        pending["food_log"][user] = {}
+    elif op == "food":
+        u["foods"][rec[2]].set(rec[3], rec[4])
+    elif op == "tpl":
+        meals = tuple(rec[4])
+        u.setdefault("meal_templates", {})[rec[2]] = {"items": tuple(rec[3]), "meals": meals, "kcal": sum(meals)}
+    elif op == "-tpl":
+        u.setdefault("meal_templates", {}).pop(rec[2], None)
+    else:
+        raise ValueError(f"unknown journal record {op!r}")
+
+
+def _flush_pending(store, pending):
+    for key, by_user in pending.items():
+        for user, days in by_user.items():
+            if user not in store.users:
+                MemoryStore.ensure_user(store, user)
+            cols = store.users[user][key]
+            for day in [d for d, v in days.items() if v is None]:
+                cols.delete(day)
+            rows = [(d, v) for d, v in days.items() if v is not None]
+            try:
+                cols.put_rows(rows)
+            except ValueError:                    # a value the live store rejected too
+                for row in rows:
+                    try:
+                        cols.put_rows((row,))
+                    except ValueError:
+                        pass
+
+
+def _decode(lines):
+    """Records of whole `lines`, decoded as one JSON array; stops at the first bad line."""
+    try:
+        return json.loads(b"[" + b",".join(lines) + b"]")
+    except ValueError:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        return records
+
+
+def _replay(store, path, pending):
+    """Apply segment `path`; returns (records, bytes up to the end of the last whole record)."""
+    with open(path, "rb") as f:
+        lines = f.read().split(b"\n")
+    lines.pop()                                   # b"" after the last newline, or a torn line
+    n = good = 0
+    for i in range(0, len(lines), REPLAY_CHUNK):
+        chunk = lines[i:i + REPLAY_CHUNK]
+        records = _decode(chunk)
+        for rec in records:
+            try:
+                _apply(store, rec, pending)
+            except KeyError:                      # rejected by the live store as well
+                pass
+        n += len(records)
+        good += sum(len(line) + 1 for line in chunk[:len(records)])
+        if len(records) < len(chunk):
+            break
+    return n, good
+
+
+def recover(store, directory):
+    """Load `directory`'s newest snapshot and replay the journal after it into `store`.
+
+    Returns {"snapshot", "segments", "records", "seconds", "next_seq"}."""
+    t0 = time.perf_counter()
+    snapshots = _files(directory, "snapshot")
+    base = snapshots[-1] if snapshots else 0
+    if snapshots:
+        _load_snapshot(store, _snapshot(directory, base))
+    segments = [s for s in _files(directory, "journal") if s >= base]
+    pending, records = {key: {} for key in _COLUMNS}, 0
+    for seq in segments:
+        path = _segment(directory, seq)
+        n, good = _replay(store, path, pending)
+        records += n
+        if good < os.path.getsize(path):          # torn tail: drop it
+            with open(path, "r+b") as f:
+                f.truncate(good)
+    _flush_pending(store, pending)
+    return {"snapshot": base if snapshots else None, "segments": len(segments), "records": records,
+            "seconds": time.perf_counter() - t0, "next_seq": max([base, *segments]) + 1}
+
+
+# -----------------------------
+# Store
+# -----------------------------
+class JournaledStore(MemoryStore):
+    """``MemoryStore`` whose writes are journaled to `directory` (see the module doc)."""
+
+    def __init__(self, users, catalog, directory, sync=SYNC, snapshot_every=SNAPSHOT_EVERY):
+        super().__init__(users, catalog)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self._lock = threading.RLock()        # serializes appends and snapshots
+        self._ticket = self._applied = 0      # last ticket appended / applied (or skipped)
+        self._ready = {}                      # ticket -> apply (None: skip), synced, not yet run
+        self._results = {}                    # ticket -> (ok, value or exception), not yet returned
+        self._applied_cond = threading.Condition()
+        self._snapshotting = False
+        self.recovered = recover(self, directory)
+        self._since_snapshot = self.recovered["records"]
+        self.journal = Journal(directory, self.recovered["next_seq"], sync)
+        atexit.register(self.close)
+
+    def _logged(self, record, apply):
+        """Journal `record`, wait until it is on disk, then run `apply`."""
+        with self._lock:
+            ticket = self._ticket = self.journal.append(record)
+            self._since_snapshot += 1
+            due = self._since_snapshot >= self.snapshot_every and not self._snapshotting
+            if due:
+                self._snapshotting = True
+        if due:
+            threading.Thread(target=self.snapshot, name="journal-snapshot", daemon=True).start()
+        try:
+            self.journal.wait(ticket)
+        except BaseException:
+            self._apply_in_order(ticket, None)      # skip it, so later writes are not held up
+            raise
+        return self._apply_in_order(ticket, apply)
+
+    def _apply_in_order(self, ticket, apply):
+        """Run `apply` (None: nothing) once every earlier ticket is applied or
+        skipped.  Whichever writer finds the next tickets ready runs them all,
+        so a synced batch is applied in one pass, not handed from thread to thread."""
+        with self._applied_cond:
+            self._ready[ticket] = apply
+            if self._applied + 1 in self._ready:
+                while self._applied + 1 in self._ready:
+                    t = self._applied + 1
+                    fn = self._ready.pop(t)
+                    try:
+                        self._results[t] = (True, fn() if fn else None)
+                    except BaseException as e:
+                        self._results[t] = (False, e)
+                    self._applied = t
+                self._applied_cond.notify_all()
+            while self._applied < ticket:
+                self._applied_cond.wait()
+            ok, value = self._results.pop(ticket)
+        if not ok:
+            raise value
+        return value
+
+    def ensure_user(self, user):
+        if user not in self.users:
+            self._logged(["u", user], partial(MemoryStore.ensure_user, self, user))
+
+    def put_bmi(self, user, day, rec):
+        self._logged(["b", user, day, *(rec[k] for k in BMI_FIELDS)],
+                     partial(MemoryStore.put_bmi, self, user, day, rec))
+
+    def put_bmi_many(self, user, items):
+        items = list(items)
+        self._logged(["B", user, [[day, *(r[k] for k in BMI_FIELDS)] for day, r in items]],
+                     partial(MemoryStore.put_bmi_many, self, user, items))
+
+    def delete_bmi(self, user, day):
+        self._logged(["-b", user, day], partial(MemoryStore.delete_bmi, self, user, day))
+
+    def put_tdee(self, user, day, rec):
+        self._logged(["t", user, day, *(rec[k] for k in TDEE_FIELDS)],
+                     partial(MemoryStore.put_tdee, self, user, day, rec))
+
+    def put_tdee_many(self, user, items):
+        items = list(items)
+        self._logged(["T", user, [[day, *(r[k] for k in TDEE_FIELDS)] for day, r in items]],
+                     partial(MemoryStore.put_tdee_many, self, user, items))
+
+    def delete_tdee(self, user, day):
+        self._logged(["-t", user, day], partial(MemoryStore.delete_tdee, self, user, day))
+
+    def put_food_log(self, user, day, kcal):
+        self._logged(["f", user, day, kcal], partial(MemoryStore.put_food_log, self, user, day, kcal))
+
+    def put_food_log_many(self, user, items):
+        items = list(items)
+        self._logged(["F", user, [[day, kcal] for day, kcal in items]],
+                     partial(MemoryStore.put_food_log_many, self, user, items))
+
+    def clear_food_log(self, user):
+        self._logged(["-f", user], partial(MemoryStore.clear_food_log, self, user))
+
+    def put_food(self, user, table, name, kcal):
+        self._logged(["food", user, table, name, kcal], partial(MemoryStore.put_food, self, user, table, name, kcal))
+
+    def put_meal_template(self, user, name, tpl):
+        self._logged(["tpl", user, name, list(tpl["items"]), list(tpl["meals"])],
+                     partial(MemoryStore.put_meal_template, self, user, name, tpl))
+
+    def delete_meal_template(self, user, name):
+        self._logged(["-tpl", user, name], partial(MemoryStore.delete_meal_template, self, user, name))
+
+    def _dump_user(self, u):
+        saved = {key: u[key].dump() for key in _COLUMNS}
+        saved["foods"] = {t: dict(table.overlay) for t, table in u["foods"].items()}
+        saved["meal_templates"] = dict(u.get("meal_templates", {}))
+        return saved
+
+    def snapshot(self):
+        """Write every user to a new snapshot, then delete the files it replaces."""
+        try:
+            with self._lock:                    # a consistent cut: no write in between
+                seq = self.journal.rotate()
+                self._since_snapshot = 0
+                with self._applied_cond:        # every journaled write is in memory
+                    while self._applied < self._ticket:
+                        self._applied_cond.wait()
+                    state = {user: self._dump_user(u) for user, u in self.users.items()}
+            path = _snapshot(self.directory, seq)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump({"seq": seq, "users": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            _fsync_dir(self.directory)
+            for kind, make in (("journal", _segment), ("snapshot", _snapshot)):
+                for old in _files(self.directory, kind):
+                    if old < seq:
+                        os.remove(make(self.directory, old))
+            return seq
+        finally:
+            self._snapshotting = False
+
+    def close(self):
+        with self._lock:
+            self.journal.close()
@@ -0,0 +1,190 @@
+"""Headless BMI / TDEE / food-log reports for many users (no Gradio).
+
+Reads the files ``bme_health.importer`` accepts (CSV or JSONL rows of BMI,
+TDEE and food data, with a ``user`` column or one user per file named
+after it), plus ``meal`` rows naming a main, dessert and beverage from the
+food tables::
+
+    type,user,date,main,dessert,beverage
+
+Rows for the same day add up to that day's total.  For every user it
+builds one row per day with BMI and category, the latest TDEE on or before
+that day, the calorie target for the chosen goal and the day's total
+against it, and a one-line summary.  Users are processed in a pool of
+worker processes; each worker writes its users' daily CSV itself, so only
+the summaries travel back.
+
+    from bme_health import pipeline
+    summaries = pipeline.run(["logs.csv"], "reports/", goal="Lose (-20%)")
+"""
+import csv
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from bme_health import foods
+from bme_health.core import bmi_category, compute_target_from_goal, parse_date_str
+from bme_health.importer import is_jsonl, iter_rows, parse_row
+
+DAILY_COLUMNS = ("date", "bmi", "category", "weight", "bmr", "tdee", "target", "kcal", "vs_target")
+SUMMARY_COLUMNS = ("user", "rows", "rejected", "first_date", "last_date", "bmi_first", "bmi_last",
+                   "category_last", "tdee_last", "target_last", "food_days", "avg_kcal",
+                   "days_over", "days_under", "daily_file")
+
+
+def read_users(paths):
+    """{user: [raw row dict, ...]} from the files at `paths`, in file order.
+
+    A row's ``user`` column names its user; rows without one belong to the
+    file's base name (``alice.csv`` -> "alice").  A user's rows may be
+    spread over every file, so all of them are held in memory at once
+    (a few hundred bytes per row); split inputs larger than that by user
+    and report on each part separately."""
+    by_user = {}
+    for path in paths:
+        default = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for _, row in iter_rows(f, is_jsonl(path)):
+                if row is None:
+                    continue
+                row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+                user = str(row.get("user") or default).strip()
+                row["user"] = user
+                by_user.setdefault(user, []).append(row)
+    return by_user
+
+
+def _meal_kcal(row, tables):
+    day = parse_date_str(str(row.get("date") or ""))
+    if day is None:
+        return None
+    names = [str(row.get(k) or foods.SENTINEL).strip() for k in ("main", "dessert", "beverage")]
+    return day, foods.meal_total(tables, *names)
+
+
+def user_report(user, rows, goal="Maintenance (0%)", tables=None, allow_out_of_range=False):
+    """(daily rows, summary dict) for one user's raw rows."""
+    tables = tables or foods.user_tables(foods.freeze_catalog(foods.DEFAULT_FOODS))
+    bmi, tdee, kcal = {}, {}, {}
+    rejected = 0
+    for row in rows:
+        if str(row.get("type") or "").strip().lower() == "meal":
+            meal = _meal_kcal(row, tables)
+            if meal is None:
+                rejected += 1
+            else:
+                kcal[meal[0]] = kcal.get(meal[0], 0.0) + meal[1]
+            continue
+        parsed = parse_row(row, user, allow_out_of_range, per_row_user=True)
+        kind = parsed[0]
+        if kind == "error":
+            rejected += 1
+        elif kind == "bmi":
+            bmi[parsed[2]] = parsed[3]
+        elif kind == "tdee":
+            tdee[parsed[2]] = parsed[3]
+        else:
+            kcal[parsed[2]] = kcal.get(parsed[2], 0.0) + parsed[3]
+
+    daily = []
+    current = None                         # latest TDEE record on or before the day
+    over = under = 0
+    for day in sorted(bmi.keys() | tdee.keys() | kcal.keys()):
+        current = tdee.get(day, current)
+        b = bmi.get(day)
+        target = compute_target_from_goal(current["tdee"], goal) if current else None
+        eaten = kcal.get(day)
+        diff = eaten - target if eaten is not None and target else None
+        if diff is not None:
+            over += diff > 0
+            under += diff <= 0
+        daily.append({
+            "date": day,
+            "bmi": b["bmi"] if b else None,
+            "category": bmi_category(b["bmi"]) if b else None,
+            "weight": b["w_kg"] if b else None,
+            "bmr": round(current["bmr"], 2) if current else None,
+            "tdee": round(current["tdee"], 2) if current else None,
+            "target": round(target, 2) if target else None,
+            "kcal": eaten,
+            "vs_target": round(diff, 2) if diff is not None else None,
+        })
+
+    bmi_days = sorted(bmi)
+    last_tdee = tdee[max(tdee)] if tdee else None
+    summary = {
+        "user": user, "rows": len(rows), "rejected": rejected,
+        "first_date": daily[0]["date"] if daily else None,
+        "last_date": daily[-1]["date"] if daily else None,
+        "bmi_first": bmi[bmi_days[0]]["bmi"] if bmi_days else None,
+        "bmi_last": bmi[bmi_days[-1]]["bmi"] if bmi_days else None,
+        "category_last": bmi_category(bmi[bmi_days[-1]]["bmi"]) if bmi_days else None,
+        "tdee_last": round(last_tdee["tdee"], 2) if last_tdee else None,
+        "target_last": round(compute_target_from_goal(last_tdee["tdee"], goal), 2) if last_tdee else None,
+        "food_days": len(kcal),
+        "avg_kcal": round(sum(kcal.values()) / len(kcal), 1) if kcal else None,
+        "days_over": over, "days_under": under,
+    }
+    return daily, summary
+
+
+def _safe_name(user):
+    """File-name stem for `user`: the name with unsafe characters replaced,
+    plus a short hash of the raw name, so "a.b" and "a b" (or "Ann" and
+    "ann" on a case-insensitive disk) get different files."""
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in user) or "user"
+    return f"{safe}-{hashlib.sha1(user.encode('utf-8')).hexdigest()[:8]}"
+
+
+def write_csv(path, columns, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+        w.writeheader()
+        w.writerows(rows)
+
+
+# Set in each worker process by _init_worker
+_worker = {}
+
+
+def _init_worker(food_tables, goal, out_dir, allow_out_of_range):
+    _worker.update(tables=foods.user_tables(foods.freeze_catalog(food_tables)), goal=goal, out_dir=out_dir,
+                   allow_out_of_range=allow_out_of_range)
+
+
+def _process(item):
+    user, rows = item
+    daily, summary = user_report(user, rows, _worker["goal"], _worker["tables"], _worker["allow_out_of_range"])
+    if _worker["out_dir"]:
+        path = os.path.join(_worker["out_dir"], f"{_safe_name(user)}_daily.csv")
+        write_csv(path, DAILY_COLUMNS, daily)
+        summary["daily_file"] = os.path.basename(path)
+    return summary
+
+
+def run(paths, out_dir=None, goal="Maintenance (0%)", procs=None, food_db="", allow_out_of_range=False,
+        write_daily=True):
+    """Report on every user in `paths`; returns the summaries (sorted by user).
+
+    With `out_dir`, writes ``summary.csv`` there and, unless `write_daily`
+    is false, one ``<user>-<hash>_daily.csv`` per user (its name is in the
+    summary's ``daily_file``).  `procs` worker processes share the users
+    (default: one per CPU; 1 runs in this process).  Every input row is
+    read into memory first, see ``read_users``."""
+    by_user = read_users(paths)
+    food_tables = foods.load_food_db(food_db, foods.DEFAULT_FOODS)    # plain dicts: they pickle
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    init = (food_tables, goal, out_dir if write_daily else None, allow_out_of_range)
+    items = sorted(by_user.items())
+    procs = procs or os.cpu_count() or 1
+    if procs == 1 or len(items) < 2:
+        _init_worker(*init)
+        summaries = [_process(it) for it in items]
+    else:
+        chunk = max(1, len(items) // (procs * 4))
+        with ProcessPoolExecutor(max_workers=procs, initializer=_init_worker, initargs=init) as ex:
+            summaries = list(ex.map(_process, items, chunksize=chunk))
+    if out_dir:
+        write_csv(os.path.join(out_dir, "summary.csv"), SUMMARY_COLUMNS, summaries)
+    return summaries
@@ -0,0 +1,71 @@
+"""Chart data for client-rendered plots (``BME_CHART_MODE=client``).
+
+Instead of rasterizing a PNG on the server, the app can send the plotted
+series to ``gr.LinePlot`` / ``gr.BarPlot`` and let the browser draw them.
+These helpers build the small DataFrames those components take, from the
+same inputs as the PNG functions in ``bme_health.charts``.
+
+Native plots have one mark per chart, so the extras are encoded as data:
+the BMI category bands become flat threshold series across the plotted
+date range, and food bars are coloured by whether they are over or under
+the target, with the target itself in the plot title.
+
+pandas is imported on first use; gradio does not load it at startup.
+"""
+from bme_health.core import BMI_CATEGORIES, BMI_THRESHOLDS
+
+BMI_SERIES = "BMI"
+# one line per category upper bound, labelled like the PNG bands
+BAND_SERIES = tuple(f"{name} < {bound:g}" for name, bound in zip(BMI_CATEGORIES, BMI_THRESHOLDS))
+BMI_COLORS = dict(zip((BMI_SERIES,) + BAND_SERIES, ("#39ff14", "#6ec1ff", "#ffdd00", "#ff3b3b")))
+
+UNDER, OVER, LOGGED = "Under target", "Over target", "Logged"
+FOOD_COLORS = {UNDER: "#39ff14", OVER: "#ff9f1c", LOGGED: "Orange"}
+
+
+def _pd():
+    import pandas as pd
+    return pd
+
+
+def bmi_series_frame(points):
+    """DataFrame (date, bmi, series, category) for `points` as in ``charts.bmi_series_png``."""
+    pd = _pd()
+    rows = [(d, bmi, BMI_SERIES, cat) for d, bmi, cat in points]
+    if points:
+        first, last = points[0][0], points[-1][0]
+        for series, bound in zip(BAND_SERIES, BMI_THRESHOLDS):
+            rows.append((first, bound, series, series))
+            rows.append((last, bound, series, series))
+    df = pd.DataFrame(rows, columns=["date", "bmi", "series", "category"])
+    df["date"] = pd.to_datetime(df["date"])
+    df["bmi"] = df["bmi"].astype(float)       # keeps the y axis quantitative when empty
+    return df
+
+
+def food_week_frame(labels, vals, target_kcal):
+    """DataFrame (date, kcal, status) for one week, as in ``charts.food_week_png``."""
+    target = float(target_kcal or 0)
+    if target > 0:
+        status = [OVER if v > target else UNDER for v in vals]
+    else:
+        status = [LOGGED] * len(vals)
+    pd = _pd()
+    # explicit dtypes keep the axes typed (nominal x, quantitative y) when empty
+    return pd.DataFrame({"date": pd.Series(list(labels), dtype=object),
+                         "kcal": pd.Series([float(v) for v in vals], dtype=float),
+                         "status": pd.Series(status, dtype=object)})
+
+
+def food_week_title(labels, target_kcal):
+    title = f"Daily Calories — {labels[0]} to {labels[-1]}" if labels else "Daily Calories — last 7 days"
+    if target_kcal and target_kcal > 0:
+        title += f" (target {float(target_kcal):.0f} kcal)"
+    return title
+
+
+def empty_frame(kind):
+    """Empty-state data for `kind` ("bmi" or "food")."""
+    if kind == "bmi":
+        return bmi_series_frame(())
+    return food_week_frame((), (), 0)
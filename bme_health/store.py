@@ -0,0 +1,646 @@
+"""Storage backends for per-user BMI, TDEE and food data.
+
+App.py talks to a store only through the methods of ``UserStore``:
+read methods return date-keyed mappings, and every write touches a single
+record.  Two backends exist:
+
+* ``MemoryStore`` keeps the original nested ``users`` dict layout
+  (nothing survives a restart), but each user's records are
+  ``RecordColumns`` (``bme_health.columns``): date-keyed mappings over
+  compact typed arrays.  Each user's "foods" entry is a set of
+  ``FoodTable`` overlays over the shared default catalog, and
+  "meal_templates" holds the user's saved days of meals.
+* ``SQLiteStore`` keeps one row per record in tables keyed by
+  ``(user, day)``, runs in WAL mode and hands out connections from a small
+  pool.  Mappings it returns are lazy views, so logging in does not pull a
+  user's whole history into memory.  With ``shared=True`` (``BME_SHARED=1``,
+  set for every worker by ``BME_WORKERS``) several processes can serve the
+  same database: each write bumps the user's row in ``user_versions`` in the
+  same transaction, and a process drops its cached date indexes and food
+  totals for a user whose version moved since it last looked.
+
+Use ``open_store(url)`` to pick one; an empty url means memory (journaled
+to disk when ``BME_JOURNAL`` is set, see ``bme_health.journal``).
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from bme_health.aggregates import FoodStats
+from bme_health.columns import bmi_columns, food_columns, tdee_columns
+from bme_health.dateindex import SortedDates
+from bme_health.dates import to_days
+from bme_health.foods import freeze_catalog, user_tables
+
+KINDS = ("bmi", "tdee", "food")
+
+
+class UserStore(ABC):
+    """Interface shared by every backend; a backend must define every
+    abstract method below before it can be created.
+
+    Besides the records themselves, every store keeps a ``SortedDates``
+    index per (user, kind) and a ``FoodStats`` aggregate per user.  Both are
+    built on first use and then updated by the write methods, so dropdowns,
+    charts and period summaries never re-sort or rescan.  It also holds each
+    user's cohort partial (``bme_health.cohort``), which any write to that
+    user's records drops.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._food_stats = {}
+        self._partials = {}
+        self._generations = {}                  # user -> count of record writes seen
+        self._index_lock = threading.RLock()    # food_stats builds through dates()
+
+    @abstractmethod
+    def ensure_user(self, user): ...
+    @abstractmethod
+    def user_names(self): ...
+    @abstractmethod
+    def bmi_records(self, user) -> Mapping: ...
+    @abstractmethod
+    def tdee_records(self, user) -> Mapping: ...
+    @abstractmethod
+    def food_log(self, user) -> Mapping: ...
+    @abstractmethod
+    def foods(self, user) -> Mapping: ...
+    @abstractmethod
+    def meal_templates(self, user) -> Mapping: ...
+
+    @abstractmethod
+    def put_bmi(self, user, day, rec): ...
+    @abstractmethod
+    def delete_bmi(self, user, day): ...
+    @abstractmethod
+    def put_tdee(self, user, day, rec): ...
+    @abstractmethod
+    def delete_tdee(self, user, day): ...
+    @abstractmethod
+    def put_food_log(self, user, day, kcal): ...
+    @abstractmethod
+    def clear_food_log(self, user): ...
+    @abstractmethod
+    def put_food(self, user, table, name, kcal): ...
+    @abstractmethod
+    def put_meal_template(self, user, name, tpl): ...
+    @abstractmethod
+    def delete_meal_template(self, user, name): ...
+
+    def bmi_series(self, user):
+        """{date: bmi} for every BMI record of `user`, in date order."""
+        recs = self.bmi_records(user)
+        return {d: recs[d]["bmi"] for d in self.dates(user, "bmi").choices()}
+
+    # -----------------------------
+    # Date index
+    # -----------------------------
+    def dates(self, user, kind):
+        """SortedDates of the days that have a `kind` record."""
+        self._check_fresh(user)
+        idx = self._indexes.get((user, kind))
+        if idx is None:
+            with self._index_lock:
+                idx = self._indexes.get((user, kind))
+                if idx is None:
+                    idx = self._indexes[(user, kind)] = self._build_index(user, kind)
+        return idx
+
+    def _build_index(self, user, kind):
+        return SortedDates(self.records(user, kind))
+
+    def _index_add(self, user, kind, days):
+        with self._index_lock:
+            self._records_changed(user)
+            idx = self._indexes.get((user, kind))
+            if idx is not None:
+                for d in days:
+                    idx.add(d)
+
+    def _index_discard(self, user, kind, day):
+        with self._index_lock:
+            self._records_changed(user)
+            idx = self._indexes.get((user, kind))
+            if idx is not None:
+                idx.discard(day)
+
+    def _index_clear(self, user, kind):
+        with self._index_lock:
+            self._records_changed(user)
+            idx = self._indexes.get((user, kind))
+            if idx is not None:
+                idx.clear()
+
+    def food_stats(self, user):
+        """FoodStats (running totals) over `user`'s food log."""
+        self._check_fresh(user)
+        stats = self._food_stats.get(user)
+        if stats is None:
+            with self._index_lock:
+                stats = self._food_stats.get(user)
+                if stats is None:
+                    stats = self._food_stats[user] = FoodStats(self.iter_records(user, "food"))
+        return stats
+
+    def _check_fresh(self, user):
+        """Drop `user`'s cached indexes if another process changed their data
+        (only stores shared between processes need this)."""
+
+    def _drop_caches(self, user):
+        with self._index_lock:
+            for kind in KINDS:
+                self._indexes.pop((user, kind), None)
+            self._food_stats.pop(user, None)
+            self._records_changed(user)
+
+    def _records_changed(self, user):
+        with self._index_lock:
+            self._generations[user] = self._generations.get(user, 0) + 1
+            self._partials.pop(user, None)
+
+    # -----------------------------
+    # Cohort partials
+    # -----------------------------
+    def cohort_partial(self, user):
+        """`user`'s cached cohort partial, or None if it needs computing."""
+        self._check_fresh(user)
+        return self._partials.get(user)
+
+    def cohort_token(self, user):
+        """Pass to ``put_cohort_partial``; take it before reading the records."""
+        return self._generations.get(user, 0)
+
+    def put_cohort_partial(self, user, token, partial):
+        """Cache `partial` unless `user`'s records changed since `token` was taken."""
+        with self._index_lock:
+            if self._generations.get(user, 0) == token:
+                self._partials[user] = partial
+
+    def _food_logged(self, user, items):
+        """Record (day, kcal) writes in the date index and the running totals."""
+        with self._index_lock:
+            self._records_changed(user)
+            idx = self._indexes.get((user, "food"))
+            stats = self._food_stats.get(user)
+            for day, kcal in items:
+                if idx is not None:
+                    idx.add(day)
+                if stats is not None:
+                    stats.set(day, kcal)
+
+    def _food_cleared(self, user):
+        self._index_clear(user, "food")
+        with self._index_lock:
+            stats = self._food_stats.get(user)
+            if stats is not None:
+                stats.clear()
+
+    def records(self, user, kind):
+        """Mapping for `kind` in ("bmi", "tdee", "food")."""
+        return {"bmi": self.bmi_records, "tdee": self.tdee_records, "food": self.food_log}[kind](user)
+
+    def iter_records(self, user, kind):
+        """Yield (day, value) for `kind` in date order, without building a copy."""
+        records = self.records(user, kind)
+        for day in self.dates(user, kind).choices():
+            yield day, records[day]
+
+    # Bulk helpers (used by the importer); backends may override with
+    # something faster than a loop.
+    def existing_days(self, user, kind, days):
+        """Subset of `days` that already have a `kind` ("bmi"/"tdee"/"food") record."""
+        records = self.records(user, kind)
+        return {d for d in days if d in records}
+
+    def put_bmi_many(self, user, items):
+        for day, rec in items:
+            self.put_bmi(user, day, rec)
+
+    def put_tdee_many(self, user, items):
+        for day, rec in items:
+            self.put_tdee(user, day, rec)
+
+    def put_food_log_many(self, user, items):
+        for day, kcal in items:
+            self.put_food_log(user, day, kcal)
+
+
+# -----------------------------
+# In-memory backend
+# -----------------------------
+class MemoryStore(UserStore):
+    def __init__(self, users, catalog):
+        super().__init__()
+        self.users = users
+        self.catalog = catalog
+        self._no_user_foods = user_tables(catalog)
+
+    def ensure_user(self, user):
+        if user not in self.users:
+            self.users[user] = {
+                "bmi_records": bmi_columns(),
+                "tdee_records": tdee_columns(),
+                "food_log": food_columns(),
+                "foods": user_tables(self.catalog),
+                "meal_templates": {},
+            }
+
+    def user_names(self):
+        return list(self.users)
+
+    def _get(self, user, key):
+        u = self.users.get(user)
+        return u[key] if u else {}
+
+    def bmi_records(self, user): return self._get(user, "bmi_records")
+    def tdee_records(self, user): return self._get(user, "tdee_records")
+    def food_log(self, user): return self._get(user, "food_log")
+
+    def foods(self, user):
+        return self._get(user, "foods") or self._no_user_foods
+
+    def meal_templates(self, user):
+        return self.users.get(user, {}).get("meal_templates", {})
+
+    def _build_index(self, user, kind):
+        records = self.records(user, kind)
+        return SortedDates.from_ordinals(records.ordinals()) if records else SortedDates()
+
+    def iter_records(self, user, kind):
+        records = self.records(user, kind)
+        return records.iter_items() if records else iter(())
+
+    def bmi_series(self, user):
+        recs = self.bmi_records(user)
+        if not recs:
+            return {}
+        ordinals, bmi = recs.column("bmi")
+        days = self.dates(user, "bmi").choices()     # cached strings, same order
+        if len(days) != len(ordinals):               # a write landed in between
+            days = to_days(ordinals)
+        return dict(zip(days, bmi))
+
+    def put_bmi(self, user, day, rec):
+        self.users[user]["bmi_records"].put(day, rec)
+        self._index_add(user, "bmi", (day,))
+
+    def put_bmi_many(self, user, items):
+        items = list(items)
+        self.users[user]["bmi_records"].put_many(items)
+        self._index_add(user, "bmi", (day for day, _ in items))
+
+    def delete_bmi(self, user, day):
+        self.users[user]["bmi_records"].delete(day)
+        self._index_discard(user, "bmi", day)
+
+    def put_tdee(self, user, day, rec):
+        self.users[user]["tdee_records"].put(day, rec)
+        self._index_add(user, "tdee", (day,))
+
+    def put_tdee_many(self, user, items):
+        items = list(items)
+        self.users[user]["tdee_records"].put_many(items)
+        self._index_add(user, "tdee", (day for day, _ in items))
+
+    def delete_tdee(self, user, day):
+        self.users[user]["tdee_records"].delete(day)
+        self._index_discard(user, "tdee", day)
+
+    def put_food_log(self, user, day, kcal):
+        self.users[user]["food_log"].put(day, kcal)
+        self._food_logged(user, ((day, kcal),))
+
+    def put_food_log_many(self, user, items):
+        items = list(items)
+        self.users[user]["food_log"].put_many(items)
+        self._food_logged(user, items)
+
+    def clear_food_log(self, user):
+        self.users[user]["food_log"].clear()
+        self._food_cleared(user)
+
+    def put_food(self, user, table, name, kcal):
+        self.users[user]["foods"][table].set(name, kcal)
+
+    def put_meal_template(self, user, name, tpl):
+        self.users[user].setdefault("meal_templates", {})[name] = tpl
+
+    def delete_meal_template(self, user, name):
+        self.users[user].get("meal_templates", {}).pop(name, None)
+
+
+# -----------------------------
+# SQLite backend
+# -----------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS bmi_records (
+    user TEXT NOT NULL, day TEXT NOT NULL,
+    h_cm REAL NOT NULL, w_kg REAL NOT NULL, bmi REAL NOT NULL,
+    PRIMARY KEY (user, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tdee_records (
+    user TEXT NOT NULL, day TEXT NOT NULL,
+    bmr REAL NOT NULL, tdee REAL NOT NULL, gender TEXT NOT NULL, age INTEGER,
+    activity TEXT NOT NULL, h_cm REAL NOT NULL, w_kg REAL NOT NULL,
+    PRIMARY KEY (user, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS food_log (
+    user TEXT NOT NULL, day TEXT NOT NULL, kcal REAL NOT NULL,
+    PRIMARY KEY (user, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_versions (
+    user TEXT PRIMARY KEY, version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS custom_foods (
+    user TEXT NOT NULL, tbl TEXT NOT NULL, name TEXT NOT NULL,
+    kcal REAL NOT NULL, seq INTEGER NOT NULL,
+    PRIMARY KEY (user, tbl, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meal_templates (
+    user TEXT NOT NULL, name TEXT NOT NULL, items TEXT NOT NULL,
+    breakfast REAL NOT NULL, lunch REAL NOT NULL, dinner REAL NOT NULL,
+    PRIMARY KEY (user, name)
+) WITHOUT ROWID;
+"""
+
+_TDEE_COLS = ("bmr", "tdee", "gender", "age", "activity", "h_cm", "w_kg")
+
+
+class _ConnectionPool:
+    def __init__(self, path, size):
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            conn = sqlite3.connect(path, check_same_thread=False, timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+
+class _SQLView(Mapping):
+    """Read-only, date-keyed view over one user's rows of one table."""
+
+    def __init__(self, store, table, user, cols, to_value):
+        self._store, self._table, self._user = store, table, user
+        self._cols, self._to_value = cols, to_value
+
+    def _query(self, sql, args=()):
+        with self._store.pool.connection() as conn:
+            return conn.execute(sql, (self._user, *args)).fetchall()
+
+    def __getitem__(self, day):
+        rows = self._query(f"SELECT {', '.join(self._cols)} FROM {self._table} "
+                           "WHERE user = ? AND day = ?", (day,))
+        if not rows:
+            raise KeyError(day)
+        return self._to_value(rows[0])
+
+    def __contains__(self, day):
+        return bool(self._query(f"SELECT 1 FROM {self._table} WHERE user = ? AND day = ?", (day,)))
+
+    def __iter__(self):
+        return (r[0] for r in self._query(f"SELECT day FROM {self._table} WHERE user = ? ORDER BY day"))
+
+    def __len__(self):
+        return self._query(f"SELECT COUNT(*) FROM {self._table} WHERE user = ?")[0][0]
+
+    def items(self):
+        rows = self._query(f"SELECT day, {', '.join(self._cols)} FROM {self._table} "
+                           "WHERE user = ? ORDER BY day")
+        return [(r[0], self._to_value(r[1:])) for r in rows]
+
+    def values(self):
+        return [v for _, v in self.items()]
+
+    def iter_items(self, chunk=1000):
+        """Like items(), but reads `chunk` rows per query (keyed on the last
+        day seen), so a pooled connection is only held while one chunk loads."""
+        sql = (f"SELECT day, {', '.join(self._cols)} FROM {self._table} "
+               "WHERE user = ? AND day > ? ORDER BY day LIMIT ?")
+        last = ""
+        while True:
+            rows = self._query(sql, (last, chunk))
+            for r in rows:
+                yield r[0], self._to_value(r[1:])
+            if len(rows) < chunk:
+                break
+            last = rows[-1][0]
+
+
+_BUMP_VERSION = ("INSERT INTO user_versions (user, version) VALUES (?, 1) "
+                 "ON CONFLICT (user) DO UPDATE SET version = version + 1 RETURNING version")
+
+
+class SQLiteStore(UserStore):
+    def __init__(self, path, catalog, pool_size=4, shared=False):
+        super().__init__()
+        self.path = path
+        self.catalog = catalog
+        self.shared = shared
+        self.pool = _ConnectionPool(path, pool_size)
+        self._seen = {}               # user -> user_versions.version our caches reflect
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _exec(self, sql, args=()):
+        with self.pool.connection() as conn:
+            conn.execute(sql, args)
+
+    def ensure_user(self, user):
+        self._exec("INSERT OR IGNORE INTO users (user) VALUES (?)", (user,))
+
+    def user_names(self):
+        with self.pool.connection() as conn:
+            return [r[0] for r in conn.execute("SELECT user FROM users ORDER BY user")]
+
+    def _exec_many(self, sql, rows):
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(sql, rows)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _write(self, user, sql, rows, many=False):
+        """Run one write for `user`; in shared mode also bump their version."""
+        if not self.shared:
+            return self._exec_many(sql, rows) if many else self._exec(sql, rows)
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if many:
+                    conn.executemany(sql, rows)
+                else:
+                    conn.execute(sql, rows)
+                version = conn.execute(_BUMP_VERSION, (user,)).fetchone()[0]
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        with self._index_lock:
+            if self._seen.get(user) in (version - 1, version):
+                self._seen[user] = version         # only our write since: caches stay valid
+            else:
+                self._seen.pop(user, None)
+                self._drop_caches(user)
+
+    def _check_fresh(self, user):
+        if not self.shared:
+            return
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT version FROM user_versions WHERE user = ?", (user,)).fetchone()
+        version = row[0] if row else 0
+        with self._index_lock:
+            if self._seen.get(user) != version:
+                self._drop_caches(user)
+                self._seen[user] = version
+
+    def bmi_records(self, user):
+        return _SQLView(self, "bmi_records", user, ("h_cm", "w_kg", "bmi"),
+                        lambda r: {"h_cm": r[0], "w_kg": r[1], "bmi": r[2]})
+
+    def tdee_records(self, user):
+        return _SQLView(self, "tdee_records", user, _TDEE_COLS,
+                        lambda r: dict(zip(_TDEE_COLS, r)))
+
+    def food_log(self, user):
+        return _SQLView(self, "food_log", user, ("kcal",), lambda r: r[0])
+
+    def iter_records(self, user, kind):
+        return self.records(user, kind).iter_items()
+
+    def bmi_series(self, user):
+        with self.pool.connection() as conn:
+            return dict(conn.execute("SELECT day, bmi FROM bmi_records WHERE user = ? ORDER BY day",
+                                     (user,)).fetchall())
+
+    def foods(self, user):
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT tbl, name, kcal FROM custom_foods WHERE user = ? "
+                                "ORDER BY seq", (user,)).fetchall()
+        overlays = {}
+        for tbl, name, kcal in rows:
+            overlays.setdefault(tbl, {})[name] = kcal
+        return user_tables(self.catalog, overlays)
+
+    def meal_templates(self, user):
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT name, items, breakfast, lunch, dinner FROM meal_templates "
+                                "WHERE user = ? ORDER BY name", (user,)).fetchall()
+        templates = {}
+        for name, items, *meals in rows:
+            templates[name] = {"items": tuple(json.loads(items)), "meals": tuple(meals), "kcal": sum(meals)}
+        return templates
+
+    def put_bmi(self, user, day, rec):
+        self._write(user, "INSERT OR REPLACE INTO bmi_records VALUES (?, ?, ?, ?, ?)",
+                    (user, day, rec["h_cm"], rec["w_kg"], rec["bmi"]))
+        self._index_add(user, "bmi", (day,))
+
+    def put_bmi_many(self, user, items):
+        items = list(items)
+        self._write(user, "INSERT OR REPLACE INTO bmi_records VALUES (?, ?, ?, ?, ?)",
+                    ((user, day, r["h_cm"], r["w_kg"], r["bmi"]) for day, r in items), many=True)
+        self._index_add(user, "bmi", (day for day, _ in items))
+
+    def delete_bmi(self, user, day):
+        self._write(user, "DELETE FROM bmi_records WHERE user = ? AND day = ?", (user, day))
+        self._index_discard(user, "bmi", day)
+
+    def put_tdee(self, user, day, rec):
+        self._write(user, "INSERT OR REPLACE INTO tdee_records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (user, day, *(rec[c] for c in _TDEE_COLS)))
+        self._index_add(user, "tdee", (day,))
+
+    def put_tdee_many(self, user, items):
+        items = list(items)
+        self._write(user, "INSERT OR REPLACE INTO tdee_records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((user, day, *(r[c] for c in _TDEE_COLS)) for day, r in items), many=True)
+        self._index_add(user, "tdee", (day for day, _ in items))
+
+    def delete_tdee(self, user, day):
+        self._write(user, "DELETE FROM tdee_records WHERE user = ? AND day = ?", (user, day))
+        self._index_discard(user, "tdee", day)
+
+    def put_food_log(self, user, day, kcal):
+        self._write(user, "INSERT OR REPLACE INTO food_log VALUES (?, ?, ?)", (user, day, kcal))
+        self._food_logged(user, ((day, kcal),))
+
+    def put_food_log_many(self, user, items):
+        items = list(items)
+        self._write(user, "INSERT OR REPLACE INTO food_log VALUES (?, ?, ?)",
+                    ((user, day, kcal) for day, kcal in items), many=True)
+        self._food_logged(user, items)
+
+    def existing_days(self, user, kind, days):
+        table = {"bmi": "bmi_records", "tdee": "tdee_records", "food": "food_log"}[kind]
+        found = set()
+        days = list(days)
+        with self.pool.connection() as conn:
+            for i in range(0, len(days), 500):
+                chunk = days[i:i + 500]
+                marks = ", ".join("?" * len(chunk))
+                found.update(r[0] for r in conn.execute(
+                    f"SELECT day FROM {table} WHERE user = ? AND day IN ({marks})", (user, *chunk)))
+        return found
+
+    def clear_food_log(self, user):
+        self._write(user, "DELETE FROM food_log WHERE user = ?", (user,))
+        self._food_cleared(user)
+
+    def put_food(self, user, table, name, kcal):
+        # seq (the user's next) is computed inside the INSERT, so concurrent
+        # writers, in this process or another, never share one
+        self._write(user, "INSERT OR REPLACE INTO custom_foods VALUES (?, ?, ?, ?, "
+                          "(SELECT COALESCE(MAX(seq), 0) + 1 FROM custom_foods WHERE user = ?))",
+                    (user, table, name, kcal, user))
+
+    def put_meal_template(self, user, name, tpl):
+        self._write(user, "INSERT OR REPLACE INTO meal_templates VALUES (?, ?, ?, ?, ?, ?)",
+                    (user, name, json.dumps(tpl["items"]), *tpl["meals"]))
+
+    def delete_meal_template(self, user, name):
+        self._write(user, "DELETE FROM meal_templates WHERE user = ? AND name = ?", (user, name))
+
+
+def open_store(url, users, default_foods, shared=None, journal=None):
+    """`url` is "" / "memory" for the in-memory store, otherwise an SQLite path
+    (optionally prefixed with "sqlite:///").  `shared` (default: the
+    BME_SHARED env var) marks an SQLite store used by several processes.
+    `journal` (default: the BME_JOURNAL env var) is a directory that keeps
+    the in-memory store durable (``bme_health.journal``)."""
+    if shared is None:
+        shared = os.environ.get("BME_SHARED", "").strip() == "1"
+    if journal is None:
+        journal = os.environ.get("BME_JOURNAL", "").strip()
+    if not url or url == "memory":
+        if shared:
+            raise ValueError("several worker processes need a shared store; set BME_DB to an SQLite path")
+        if journal:
+            from bme_health.journal import JournaledStore
+            return JournaledStore(users, freeze_catalog(default_foods), journal)
+        return MemoryStore(users, freeze_catalog(default_foods))
+    if journal:
+        raise ValueError("BME_JOURNAL is for the in-memory store; an SQLite store (BME_DB) is already durable")
+    path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else url
+    pool_size = int(os.environ.get("BME_DB_POOL", "4"))
+    return SQLiteStore(path, freeze_catalog(default_foods), pool_size=pool_size, shared=shared)
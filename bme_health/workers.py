@@ -0,0 +1,28 @@
+"""Bounded executor for the blocking part of UI handlers.
+
+Gradio runs plain (sync) handlers on its shared worker threads.  App's
+handlers are registered as coroutines instead: their bodies (validation
+and store access, e.g. SQLite queries) run here, on a pool of
+``BME_IO_THREADS`` threads, while chart rendering has its own pool in
+``bme_health.charts`` and the event loop only awaits both.
+
+``run_blocking`` copies the caller's contextvars into the worker thread,
+so gr.Info / gr.Warning / gr.Progress inside a handler body still reach
+the right browser session.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+IO_THREADS = int(os.environ.get("BME_IO_THREADS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+
+
+async def run_blocking(fn, *args, context=None, **kwargs):
+    """Run fn(*args, **kwargs) on the I/O pool and await its result."""
+    ctx = context or contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)